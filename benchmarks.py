@@ -0,0 +1,1271 @@
+"""Micro-benchmarks for the speech emotion recognition pipeline.
+
+Run with:  python benchmarks.py
+Start-up import report and cold-start benchmark:  python benchmarks.py startup
+Pipeline suite with JSON results:  python benchmarks.py suite [--out FILE] [--baseline FILE]
+Compare two saved results:  python benchmarks.py compare BASELINE CURRENT [--threshold 0.25]
+"""
+import argparse
+import gc
+import gzip
+import json
+import os
+import platform
+import resource
+import re
+import socket
+import sqlite3
+import struct
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from io import BytesIO
+
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from flask import jsonify, request
+
+from emotiondetection import (app, analyzer, Metrics, StreamSession,
+                              synthetic_intensity, stft_spectrogram, extract_acoustic_features,
+                              mel_filterbank, dct_matrix, N_MFCC, EmotionModel, FEATURE_NAMES,
+                              MemoryResultCache, SQLiteResultCache, synthetic_wav, RENDER_PROFILES,
+                              HTML, STYLESHEET, SCRIPT, JobStore, JobQueue, RenderCache,
+                              RENDER_CACHE_BYTES, BATCH_MAX_CLIPS, BATCH_MAX_WORKERS,
+                              AnalysisExecutor, read_archive_clips)
+import emotiondetection
+
+# Every benchmark re-posts identical payloads; measure the analysis itself, not
+# the result cache (bench_result_cache installs its own)
+analyzer.result_cache = None
+
+
+@app.route('/bench/legacy-analyze', methods=['POST'])
+def legacy_analyze():
+    """Original upload handling: save to a named temp file, reopen, unlink"""
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.webm',
+                                            dir=app.config['UPLOAD_FOLDER'])
+    temp_path = temp_file.name
+    request.files['audio'].save(temp_path)
+    temp_file.close()
+    emotion, confidence, _ = analyzer.classify_audio_file(temp_path)
+    os.unlink(temp_path)
+    return jsonify({'emotion': emotion, 'confidence': confidence})
+
+
+@app.route('/bench/legacy-home')
+def legacy_home():
+    """Original home page: one uncompressed document with inline CSS and JS, no validators"""
+    return (HTML.replace('<link rel="stylesheet" href="__STYLESHEET_URL__">', f'<style>\n{STYLESHEET}    </style>')
+                .replace('<script src="__SCRIPT_URL__"></script>', f'<script>\n{SCRIPT}    </script>'))
+
+
+def legacy_extract_file_features(audio_data, file_size):
+    """Original pure-Python feature extractor, kept as a reference"""
+    features = {
+        'file_size': file_size,
+        'file_size_kb': file_size / 1024,
+        'has_wave_header': audio_data[:4] == b'RIFF' if len(audio_data) >= 4 else False,
+        'data_variance': 0,
+        'byte_pattern': 0
+    }
+    if len(audio_data) > 100:
+        byte_values = [b for b in audio_data[:100]]
+        if byte_values:
+            features['data_variance'] = np.var(byte_values)
+    if len(audio_data) > 50:
+        patterns = sum(1 for i in range(len(audio_data)-1) if audio_data[i] == audio_data[i+1])
+        features['byte_pattern'] = patterns / len(audio_data) if len(audio_data) > 0 else 0
+    return features
+
+
+def legacy_intensity(freq1, duration=3.0):
+    """Original nested-loop spectrogram simulation, kept as a reference"""
+    frequencies = np.linspace(0, 5000, 100)
+    times = np.linspace(0, duration, 100)
+    intensity = np.zeros((len(frequencies), len(times)))
+    for i, f in enumerate(frequencies):
+        for j, _ in enumerate(times):
+            intensity[i, j] = np.exp(-(f - freq1)**2 / 100000) * \
+                             np.exp(-(j/len(times) - 0.5)**2 / 0.1)
+    return intensity
+
+
+def loop_acoustic_features(samples, sample_rate, frame_ms=25, hop_ms=10):
+    """Frame-by-frame reference for rms, zcr, centroid and MFCCs"""
+    frame = int(sample_rate * frame_ms / 1000)
+    hop = int(sample_rate * hop_ms / 1000)
+    n_fft = 1 << (frame + min(int(sample_rate / 80), frame // 2) + 1).bit_length()
+    window = np.hanning(frame)
+    freqs = np.fft.rfftfreq(n_fft, 1 / sample_rate)
+    mel = mel_filterbank(sample_rate, n_fft)
+    dct = dct_matrix(N_MFCC, mel.shape[0])
+    rows = []
+    for start in range(0, len(samples) - frame + 1, hop):
+        x = samples[start:start + frame].astype(np.float64)
+        power = np.abs(np.fft.rfft(x * window, n=n_fft)) ** 2
+        zcr = sum(1 for a, b in zip(x[:-1], x[1:]) if (a < 0) != (b < 0)) / (frame - 1)
+        rows.append((np.sqrt(np.mean(x ** 2)), zcr, (power @ freqs) / power.sum(),
+                     dct @ np.log(mel @ power + 1e-10)))
+    return rows
+
+
+def render_intensity(intensity):
+    """Rasterize a spectrogram panel the way create_visualization draws it"""
+    fig = Figure(figsize=(12, 3))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    image = ax.imshow(intensity, aspect='auto', origin='lower',
+                      extent=[0, 3.0, 0, 5000], cmap='viridis', alpha=0.8)
+    fig.colorbar(image, ax=ax, label='Intensity')
+    buf = BytesIO()
+    fig.savefig(buf, format='raw', dpi=100)
+    return buf.getvalue()
+
+
+def legacy_render(features, file_size):
+    """Original renderer: every sample plotted, layout and tight bbox solved per call"""
+    t = np.linspace(0, 3.0, 66150)
+    waveform = (0.5 * np.sin(2 * np.pi * (220 + file_size % 100) * t)
+                + 0.3 * np.sin(2 * np.pi * (440 + file_size % 200) * t + np.pi / 4)
+                + min(features['data_variance'] / 100, 0.2) * np.random.default_rng(0).standard_normal(t.size))
+    waveform /= np.max(np.abs(waveform))
+    fig = Figure(figsize=(12, 6))
+    FigureCanvasAgg(fig)
+    wave_ax = fig.add_subplot(2, 1, 1)
+    wave_ax.plot(t, waveform, 'b-', alpha=0.8, linewidth=0.5)
+    wave_ax.fill_between(t, waveform, alpha=0.3, color='blue')
+    wave_ax.set_title('Audio Waveform Simulation', fontsize=16, fontweight='bold')
+    wave_ax.set_xlabel('Time (seconds)')
+    wave_ax.set_ylabel('Amplitude')
+    wave_ax.grid(True, alpha=0.3)
+    spec_ax = fig.add_subplot(2, 1, 2)
+    image = spec_ax.imshow(synthetic_intensity(220 + file_size % 100, 100, 100), aspect='auto',
+                           origin='lower', extent=[0, 3.0, 0, 5000], cmap='viridis', alpha=0.8)
+    spec_ax.set_title('Frequency Spectrum', fontsize=16, fontweight='bold')
+    spec_ax.set_xlabel('Time (seconds)')
+    spec_ax.set_ylabel('Frequency (Hz)')
+    fig.colorbar(image, ax=spec_ax, label='Intensity')
+    fig.tight_layout()
+    buf = BytesIO()
+    fig.savefig(buf, format='png', dpi=100, bbox_inches='tight')
+    return buf.getvalue()
+
+
+def timed(func, *args, repeat=3):
+    """Return the best wall-clock time of several calls"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_byte_features(sizes_mb=(1, 5, 10)):
+    """Compare per-MB cost of the legacy, vectorized and streaming extractors"""
+    print("📊 Byte feature extraction (seconds per MB)")
+    rng = np.random.default_rng(0)
+    for size_mb in sizes_mb:
+        size = size_mb * 1024 * 1024
+        # Low-entropy data so repeated adjacent bytes actually occur
+        data = rng.integers(0, 4, size, dtype=np.uint8).tobytes()
+
+        expected = legacy_extract_file_features(data, size)
+        vectorized = analyzer.extract_file_features(data, size)
+        streamed = analyzer.extract_stream_features(BytesIO(data))
+        for key in ('byte_pattern', 'data_variance', 'has_wave_header'):
+            assert vectorized[key] == expected[key], key
+            assert streamed[key] == expected[key], key
+
+        legacy_time = timed(legacy_extract_file_features, data, size, repeat=1)
+        vector_time = timed(analyzer.extract_file_features, data, size)
+        stream_time = timed(lambda: analyzer.extract_stream_features(BytesIO(data)))
+        print(f"   {size_mb:>3} MB  legacy {legacy_time / size_mb:.4f}  "
+              f"vectorized {vector_time / size_mb:.5f}  "
+              f"streaming {stream_time / size_mb:.5f}")
+
+
+def bench_spectrogram():
+    """Compare the nested-loop spectrogram with the broadcast and STFT versions"""
+    print("📊 Spectrogram computation (milliseconds per call)")
+    # freq1 only takes 100 values, so check every one renders identically.
+    # Vectorized exp may differ from the scalar loop in the last ulp, which
+    # never survives colormap quantization.
+    for freq1 in range(220, 320):
+        legacy = legacy_intensity(freq1)
+        assert np.allclose(legacy, synthetic_intensity(freq1, 100, 100), rtol=1e-12, atol=0)
+        assert render_intensity(legacy) == render_intensity(synthetic_intensity(freq1, 100, 100))
+
+    freq1 = 265
+    loop_time = timed(legacy_intensity, freq1)
+    broadcast_time = timed(synthetic_intensity, freq1, 100, 100)
+    samples = np.random.default_rng(0).standard_normal(3 * 22050).astype(np.float32)
+    stft_time = timed(stft_spectrogram, samples, 22050)
+    print(f"   loop {loop_time * 1000:.2f}  broadcast {broadcast_time * 1000:.4f}  "
+          f"stft(3s @ 22.05kHz) {stft_time * 1000:.2f}")
+
+
+def bench_acoustic_features(seconds=60, rates=(16000, 44100)):
+    """Real-time factor of the vectorized acoustic features, checked against a per-frame loop"""
+    print(f"📊 Acoustic features ({seconds} s of audio)")
+    rng = np.random.default_rng(0)
+    for rate in rates:
+        t = np.arange(rate * seconds) / rate
+        samples = (0.3 * np.sin(2 * np.pi * 150 * t) + 0.05 * rng.standard_normal(t.size)).astype(np.float32)
+        
+        vectorized = timed(extract_acoustic_features, samples, rate)
+        check = samples[:rate]
+        loop = timed(loop_acoustic_features, check, rate, repeat=1) * seconds
+        
+        fast = extract_acoustic_features(check, rate)
+        slow = loop_acoustic_features(check, rate)
+        assert np.allclose(fast['rms'], [row[0] for row in slow], rtol=1e-4)
+        assert np.allclose(fast['zcr'], [row[1] for row in slow])
+        assert np.allclose(fast['centroid'], [row[2] for row in slow], rtol=1e-3)
+        assert np.allclose(fast['mfcc'], [row[3] for row in slow], rtol=1e-3, atol=1e-2)
+        
+        factor = seconds / vectorized
+        print(f"   {rate:>5} Hz  loop {seconds / loop:7.1f}x  vectorized {factor:7.1f}x real time")
+        assert factor >= 100, f'{factor:.1f}x real time is below the 100x target'
+
+
+def bench_model_inference(n_rows=4096, batch_sizes=(1, 32, 4096)):
+    """Rows per second of the memory-mapped model, one row at a time versus batched"""
+    print(f"📊 Model inference ({n_rows} feature vectors)")
+    rng = np.random.default_rng(0)
+    n_features = len(FEATURE_NAMES)
+    labels = list(analyzer.emotions)
+    X = rng.standard_normal((n_rows, n_features)).astype(np.float32)
+    with tempfile.TemporaryDirectory() as path:
+        model = EmotionModel.save(path, labels, np.zeros(n_features), np.ones(n_features),
+                                  rng.standard_normal((n_features, len(labels))),
+                                  rng.standard_normal(len(labels)))
+        reference = model.predict_proba(X)
+        for batch_size in batch_sizes:
+            def run():
+                return np.concatenate([model.predict_proba(X[i:i + batch_size])
+                                       for i in range(0, n_rows, batch_size)])
+            assert np.allclose(run(), reference, atol=1e-6)
+            print(f"   batch {batch_size:>5}  {n_rows / timed(run):12.0f} rows/s")
+
+
+def bench_render_cache():
+    """Compare a cold render with a render-cache hit"""
+    print("📊 Visualization render cache (milliseconds per call)")
+    features = {'data_variance': 42.0}
+    analyzer.render_cache.clear()
+    start = time.perf_counter()
+    cold = analyzer.create_visualization(features, 123456)
+    miss_time = time.perf_counter() - start
+    hit_time = timed(analyzer.create_visualization, features, 123456)
+    assert analyzer.create_visualization(features, 123456) == cold
+    print(f"   miss {miss_time * 1000:.1f}  hit {hit_time * 1000:.4f}")
+
+
+def bench_render_profiles(speedup=10):
+    """Render time and output size per visualization profile, against the original renderer"""
+    print("📊 Visualization profiles (milliseconds per render, output size)")
+    features = {'data_variance': 42.0}
+    legacy_render(features, 123456)
+    legacy_time = timed(legacy_render, features, 123456)
+    print(f"   {'legacy':<10} {legacy_time * 1000:8.1f} ms  {len(legacy_render(features, 123456)) / 1024:8.1f} KB")
+    times = {}
+    for profile in RENDER_PROFILES:
+        # The first call builds the profile's template
+        image = analyzer.render_visualization(features, 123456, None, profile)
+        assert image is not None
+        times[profile] = timed(analyzer.render_visualization, features, 123456, None, profile)
+        print(f"   {profile:<10} {times[profile] * 1000:8.1f} ms  {len(image) / 1024:8.1f} KB  "
+              f"({legacy_time / times[profile]:.1f}x)")
+    assert legacy_time / times['thumbnail'] >= speedup, \
+        f"thumbnail only {legacy_time / times['thumbnail']:.1f}x faster than the original renderer"
+
+
+def post_audio(payload):
+    """POST one upload to /analyze and fetch its PNG through a fresh test client"""
+    client = app.test_client()
+    response = client.post('/analyze', data={'audio': (BytesIO(payload), 'clip.webm')},
+                           content_type='multipart/form-data')
+    result = response.get_json()
+    if result['success']:
+        result['png'] = client.get(result['visualization_url']).data
+    return result
+
+
+def wire_bytes(response):
+    """HTTP/1.1 bytes for one response: status line, headers and body"""
+    head = f'HTTP/1.1 {response.status}\r\n' + ''.join(f'{name}: {value}\r\n' for name, value in response.headers)
+    return len(head.encode('latin-1')) + 2 + len(response.data)
+
+
+def browser_visit(client, path, encoding, cache):
+    """Load a page and its assets like a browser with an HTTP cache; returns bytes received"""
+    received = 0
+    headers = {'Accept-Encoding': encoding} if encoding else {}
+    etag = cache.get(path)
+    response = client.get(path, headers=dict(headers, **({'If-None-Match': etag} if etag else {})))
+    received += wire_bytes(response)
+    if response.status_code == 200:
+        cache[path] = response.headers.get('ETag')
+        page = response.get_data()
+        if response.content_encoding == 'gzip':
+            page = gzip.decompress(page)
+        elif response.content_encoding == 'br':
+            import brotli
+            page = brotli.decompress(page)
+        for url in re.findall(rb'(?:href|src)="(/assets/[^"]+)"', page):
+            url = url.decode('ascii')
+            # Immutable assets are reused from cache without a request
+            if url in cache:
+                continue
+            asset = client.get(url, headers=headers)
+            received += wire_bytes(asset)
+            if asset.cache_control.immutable:
+                cache[url] = asset.headers.get('ETag')
+    return received
+
+
+def bench_frontend_transfer():
+    """Bytes on the wire for first and repeat visits to the home page"""
+    print("📊 Front-end transfer (bytes on the wire per visit)")
+    client = app.test_client()
+    for label, path, encoding in (('legacy inline', '/bench/legacy-home', 'gzip, deflate, br'),
+                                  ('split, identity', '/', None),
+                                  ('split, gzip/br', '/', 'gzip, deflate, br')):
+        cache = {}
+        first = browser_visit(client, path, encoding, cache)
+        repeat = browser_visit(client, path, encoding, cache)
+        print(f"   {label:<16} first {first:>7}  repeat {repeat:>7}")
+        if label == 'legacy inline':
+            legacy = first
+    assert first < legacy / 3, "compressed first visit should be under a third of the inline page"
+    assert repeat < 1024, "repeat visits should be answered with a 304"
+    # A client refusing the uncompressed body gets a compressed one, or 406 if it accepts none we have
+    assert client.get('/', headers={'Accept-Encoding': 'gzip, identity;q=0'}).content_encoding == 'gzip'
+    for refused in ('identity;q=0', '*;q=0', 'compress, *;q=0'):
+        assert client.get('/', headers={'Accept-Encoding': refused}).status_code == 406, refused
+
+
+def bench_response_modes(n_requests=20):
+    """Payload size and server CPU per /analyze request for each response mode"""
+    print("📊 /analyze response modes (warm render cache)")
+    client = app.test_client()
+    payload = np.random.default_rng(0).integers(0, 256, 300 * 1024, dtype=np.uint8).tobytes()
+    modes = [
+        ('json+base64', '/analyze?inline=1', 'application/json'),
+        ('image/png', '/analyze', 'image/png'),
+        ('multipart', '/analyze', 'multipart/mixed'),
+    ]
+    for name, url, accept in modes:
+        def call():
+            return client.post(url, data={'audio': (BytesIO(payload), 'clip.webm')},
+                               headers={'Accept': accept}).data
+        size = len(call())
+        start = time.process_time()
+        for _ in range(n_requests):
+            call()
+        cpu = (time.process_time() - start) / n_requests
+        print(f"   {name:<12} {size / 1024:8.1f} KB  {cpu * 1000:6.2f} ms CPU")
+
+
+def bench_upload_paths(sizes_kb=(100, 1024, 10 * 1024 - 8)):
+    """Request latency of the temp-file round trip versus in-memory and spilled uploads"""
+    print("📊 Upload handling latency (milliseconds per request)")
+    client = app.test_client()
+    rng = np.random.default_rng(0)
+    saved_config = dict(app.config)
+    locations = [('tmpfs', '/dev/shm'), ('disk', os.path.abspath(saved_config['UPLOAD_FOLDER']))]
+    try:
+        for label, directory in locations:
+            if not os.path.isdir(directory):
+                continue
+            app.config['UPLOAD_FOLDER'] = directory
+            for size_kb in sizes_kb:
+                payload = rng.integers(0, 256, size_kb * 1024, dtype=np.uint8).tobytes()
+
+                def post(url):
+                    client.post(url, data={'audio': (BytesIO(payload), 'clip.webm')})
+
+                legacy = timed(post, '/bench/legacy-analyze')
+                app.config['UPLOAD_SPOOL_THRESHOLD'] = saved_config['UPLOAD_SPOOL_THRESHOLD']
+                default = timed(post, '/analyze')
+                app.config['UPLOAD_SPOOL_THRESHOLD'] = 0
+                spilled = timed(post, '/analyze')
+                print(f"   {label:<5} {size_kb:>6} KB  legacy {legacy * 1000:7.2f}  "
+                      f"default {default * 1000:7.2f}  always-spill {spilled * 1000:7.2f}")
+    finally:
+        app.config.update(saved_config)
+
+
+def encode_wav(samples, sample_rate, float32=False):
+    """WAV bytes for float samples of shape (frames, channels), as 16-bit PCM or 32-bit float"""
+    if float32:
+        data, tag, width = samples.astype('<f4').tobytes(), 3, 4
+    else:
+        data, tag, width = (np.clip(samples, -1, 1) * 32767).astype('<i2').tobytes(), 1, 2
+    channels = samples.shape[1]
+    header = struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + len(data), b'WAVE', b'fmt ', 16, tag, channels,
+                         sample_rate, sample_rate * channels * width, channels * width, 8 * width,
+                         b'data', len(data))
+    return header + data
+
+
+def browser_pcm16(samples, sample_rate, target_rate=16000):
+    """Stand-in for the page's OfflineAudioContext step: downmix, resample, big-endian int16"""
+    mono = samples.mean(axis=1)
+    frames = int(np.ceil(len(mono) * target_rate / sample_rate))
+    resampled = np.interp(np.arange(frames) * sample_rate / target_rate, np.arange(len(mono)), mono)
+    return (np.clip(resampled, -1, 1) * 32767).astype('>i2').tobytes()
+
+
+def bench_pcm_upload(seconds=5):
+    """Upload size and /analyze latency of a recorded clip before and after client-side resampling"""
+    print(f"📊 Recorded-clip uploads ({seconds} s clip)")
+    client = app.test_client()
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * 48000)) / 48000
+    voice = 0.4 * np.sin(2 * np.pi * 180 * t * (1 + 0.05 * np.sin(3 * t))) + 0.02 * rng.standard_normal(t.size)
+    stereo44 = np.interp(np.arange(int(seconds * 44100)) / 44100, t, voice)[:, np.newaxis].repeat(2, axis=1)
+
+    uploads = [
+        ('WAV 44.1 kHz stereo s16', encode_wav(stereo44, 44100), None),
+        ('WAV 48 kHz mono f32', encode_wav(voice[:, np.newaxis], 48000, float32=True), None),
+        ('audio/L16 16 kHz mono', browser_pcm16(stereo44, 44100), 'audio/L16; rate=16000; channels=1'),
+    ]
+    for label, payload, content_type in uploads:
+        if content_type is None:
+            body = lambda: {'audio': (BytesIO(payload), 'clip.wav')}
+            content_type = 'multipart/form-data'
+        else:
+            body = lambda: payload
+
+        def post():
+            result = client.post('/analyze', data=body(), content_type=content_type).get_json()
+            assert result['success'], result
+
+        print(f"   {label:<24} {len(payload) / 1024:8.1f} KB  {timed(post) * 1000:7.2f} ms")
+
+    # audio/L16 must decode to exactly the samples of the equivalent WAV
+    pcm = browser_pcm16(stereo44, 44100)
+    as_wav = encode_wav(np.frombuffer(pcm, dtype='>i2')[:, np.newaxis] / 32767, 16000)
+    from_wav, _ = analyzer.extract_signal_features(as_wav, None)
+    from_pcm, _ = analyzer.extract_signal_features(pcm, None, (16000, 1))
+    for name in from_pcm['acoustic'].dtype.names:
+        assert np.allclose(from_pcm['acoustic'][name], from_wav['acoustic'][name], atol=1e-4), name
+    assert len(pcm) * 5 < len(uploads[0][1])
+
+
+def bench_batch(n_clips=64, clip_kb=512):
+    """Throughput of /analyze/batch against the number of analysis worker processes"""
+    print(f"📊 /analyze/batch throughput ({n_clips} clips x {clip_kb} KB, {os.cpu_count()} CPUs)")
+    client = app.test_client()
+    rng = np.random.default_rng(0)
+    clips = [rng.integers(0, 4, clip_kb * 1024, dtype=np.uint8).tobytes() for _ in range(n_clips)]
+    saved_length = app.config['MAX_CONTENT_LENGTH']
+    saved_executor = analyzer.executor
+    app.config['MAX_CONTENT_LENGTH'] = None
+    baseline = expected = None
+    try:
+        for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+            # Batches spread over the analysis executor's processes, as with ANALYSIS_EXECUTOR=process
+            analyzer.executor = AnalysisExecutor('process', workers, 32)
+            analyzer.executor.start()
+            
+            def post():
+                files = [(BytesIO(clip), f'clip{i}.webm') for i, clip in enumerate(clips)]
+                return client.post(f'/analyze/batch?visualize=0&workers={workers}',
+                                   data={'audio': files}).get_json()
+            try:
+                results = post()['results']
+                elapsed = timed(post)
+                timings = post()['timings_ms']
+            finally:
+                analyzer.executor.pool.shutdown()
+            baseline = baseline or elapsed
+            expected = expected or results
+            assert results == expected
+            # analyze_batch clamps to BATCH_MAX_WORKERS (the CPU count by default)
+            used = min(workers, BATCH_MAX_WORKERS)
+            print(f"   workers {workers:>2} ({used} used)  {n_clips / elapsed:8.1f} clips/s  "
+                  f"{baseline / elapsed:4.2f}x  stages {timings}")
+    finally:
+        analyzer.executor = saved_executor
+        app.config['MAX_CONTENT_LENGTH'] = saved_length
+
+def check_archive_limits(bomb_mb=300):
+    """/analyze/batch rejects archives by member count and expanded size before decompressing"""
+    print(f"🧨 Archive limits ({bomb_mb} MB of zeros, zip and tar.gz)")
+    client = app.test_client()
+    zeros = bytes(1024 * 1024)
+    archives = {}
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('bomb.wav', 'w', force_zip64=True) as f:
+            for _ in range(bomb_mb):
+                f.write(zeros)
+    archives['zip'] = buffer.getvalue()
+    buffer = BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        info = tarfile.TarInfo('bomb.wav')
+        info.size = bomb_mb * len(zeros)
+        archive.addfile(info, BytesIO(zeros * bomb_mb))
+    archives['tar.gz'] = buffer.getvalue()
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for index in range(BATCH_MAX_CLIPS + 1):
+            archive.writestr(f'clip{index}.wav', b'')
+    archives['many'] = buffer.getvalue()
+    
+    for label, payload in archives.items():
+        tracemalloc.start()
+        result = client.post('/analyze/batch', data={'archive': (BytesIO(payload), f'clips.{label}')}).get_json()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert not result['success'], result
+        assert peak < 32 * 2**20, peak
+        print(f"   {label:<7} {len(payload) / 1024:8.1f} KB upload rejected ({result['error']}), "
+              f"peak traced memory {peak / 2**20:5.2f} MB")
+    
+    # A tar is walked header by header and rejected as soon as it passes the clip limit
+    buffer = BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as archive:
+        for index in range(20 * BATCH_MAX_CLIPS):
+            archive.addfile(tarfile.TarInfo(f'clip{index}.wav'), BytesIO())
+    buffer.seek(0)
+    try:
+        read_archive_clips(buffer)
+    except ValueError as e:
+        error = str(e)
+    assert error == f'At most {BATCH_MAX_CLIPS} clips per batch', error
+    assert buffer.tell() < len(buffer.getvalue()) // 10, (buffer.tell(), len(buffer.getvalue()))
+    print(f"   tar with {20 * BATCH_MAX_CLIPS} members rejected after reading "
+          f"{buffer.tell() / 1024:.0f} of {len(buffer.getvalue()) / 1024:.0f} KB")
+    try:
+        read_archive_clips(BytesIO(archives['many']), max_clips=-3)
+    except ValueError as e:
+        error = str(e)
+    assert error == 'At most 0 clips per batch', error
+
+
+def bench_stream(size_mb=5, frame_kb=4, window_kb=8, long_mb=200):
+    """Time to first rolling update versus a whole-file /analyze, and memory on a long stream"""
+    print(f"📊 Streaming analysis ({size_mb} MB in {frame_kb} KB frames, {window_kb} KB windows)")
+    client = app.test_client()
+    payload = np.random.default_rng(0).integers(0, 256, size_mb * 1024 * 1024, dtype=np.uint8).tobytes()
+    frame = frame_kb * 1024
+    saved_length = app.config['MAX_CONTENT_LENGTH']
+    app.config['MAX_CONTENT_LENGTH'] = None
+    try:
+        whole = timed(lambda: client.post('/analyze', data={'audio': (BytesIO(payload), 'clip.webm')}))
+        expected = client.post('/analyze', data={'audio': (BytesIO(payload), 'clip.webm')}).get_json()
+    finally:
+        app.config['MAX_CONTENT_LENGTH'] = saved_length
+    
+    session = StreamSession(analyzer, window_kb * 1024)
+    start = time.perf_counter()
+    first = None
+    for offset in range(0, len(payload), frame):
+        if session.feed(payload[offset:offset + frame]) and first is None:
+            first = time.perf_counter() - start
+    final = session.finish()[-1]
+    total = time.perf_counter() - start
+    assert (final['emotion'], final['confidence']) == (expected['emotion'], expected['confidence'])
+    print(f"   whole-file /analyze {whole * 1000:8.2f} ms  first update {first * 1000:6.3f} ms  "
+          f"all {final['windows']} windows {total * 1000:8.2f} ms")
+    
+    # Decodable streams are judged from their sound, not their size: calm and excited
+    # speech differ in every window whatever its size, and the final result is /analyze's
+    rng = np.random.default_rng(0)
+    t = np.arange(4 * 16000) / 16000
+    calm = 0.05 * np.sin(2 * np.pi * 120 * t) + 0.01 * rng.standard_normal(t.size)
+    excited = 0.6 * np.sin(2 * np.pi * 300 * t * (1 + 0.1 * np.sin(7 * t))) + 0.01 * rng.standard_normal(t.size)
+    streams = {}
+    for name, signal in (('calm', calm), ('excited', excited)):
+        pcm = (signal * 32767).astype('<i2')
+        wav = struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + 2 * pcm.size, b'WAVE', b'fmt ', 16, 1, 1,
+                          16000, 32000, 2, 16, b'data', 2 * pcm.size) + pcm.tobytes()
+        streams[name] = [(wav, None), (pcm.astype('>i2').tobytes(), (16000, 1))]
+    emotions = {}
+    for name, inputs in streams.items():
+        for body, pcm_format in inputs:
+            expected_emotion, expected_confidence, _ = analyzer.classify_audio(body, pcm_format=pcm_format)
+            for size_kb in (window_kb, 64):
+                session = StreamSession(analyzer, size_kb * 1024, pcm_format)
+                for offset in range(0, len(body), frame):
+                    session.feed(body[offset:offset + frame])
+                final = session.finish()[-1]
+                assert final['emotion'] == expected_emotion, (name, size_kb, final, expected_emotion)
+                assert abs(final['confidence'] - expected_confidence) < 1e-6, (final, expected_confidence)
+                emotions.setdefault(name, set()).update(final['window_emotions'])
+    assert not emotions['calm'] & emotions['excited'], emotions
+    print(f"   window emotions  calm {sorted(emotions['calm'])}  excited {sorted(emotions['excited'])}")
+    
+    # Memory must not grow with the stream length
+    chunk = payload[:1024 * 1024]
+    session = StreamSession(analyzer, window_kb * 1024)
+    tracemalloc.start()
+    for _ in range(long_mb):
+        for offset in range(0, len(chunk), frame):
+            session.feed(chunk[offset:offset + frame])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    session.finish()
+    assert peak < 1024 * 1024, peak
+    print(f"   {long_mb} MB stream  peak traced memory {peak / 1024:.1f} KB")
+
+
+def write_long_wav(path, seconds, sample_rate=16000, block_seconds=60):
+    """Synthesize a long 16-bit mono WAV on disk one block at a time: calm and excited minutes alternate"""
+    frames = int(seconds * sample_rate)
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + 2 * frames, b'WAVE', b'fmt ', 16, 1, 1,
+                            sample_rate, 2 * sample_rate, 2, 16, b'data', 2 * frames))
+        rng = np.random.default_rng(0)
+        for start in range(0, frames, block_seconds * sample_rate):
+            t = np.arange(start, min(start + block_seconds * sample_rate, frames)) / sample_rate
+            if (start // (block_seconds * sample_rate)) % 2:
+                block = 0.6 * np.sin(2 * np.pi * 300 * t * (1 + 0.1 * np.sin(7 * t)))
+            else:
+                block = 0.05 * np.sin(2 * np.pi * 120 * t)
+            block += 0.01 * rng.standard_normal(t.size)
+            f.write((block * 32767).astype('<i2').tobytes())
+
+
+def check_long_audio(durations=(360, 3600)):
+    """/analyze/long on synthesized recordings: peak memory must not grow with length"""
+    print("📊 Long-audio timeline (raw WAV body through /analyze/long)")
+    client = app.test_client()
+    peaks = []
+    with tempfile.TemporaryDirectory() as directory:
+        for seconds in durations:
+            path = os.path.join(directory, f'{seconds}.wav')
+            write_long_wav(path, seconds)
+            with open(path, 'rb') as f:
+                tracemalloc.start()
+                start = time.perf_counter()
+                response = client.post('/analyze/long', input_stream=f, content_type='audio/wav',
+                                       content_length=os.path.getsize(path))
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            result = response.get_json()
+            assert result['success'] and result['duration'] == seconds, result
+            # Calm and excited minutes alternate, so the timeline must change emotion
+            assert len({segment['emotion'] for segment in result['timeline']}) > 1
+            peaks.append(peak)
+            print(f"   {seconds / 60:5.0f} min  {os.path.getsize(path) / 2**20:6.1f} MB  "
+                  f"{result['segments']:>4} segments  {elapsed:6.2f} s ({seconds / elapsed:5.0f}x real time)  "
+                  f"peak traced memory {peak / 2**20:5.2f} MB")
+    assert peaks[-1] < 1.5 * peaks[0], peaks
+
+
+def wait_for_jobs(store, job_ids, statuses=('done', 'failed', 'cancelled'), timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        jobs = [store.get(job_id) for job_id in job_ids]
+        if all(job['status'] in statuses for job in jobs):
+            return jobs
+        time.sleep(0.05)
+    raise AssertionError(f'jobs did not reach {statuses}: {[job["status"] for job in jobs]}')
+
+
+def save_file(path):
+    def save_inputs(directory):
+        with open(path, 'rb') as source, open(os.path.join(directory, '0'), 'wb') as f:
+            f.write(source.read())
+    return save_inputs
+
+
+def check_jobs(long_seconds=600):
+    """/jobs: priority order, cancellation, restart recovery and submit latency"""
+    print("📊 Job queue (POST /jobs vs synchronous /analyze/long)")
+    with tempfile.TemporaryDirectory() as directory:
+        clip = os.path.join(directory, 'clip.wav')
+        with open(clip, 'wb') as f:
+            f.write(synthetic_wav(3.0))
+        recording = os.path.join(directory, 'long.wav')
+        write_long_wav(recording, long_seconds)
+        store_path = os.path.join(directory, 'jobs.sqlite3')
+        queue = JobQueue(store_path, os.path.join(directory, 'jobs'), 1, 100, 3600)
+        
+        # Queued before the worker starts, so the claim order is purely by priority
+        priorities = [2, 9, 5, 9, 0, 7]
+        job_ids = [queue.submit('analyze', priority, {}, save_file(clip)) for priority in priorities]
+        assert queue.store.get(job_ids[0])['position'] == 4
+        assert queue.cancel(job_ids[4]) == 'cancelled'
+        assert not os.path.exists(queue.input_dir(job_ids[4]))
+        queue.start()
+        jobs = wait_for_jobs(queue.store, job_ids)
+        ran = sorted((job for job in jobs if job['started']), key=lambda job: job['started'])
+        assert [job['priority'] for job in ran] == [9, 9, 7, 5, 2], [job['priority'] for job in ran]
+        # Equal priorities run first come, first served
+        assert [job['job_id'] for job in ran[:2]] == [job_ids[1], job_ids[3]]
+        assert all(job['status'] == 'done' and job['result']['emotion'] for job in ran)
+        assert jobs[4]['status'] == 'cancelled' and jobs[4]['started'] is None
+        print(f"   priorities {priorities} ran as {[job['priority'] for job in ran]}, priority 0 cancelled while queued")
+        
+        # A failing store (locked, disk full) neither stops the worker nor loses the job it held
+        failures = {'claim': 1, 'cancel_requested': 1}
+        
+        def failing(name):
+            method = getattr(queue.store, name)
+            
+            def call(*args):
+                if failures[name]:
+                    failures[name] -= 1
+                    raise sqlite3.OperationalError('database is locked')
+                return method(*args)
+            return call
+        
+        for name in failures:
+            setattr(queue.store, name, failing(name))
+        try:
+            job_id = queue.submit('long', 5, {'window': 1.0, 'overlap': 0.5}, save_file(clip))
+            job, = wait_for_jobs(queue.store, [job_id])
+        finally:
+            for name in failures:
+                delattr(queue.store, name)
+        assert job['status'] == 'done' and not any(failures.values()), (job, failures)
+        print("   worker survived store errors on claim and on a checkpoint; the job ran again")
+        
+        # A running job stops at its next checkpoint
+        job_id = queue.submit('long', 5, {'window': 10.0, 'overlap': 5.0}, save_file(recording))
+        wait_for_jobs(queue.store, [job_id], statuses=('running',))
+        requested = time.perf_counter()
+        assert queue.cancel(job_id) == 'running'
+        job, = wait_for_jobs(queue.store, [job_id])
+        stopped = time.perf_counter() - requested
+        assert job['status'] == 'cancelled' and job['result'] is None, job
+        assert not os.path.exists(queue.input_dir(job_id))
+        print(f"   running {long_seconds / 60:.0f} min job cancelled after {stopped * 1000:.0f} ms")
+        
+        # Results outlive the process; a job left running by a stopped server is queued again
+        # once its lease lapses, even when the restarted server has the same PID (PID 1 in a container)
+        restarted = JobStore(store_path)
+        assert restarted.get(job_ids[1])['result'] == jobs[1]['result']
+        orphans_path = os.path.join(directory, 'orphans.sqlite3')
+        predecessor = JobStore(orphans_path)
+        predecessor.submit('orphan', 'analyze', 0, {})
+        assert predecessor.claim(f'{socket.gethostname()}:{os.getpid()}:previous')[0] == 'orphan'
+        successor = JobQueue(orphans_path, os.path.join(directory, 'orphan-jobs'), 1, 100, 3600, lease=0.5)
+        os.makedirs(successor.input_dir('orphan'))
+        save_file(clip)(successor.input_dir('orphan'))
+        time.sleep(0.6)
+        successor.start()
+        assert wait_for_jobs(successor.store, ['orphan'])[0]['status'] == 'done'
+        # A live owner keeps renewing its lease, so its long job is never taken over
+        job_id = successor.submit('long', 5, {'window': 10.0, 'overlap': 5.0}, save_file(recording))
+        started = wait_for_jobs(successor.store, [job_id], statuses=('running',))[0]['started']
+        time.sleep(1.5)
+        assert successor.store.get(job_id)['started'] == started
+        successor.cancel(job_id)
+        wait_for_jobs(successor.store, [job_id])
+        # Finished jobs are purged while the server keeps running, not only at start
+        successor.retention = 0.1
+        successor.purge_interval = 0.2
+        deadline = time.time() + 5
+        while (successor.store.get('orphan') or successor.store.get(job_id)) and time.time() < deadline:
+            time.sleep(0.05)
+        assert successor.store.get('orphan') is None and successor.store.get(job_id) is None
+        print("   results survive a new store; a stopped server's jobs are re-queued, a live one's are not;\n"
+              "   finished jobs are purged while running")
+        
+        # Submitting answers before the analysis runs
+        client = app.test_client()
+        original, emotiondetection.job_queue = emotiondetection.job_queue, queue
+        try:
+            with open(recording, 'rb') as f:
+                start = time.perf_counter()
+                response = client.post('/jobs?kind=long&priority=9', input_stream=f, content_type='audio/wav',
+                                       content_length=os.path.getsize(recording))
+                submitted = time.perf_counter() - start
+            assert response.status_code == 202, response.get_json()
+            status_url = response.headers['Location']
+            job_id = response.get_json()['job_id']
+            wait_for_jobs(queue.store, [job_id])
+            result = client.get(status_url).get_json()
+            assert result['status'] == 'done' and result['result']['duration'] == long_seconds, result
+            with open(recording, 'rb') as f:
+                start = time.perf_counter()
+                response = client.post('/analyze/long', input_stream=f, content_type='audio/wav',
+                                       content_length=os.path.getsize(recording))
+                synchronous = time.perf_counter() - start
+            assert response.get_json()['segments'] == result['result']['segments']
+            assert client.delete(status_url).status_code == 409
+            # Visualizations of jobs finished before a restart are registered again from the stored spec
+            analyzer.render_specs.clear()
+            analyzer.render_cache.clear()
+            result = client.get(f'/jobs/{job_ids[1]}').get_json()['result']
+            assert 'render_specs' not in result and client.get(result['visualization_url']).status_code == 200
+        finally:
+            emotiondetection.job_queue = original
+            # Before the temporary directory holding their stores goes away
+            queue.stop()
+            successor.stop()
+        print(f"   POST /jobs answered in {submitted * 1000:6.1f} ms; /analyze/long held the request "
+              f"{synchronous * 1000:6.0f} ms ({synchronous / submitted:.0f}x)")
+
+
+def read_shared_entry(path, key):
+    """Look up key in a SQLite result cache from another process"""
+    return SQLiteResultCache(path, 100, 60).get(key)
+
+
+def bench_result_cache(seconds=30):
+    """/analyze latency for a new upload versus a repeated one, per cache backend"""
+    print(f"📊 Result cache (/analyze of a {seconds} s WAV, milliseconds per request)")
+    client = app.test_client()
+    payload = synthetic_wav(seconds)
+    
+    def post():
+        return client.post('/analyze', data={'audio': (BytesIO(payload), 'clip.wav')}).get_json()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'results.sqlite3')
+        backends = [('memory', MemoryResultCache(1000, 60)), ('sqlite', SQLiteResultCache(path, 1000, 60))]
+        try:
+            for label, cache in backends:
+                analyzer.result_cache = cache
+                start = time.perf_counter()
+                cold = post()
+                miss = time.perf_counter() - start
+                hit = timed(post)
+                assert post() == cold
+                print(f"   {label:<6}  miss {miss * 1000:8.2f}  hit {hit * 1000:8.2f}  "
+                      f"hit ratio {cache.stats()['hit_rate']:.2f}")
+            
+            # audio/L16 bodies are keyed by their format too: a repeat hits, the same bytes as a file miss
+            cache = MemoryResultCache(1000, 60)
+            analyzer.result_cache = cache
+            pcm = browser_pcm16(np.frombuffer(payload[44:], '<i2')[:, np.newaxis] / 32768, 16000)
+            for _ in range(2):
+                pcm_result = client.post('/analyze', data=pcm, content_type='audio/L16; rate=16000').get_json()
+                assert pcm_result['success'], pcm_result
+            assert cache.stats()['hits'] == 1, cache.stats()
+            file_result = client.post('/analyze', data={'audio': (BytesIO(pcm), 'clip.webm')}).get_json()
+            assert file_result['success'] and cache.stats()['hits'] == 1, cache.stats()
+            assert cache.stats()['misses'] == 2, cache.stats()
+            print("   audio/L16 repeats hit; the same bytes uploaded as a file do not")
+            cache = backends[1][1]
+            
+            # Entries written here are visible to other processes sharing the file
+            key = next(iter(cache.connect().execute('SELECT key FROM results')))[0]
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                assert pool.submit(read_shared_entry, path, key).result() is not None
+            print("   sqlite entries are shared across processes")
+        finally:
+            analyzer.result_cache = None
+
+
+def scrape_value(text, sample):
+    """Value of one sample line in a Prometheus exposition, or 0 if absent"""
+    for line in text.splitlines():
+        if line.startswith(sample + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+def check_metrics_scrape(n_requests=20):
+    """Scrape /metrics around a burst of requests and time the instrumentation itself"""
+    print("📈 /metrics scrape check")
+    client = app.test_client()
+    payload = np.random.default_rng(0).integers(0, 256, 64 * 1024, dtype=np.uint8).tobytes()
+    requests_sample = 'emotion_requests_total{endpoint="analyze",status="200"}'
+    bytes_sample = 'emotion_bytes_processed_total'
+
+    before = client.get('/metrics').data.decode()
+    for _ in range(n_requests):
+        response = client.post('/analyze', data={'audio': (BytesIO(payload), 'clip.webm')})
+        assert 'features;dur=' in response.headers['Server-Timing']
+    after = client.get('/metrics').data.decode()
+
+    assert scrape_value(after, requests_sample) - scrape_value(before, requests_sample) == n_requests
+    assert scrape_value(after, bytes_sample) - scrape_value(before, bytes_sample) == n_requests * len(payload)
+    assert 'emotion_stage_duration_seconds_count{stage="features"}' in after
+
+    registry = Metrics()
+    observe_time = timed(lambda: [registry.observe('x', 0.01, stage='features') for _ in range(100000)])
+    inc_time = timed(lambda: [registry.inc('y', endpoint='analyze') for _ in range(100000)])
+    print(f"   counters consistent; observe {observe_time * 10:.2f} µs, inc {inc_time * 10:.2f} µs per call")
+
+
+def stress_concurrent_analyze(n_requests=64, n_threads=16):
+    """Fire parallel /analyze requests and check every result against a serial run"""
+    print(f"🔥 Concurrent /analyze stress test ({n_requests} requests, {n_threads} threads)")
+    rng = np.random.default_rng(0)
+    # Equal sizes so only the content-derived RNG can tell the uploads apart
+    payloads = [rng.integers(0, 256 - i, 100 * 1024, dtype=np.uint8).tobytes()
+                for i in range(n_requests)]
+    serial = [analyzer.classify_audio(payload)[:2] for payload in payloads]
+    expected = [post_audio(payload)['png'] for payload in payloads[:n_threads]]
+    # Force every parallel request to render rather than hit the cache
+    analyzer.render_cache.clear()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        results = list(pool.map(post_audio, payloads))
+    elapsed = time.perf_counter() - start
+
+    for i, result in enumerate(results):
+        assert result['success'], result
+        assert (result['emotion'], result['confidence']) == serial[i], i
+        assert result['png'][:8] == b'\x89PNG\r\n\x1a\n', i
+        if i < len(expected):
+            assert result['png'] == expected[i], i
+    print(f"   all {n_requests} results match the serial run, {n_requests / elapsed:.1f} requests/s")
+
+
+def import_profile(module):
+    """Run `python -X importtime -c "import module"`; return [(cumulative_us, depth, name)] or None"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        return None
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), (len(name) - len(name.lstrip())) // 2, name.strip()))
+    return rows
+
+
+def startup_report(modules=('emotiondetection', 'disease'), eager=('matplotlib.figure', 'plotly.express', 'pandas'), top=10):
+    """-X importtime summary of each app and of the stacks it now imports lazily"""
+    print("🚀 Startup import report (milliseconds, cumulative)")
+    for module in modules:
+        rows = import_profile(module)
+        if rows is None:
+            print(f"   {module:<28} not importable here (missing dependency)")
+            continue
+        total = next(cumulative for cumulative, _, name in rows if name == module)
+        print(f"   {module:<28} {total / 1000:8.1f}")
+        children = sorted((row for row in rows if row[1] == 1), reverse=True)[:top]
+        for cumulative, _, name in children:
+            print(f"      {name:<25} {cumulative / 1000:8.1f}")
+    for module in eager:
+        rows = import_profile(module)
+        if rows is not None:
+            print(f"   deferred: {module:<18} {rows[-1][0] / 1000:8.1f}")
+
+
+COLD_START_SCRIPT = """
+import sys, time
+from io import BytesIO
+start = time.perf_counter()
+import emotiondetection as e
+imported = time.perf_counter() - start
+warm = e.warm_up() if sys.argv[1] == 'warm' else 0.0
+client = e.app.test_client()
+latencies = []
+for freq in (220.0, 330.0):
+    start = time.perf_counter()
+    clip = e.synthetic_wav(3.0, freq=freq)
+    result = client.post('/analyze', data={'audio': (BytesIO(clip), 'clip.wav')}).get_json()
+    assert client.get(result['visualization_url']).status_code == 200
+    latencies.append(time.perf_counter() - start)
+print(imported, warm, *latencies)
+"""
+
+
+def bench_cold_start(runs=3):
+    """First-request latency in a fresh process, with and without the start-up warm-up"""
+    print(f"🚀 Cold start (fresh process, best of {runs}, milliseconds)")
+    env = dict(os.environ, RESULT_CACHE='off')
+    for mode in ('cold', 'warm'):
+        samples = []
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, '-c', COLD_START_SCRIPT, mode], env=env,
+                                    capture_output=True, text=True, check=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+            samples.append([float(value) * 1000 for value in output.split()[-4:]])
+        imported, warm, first, second = np.min(samples, axis=0)
+        print(f"   {mode:<5} import {imported:7.1f}  warm-up {warm:7.1f}  "
+              f"first request {first:7.1f}  second request {second:7.1f}")
+
+
+# Pipeline suite: per-stage timings and memory peaks as JSON, comparable across commits
+SUITE_FORMAT = 1
+SUITE_DURATIONS = (5, 30, 120)
+# Slowdowns smaller than these are timer noise on a busy box, whatever the ratio
+SUITE_MIN_SECONDS = 0.002
+SUITE_MIN_BYTES = 1024 * 1024
+
+
+def synthetic_speech(seconds, sample_rate=16000, seed=0):
+    """Mono float samples with a gliding pitch, syllable-rate loudness and breath noise"""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 160 + 40 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = np.sin(phase) + 0.5 * np.sin(2 * phase) + 0.25 * np.sin(3 * phase)
+    envelope = 0.2 + 0.8 * np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    noise = 0.02 * np.random.default_rng(seed).standard_normal(t.size)
+    return (0.25 * voice * envelope + noise)[:, np.newaxis]
+
+
+def encode_webm(samples, sample_rate, bitrate=32000):
+    """Opus-in-WebM bytes as MediaRecorder uploads them, or None without PyAV"""
+    try:
+        import av
+    except ImportError:
+        return None
+    buffer = BytesIO()
+    with av.open(buffer, 'w', format='webm') as container:
+        stream = container.add_stream('libopus', rate=48000)
+        stream.bit_rate = bitrate
+        pcm = (np.clip(samples[:, 0], -1, 1) * 32767).astype(np.int16)
+        step = sample_rate // 50
+        for offset in range(0, len(pcm), step):
+            frame = av.AudioFrame.from_ndarray(pcm[np.newaxis, offset:offset + step], format='s16', layout='mono')
+            frame.sample_rate = sample_rate
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buffer.getvalue()
+
+
+def suite_inputs(durations):
+    """{name: bytes} of WAV and WebM recordings of each duration.
+
+    Without PyAV the WebM inputs are EBML-headed noise at the recorder's
+    bitrate: what the server sees then, since it cannot decode them either.
+    """
+    inputs = {}
+    for seconds in durations:
+        samples = synthetic_speech(seconds)
+        inputs[f'wav-{seconds}s'] = encode_wav(samples, 16000)
+        webm = encode_webm(samples, 16000)
+        if webm is None:
+            noise = np.random.default_rng(seconds).integers(0, 256, seconds * 4000, dtype=np.uint8)
+            webm = b'\x1a\x45\xdf\xa3' + noise.tobytes()
+        inputs[f'webm-{seconds}s'] = webm
+    return inputs
+
+
+def analyze_route(client, payload):
+    """POST /analyze, then fetch its visualization the way the page does"""
+    response = client.post('/analyze', data={'audio': (BytesIO(payload), 'recording.webm')})
+    result = response.get_json()
+    assert result['success'], result
+    # A fresh render cache, so every repetition renders like a new upload
+    analyzer.render_cache = RenderCache(RENDER_CACHE_BYTES)
+    image = client.get(result['visualization_url'])
+    assert image.status_code == 200
+    return result
+
+
+def measure(func, repeat, sample_seconds=0.05):
+    """Per-call timings of repeated calls, then the traced memory peak of one more.
+
+    Fast stages are looped until a sample lasts sample_seconds, as timeit's
+    autorange does, so timer and scheduler jitter do not swamp them.
+    """
+    start = time.perf_counter()
+    func()  # imports, figure templates and other first-use costs
+    first = time.perf_counter() - start
+    loops = max(1, int(sample_seconds / max(first, 1e-6)))
+    samples = []
+    # As timeit does, so a collection triggered by earlier garbage is not billed to this stage
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(loops):
+                func()
+            samples.append((time.perf_counter() - start) / loops)
+    finally:
+        gc.enable()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'min_seconds': min(samples),
+        'median_seconds': float(np.median(samples)),
+        'loops': loops,
+        'peak_bytes': peak
+    }
+
+
+def suite_environment():
+    """What the numbers depend on besides the code"""
+    from importlib.metadata import version, PackageNotFoundError
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    capture_output=True, text=True, check=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    try:
+        version('av')
+        webm = 'opus'
+    except PackageNotFoundError:
+        webm = 'undecodable'
+    return {
+        'commit': commit,
+        'dirty': dirty,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'numpy': version('numpy'),
+        'matplotlib': version('matplotlib'),
+        'flask': version('flask'),
+        'webm_inputs': webm,
+        'spectrogram_mode': analyzer.spectrogram_mode,
+        'executor': analyzer.executor.kind,
+        'model': 'rules' if analyzer.model is None else analyzer.model.path
+    }
+
+
+def run_suite(durations=SUITE_DURATIONS, repeat=5):
+    """Time every pipeline stage and the /analyze route on each synthetic input"""
+    client = app.test_client()
+    results = {}
+    inputs = suite_inputs(durations)
+    print(f"📊 Pipeline suite (best of {repeat}, milliseconds; peak traced memory)")
+    for name, payload in inputs.items():
+        features = analyzer.extract_file_features(payload, len(payload))
+        signal_features, signal = analyzer.extract_signal_features(payload, BytesIO(payload))
+        features.update(signal_features)
+        if analyzer.spectrogram_mode != 'stft':
+            signal = None
+        stages = {
+            'extract_file_features': lambda: analyzer.extract_file_features(payload, len(payload)),
+            'extract_signal_features': lambda: analyzer.extract_signal_features(payload, BytesIO(payload)),
+            'determine_emotion': lambda: analyzer.determine_emotion(features),
+            # The render behind create_visualization, without its cache
+            'create_visualization': lambda: analyzer.render_visualization(features, len(payload), signal),
+            'route': lambda: analyze_route(client, payload)
+        }
+        for stage, func in stages.items():
+            result = measure(func, repeat)
+            result['input_bytes'] = len(payload)
+            result['decoded'] = bool(signal_features)
+            results[f'{name}/{stage}'] = result
+            print(f"   {name:<10} {stage:<24} {result['min_seconds'] * 1000:9.2f}  "
+                  f"{result['peak_bytes'] / 2**20:7.2f} MB")
+    # Linux reports kilobytes, macOS bytes
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'format': SUITE_FORMAT,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'environment': suite_environment(),
+        'repeat': repeat,
+        'max_rss_bytes': max_rss if sys.platform == 'darwin' else max_rss * 1024,
+        'results': results
+    }
+
+
+def compare_suites(baseline, current, threshold):
+    """Print stage-by-stage ratios; returns the regressed keys"""
+    changed = [key for key in ('python', 'machine', 'cpus', 'numpy', 'webm_inputs', 'spectrogram_mode', 'executor')
+               if baseline['environment'].get(key) != current['environment'].get(key)]
+    if changed:
+        print(f"⚠️  Environments differ in {', '.join(changed)}; ratios may not be comparable")
+    print(f"📊 {(baseline['environment']['commit'] or 'baseline')[:10]} -> "
+          f"{(current['environment']['commit'] or 'current')[:10]} (regression above {threshold:.0%})")
+    regressions = []
+    for key, result in current['results'].items():
+        before = baseline['results'].get(key)
+        if before is None:
+            print(f"   {key:<40} new")
+            continue
+        time_ratio = result['min_seconds'] / max(before['min_seconds'], 1e-9)
+        memory_ratio = result['peak_bytes'] / max(before['peak_bytes'], 1)
+        slower = (time_ratio > 1 + threshold and
+                  result['min_seconds'] - before['min_seconds'] > SUITE_MIN_SECONDS)
+        larger = (memory_ratio > 1 + threshold and
+                  result['peak_bytes'] - before['peak_bytes'] > SUITE_MIN_BYTES)
+        flags = ' '.join(flag for flag, hit in (('SLOWER', slower), ('MORE MEMORY', larger)) if hit)
+        if flags:
+            regressions.append(key)
+        print(f"   {key:<40} time {time_ratio:5.2f}x  memory {memory_ratio:5.2f}x  {flags}")
+    for key in sorted(baseline['results'].keys() - current['results'].keys()):
+        print(f"   {key:<40} removed")
+    if regressions:
+        print(f"❌ {len(regressions)} regressions")
+    else:
+        print("✅ No regressions")
+    return regressions
+
+
+def suite_main(argv):
+    parser = argparse.ArgumentParser(prog='benchmarks.py suite',
+                                     description='Time the analysis pipeline and write JSON results')
+    parser.add_argument('--out', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='earlier results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown, 0.25 = 25%%')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--durations', default=','.join(map(str, SUITE_DURATIONS)),
+                        help='input lengths in seconds')
+    args = parser.parse_args(argv)
+    
+    report = run_suite(tuple(int(seconds) for seconds in args.durations.split(',')), args.repeat)
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.out} (max RSS {report['max_rss_bytes'] / 2**20:.1f} MB)")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        return 1 if compare_suites(baseline, report, args.threshold) else 0
+    return 0
+
+
+def compare_main(argv):
+    parser = argparse.ArgumentParser(prog='benchmarks.py compare',
+                                     description='Compare two saved suite results')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown, 0.25 = 25%%')
+    args = parser.parse_args(argv)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    return 1 if compare_suites(baseline, current, args.threshold) else 0
+
+
+def main():
+    bench_byte_features()
+    bench_spectrogram()
+    bench_acoustic_features()
+    bench_model_inference()
+    bench_render_cache()
+    bench_render_profiles()
+    bench_frontend_transfer()
+    bench_response_modes()
+    bench_upload_paths()
+    bench_pcm_upload()
+    bench_batch()
+    check_archive_limits()
+    bench_stream()
+    check_long_audio()
+    check_jobs()
+    bench_result_cache()
+    check_metrics_scrape()
+    stress_concurrent_analyze()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['startup']:
+        startup_report()
+        bench_cold_start()
+    elif sys.argv[1:2] == ['suite']:
+        sys.exit(suite_main(sys.argv[2:]))
+    elif sys.argv[1:2] == ['compare']:
+        sys.exit(compare_main(sys.argv[2:]))
+    else:
+        main()
@@ -1,11 +1,18 @@
 
 import streamlit as st
-import pandas as pd
 import numpy as np
-import plotly.graph_objects as go
-import plotly.express as px
+import os
+import threading
 from datetime import datetime
 
+from lazy_imports import LazyModule
+
+# Charting stack, imported when a page first draws (or by the warm-up below),
+# so pages without charts never pay for it
+pd = LazyModule('pandas')
+go = LazyModule('plotly.graph_objects')
+px = LazyModule('plotly.express')
+
 # PAGE CONFIGURATION 
 st.set_page_config(
     page_title="HealthScope AI | Disease Risk Analyzer",
@@ -311,6 +318,26 @@ if 'predictions_history' not in st.session_state:
     st.session_state.predictions_history = []
 
 
+def warm_up_charts():
+    """Import plotly and pandas and serialize one dummy chart of each kind"""
+    go.Figure(go.Indicator(mode="gauge+number", value=50)).to_json()
+    px.bar(x=[1, 2], y=["a", "b"], orientation='h', color=[1, 2]).to_json()
+    pd.DataFrame([{'risk_score': 50}])['risk_score'].mean()
+
+
+@st.cache_resource
+def start_chart_warm_up():
+    """Warm the charting stack once per server process, off the script thread"""
+    if os.environ.get('WARMUP', '1') == '0':
+        return None
+    thread = threading.Thread(target=warm_up_charts, name='chart-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+start_chart_warm_up()
+
+
 def render_navigation():
     """Simple navigation"""
     pages = ["Home", "Prediction", "Results", "History"]
@@ -1,26 +1,1701 @@
 
-from flask import Flask, request, jsonify
+from flask import Flask, Request, request, jsonify, Response, url_for, current_app, g, stream_with_context
 import os
 import numpy as np
 import base64
 from io import BytesIO
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 import tempfile
 import wave
 import struct
+import mmap
 import random
+import bisect
+import sys
+import asyncio
+import contextvars
+import json
+from urllib.parse import quote, parse_qs
+import pickle
+import hashlib
+import gzip
+import functools
+import itertools
+import threading
+import sqlite3
+import shutil
+import uuid
+import socket
+from collections import OrderedDict
+from contextlib import contextmanager, ExitStack
+import time
+import multiprocessing
+import zipfile
+import tarfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from importlib import metadata
+from lazy_imports import LazyModule, IMPORT_TIMES
+
+# Plotting stack, imported on the first render (or by warm_up at server start)
+matplotlib = LazyModule('matplotlib', on_load=lambda module: module.use('Agg'))
+mpl_figure = LazyModule('matplotlib.figure', on_load=lambda module: matplotlib.use('Agg'))
+backend_agg = LazyModule('matplotlib.backends.backend_agg')
+
+class HashingBytesIO(BytesIO):
+    """BytesIO that hashes everything written to it, as the form parser fills it"""
+    
+    def __init__(self):
+        super().__init__()
+        self.digest = hashlib.blake2b(digest_size=16)
+    
+    def write(self, data):
+        self.digest.update(data)
+        return super().write(data)
+    
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+class HashingFile:
+    """File wrapper that hashes everything written through it"""
+    
+    def __init__(self, file):
+        self.file = file
+        self.digest = hashlib.blake2b(digest_size=16)
+    
+    def write(self, data):
+        self.digest.update(data)
+        return self.file.write(data)
+    
+    def hexdigest(self):
+        return self.digest.hexdigest()
+    
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+    
+    def __iter__(self):
+        return iter(self.file)
+
+class UploadRequest(Request):
+    """Request that keeps small uploads in memory and spills large ones to UPLOAD_FOLDER.
+    
+    Either way the upload is hashed while the body is parsed, so duplicate
+    uploads can be recognized without another pass over the data.
+    """
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        threshold = current_app.config['UPLOAD_SPOOL_THRESHOLD']
+        if total_content_length is not None and total_content_length <= threshold:
+            return HashingBytesIO()
+        # Anonymous file, removed by the OS as soon as it is closed
+        return HashingFile(tempfile.TemporaryFile('wb+', dir=current_app.config['UPLOAD_FOLDER']))
 
 # Create Flask app
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.config['SECRET_KEY'] = 'emotion-app-secret-key'
 app.config['UPLOAD_FOLDER'] = 'temp_uploads'
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10MB max
+app.config['UPLOAD_SPOOL_THRESHOLD'] = int(os.environ.get('UPLOAD_SPOOL_THRESHOLD', 2 * 1024 * 1024))
 
 # Create upload directory
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Chunk size used when consuming uploads incrementally
+FEATURE_CHUNK_SIZE = 1024 * 1024
+
+# Maximum number of visualizations rendered at the same time
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Memory budget for cached visualization images
+RENDER_CACHE_BYTES = int(os.environ.get('RENDER_CACHE_BYTES', 32 * 1024 * 1024))
+
+# Memory budget for inputs of visualizations awaiting GET /visualization/<id>
+RENDER_SPEC_BYTES = int(os.environ.get('RENDER_SPEC_BYTES', 64 * 1024 * 1024))
+
+# Where analysis runs: 'inline' on the request thread, 'thread' or 'process' pools
+ANALYSIS_EXECUTOR = os.environ.get('ANALYSIS_EXECUTOR', 'inline')
+ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', os.cpu_count() or 1))
+# Jobs allowed to wait for a worker before requests are rejected with 429
+ANALYSIS_QUEUE_LIMIT = int(os.environ.get('ANALYSIS_QUEUE_LIMIT', 32))
+ANALYSIS_RETRY_AFTER = int(os.environ.get('ANALYSIS_RETRY_AFTER', 1))
+
+# 'flask' runs the threaded development server, 'asgi' serves asgi_app with uvicorn
+SERVER_MODE = os.environ.get('SERVER_MODE', 'flask')
+ASGI_WORKERS = int(os.environ.get('ASGI_WORKERS', 32))
+ASGI_MAX_CONNECTIONS = int(os.environ.get('ASGI_MAX_CONNECTIONS', 1024))
+ASGI_KEEP_ALIVE = int(os.environ.get('ASGI_KEEP_ALIVE', 5))
+ASGI_DRAIN_TIMEOUT = int(os.environ.get('ASGI_DRAIN_TIMEOUT', 30))
+
+# Results of previously seen uploads: 'memory' (per process), 'sqlite' (shared file) or 'off'
+RESULT_CACHE = os.environ.get('RESULT_CACHE', 'memory')
+RESULT_CACHE_PATH = os.environ.get('RESULT_CACHE_PATH', os.path.join(app.config['UPLOAD_FOLDER'], 'results.sqlite3'))
+RESULT_CACHE_ENTRIES = int(os.environ.get('RESULT_CACHE_ENTRIES', 10000))
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', 24 * 3600))
+
+# Directory of a model written by train_model.py; unset uses the rule-based classifier
+EMOTION_MODEL = os.environ.get('EMOTION_MODEL')
+
+# Bytes per rolling window of /analyze/stream; clients may pick 1 KB to 1 MB
+STREAM_WINDOW_BYTES = int(os.environ.get('STREAM_WINDOW_BYTES', 8 * 1024))
+# Streams are analyzed in constant memory, so they get their own, much larger, size limit
+STREAM_MAX_BYTES = int(os.environ.get('STREAM_MAX_BYTES', 2 * 1024 ** 3))
+
+# /analyze/long: recordings of any length, classified in overlapping windows (seconds)
+LONG_WINDOW_SECONDS = float(os.environ.get('LONG_WINDOW_SECONDS', 10))
+LONG_OVERLAP_SECONDS = float(os.environ.get('LONG_OVERLAP_SECONDS', 5))
+# Read in blocks of this many frames; memory is bounded by one window plus one block
+LONG_BLOCK_FRAMES = int(os.environ.get('LONG_BLOCK_FRAMES', 64 * 1024))
+# WAV sizes are 32-bit, so 4 GB is the longest file a WAV upload can describe
+LONG_MAX_BYTES = int(os.environ.get('LONG_MAX_BYTES', 4 * 1024 ** 3))
+
+# Background jobs (/jobs): worker threads cap their CPU use; inputs and records survive restarts
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 1))
+JOB_QUEUE_LIMIT = int(os.environ.get('JOB_QUEUE_LIMIT', 1000))
+JOB_DIR = os.environ.get('JOB_DIR', os.path.join(app.config['UPLOAD_FOLDER'], 'jobs'))
+JOB_STORE_PATH = os.environ.get('JOB_STORE_PATH', os.path.join(app.config['UPLOAD_FOLDER'], 'jobs.sqlite3'))
+# Seconds between idle workers checking the store for jobs queued by other processes
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))
+# Finished jobs are forgotten after this many seconds
+JOB_RETENTION = float(os.environ.get('JOB_RETENTION', 7 * 24 * 3600))
+# Seconds between sweeps for jobs past their retention
+JOB_PURGE_INTERVAL = float(os.environ.get('JOB_PURGE_INTERVAL', 3600))
+# A running job whose owner has not renewed its lease for this long is queued again
+JOB_LEASE = float(os.environ.get('JOB_LEASE', 60))
+
+# Headerless 16-bit PCM uploads (RFC 2586 audio/L16); rate and channels come from the Content-Type
+PCM_MIMETYPE = 'audio/l16'
+PCM_MAX_RATE = 192000
+PCM_MAX_CHANNELS = 8
+
+# Render a dummy figure and run a synthetic analysis at server start ('0' disables)
+WARMUP = os.environ.get('WARMUP', '1') != '0'
+
+# Readiness thresholds; /health/ready answers 503 once any is exceeded
+READY_MAX_SATURATION = float(os.environ.get('READY_MAX_SATURATION', 0.9))
+READY_MAX_PROBE_MS = float(os.environ.get('READY_MAX_PROBE_MS', 1000))
+# 0 disables the memory check
+READY_MAX_RSS_MB = float(os.environ.get('READY_MAX_RSS_MB', 0))
+# Seconds a self-test result is reused, so frequent probes add no load
+READY_PROBE_INTERVAL = float(os.environ.get('READY_PROBE_INTERVAL', 5))
+
+# Limits for /analyze/batch
+BATCH_MAX_CLIPS = int(os.environ.get('BATCH_MAX_CLIPS', 256))
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', os.cpu_count() or 1))
+# Uncompressed bytes one archive may expand to; MAX_CONTENT_LENGTH only bounds the compressed upload
+BATCH_MAX_ARCHIVE_BYTES = int(os.environ.get('BATCH_MAX_ARCHIVE_BYTES', 256 * 1024 * 1024))
+
+class ByteFeatureAccumulator:
+    """Incrementally compute byte-level features over a stream of chunks"""
+    
+    HEAD_SIZE = 100
+    
+    def __init__(self):
+        self.total = 0
+        self.repeats = 0
+        self.head = bytearray()
+        self.last_byte = None
+        self.digest = hashlib.blake2b(digest_size=16)
+    
+    def update(self, chunk):
+        """Consume the next chunk of raw bytes (bytes, bytearray or memoryview)"""
+        # Zero-copy view over the chunk
+        values = np.frombuffer(chunk, dtype=np.uint8)
+        if values.size == 0:
+            return
+        self.digest.update(chunk)
+        
+        if len(self.head) < self.HEAD_SIZE:
+            self.head += values[:self.HEAD_SIZE - len(self.head)].tobytes()
+        
+        # Count repeated adjacent bytes, including the pair spanning chunks
+        if self.last_byte is not None and values[0] == self.last_byte:
+            self.repeats += 1
+        self.repeats += int(np.count_nonzero(values[1:] == values[:-1]))
+        
+        self.last_byte = values[-1]
+        self.total += values.size
+    
+    def features(self):
+        """Return the feature dict for all bytes consumed so far"""
+        features = {
+            'file_size': self.total,
+            'file_size_kb': self.total / 1024,
+            'has_wave_header': bytes(self.head[:4]) == b'RIFF',
+            'data_variance': 0,
+            'byte_pattern': 0,
+            'content_hash': self.digest.hexdigest()
+        }
+        
+        # Calculate byte variance (for "energy" estimation)
+        if self.total > self.HEAD_SIZE:
+            features['data_variance'] = np.var(np.frombuffer(bytes(self.head), dtype=np.uint8))
+        
+        # Analyze byte patterns
+        if self.total > 50:
+            features['byte_pattern'] = self.repeats / self.total
+        
+        return features
+
+# WAVE format tags understood by the zero-copy decoder
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+class DecodedAudio:
+    """PCM samples exposed as a NumPy array of shape (frames, channels)"""
+    
+    def __init__(self, samples, sample_rate, mapping=None):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.mapping = mapping
+    
+    @property
+    def channels(self):
+        return self.samples.shape[1]
+    
+    @property
+    def duration(self):
+        return self.samples.shape[0] / self.sample_rate if self.sample_rate else 0.0
+    
+    def mono(self):
+        """Return float samples in [-1, 1] averaged across channels"""
+        samples = self.samples
+        if samples.dtype == np.uint8:
+            scaled = (samples.astype(np.float32) - 128.0) / 128.0
+        elif samples.dtype.kind == 'i':
+            scaled = samples.astype(np.float32) / float(np.iinfo(samples.dtype).max)
+        else:
+            scaled = samples.astype(np.float32)
+        return scaled.mean(axis=1) if scaled.shape[1] > 1 else scaled[:, 0]
+    
+    def close(self):
+        """Drop the sample view and release the underlying mapping"""
+        self.samples = None
+        if self.mapping is not None:
+            try:
+                self.mapping.close()
+            except BufferError:
+                # A caller still holds a view; the mapping is freed with it
+                pass
+            self.mapping = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+def parse_wav_header(buffer):
+    """Locate the fmt and data chunks of a RIFF/WAVE buffer.
+    
+    Returns (dtype, channels, sample_rate, data_offset, frame_count) or
+    None if the buffer is not a WAV layout the decoder can view in place.
+    """
+    if len(buffer) < 12 or buffer[:4] != b'RIFF' or buffer[8:12] != b'WAVE':
+        return None
+    
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(buffer):
+        chunk_id = bytes(buffer[offset:offset + 4])
+        chunk_size = struct.unpack('<I', buffer[offset + 4:offset + 8])[0]
+        body = offset + 8
+        
+        if chunk_id == b'fmt ' and chunk_size >= 16:
+            if body + chunk_size > len(buffer):
+                # Header not complete yet (a stream still arriving)
+                return None
+            fmt = struct.unpack('<HHIIHH', buffer[body:body + 16])
+            if fmt[0] == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26:
+                # Real format tag is the first field of the SubFormat GUID
+                tag = struct.unpack('<H', buffer[body + 24:body + 26])[0]
+                fmt = (tag,) + fmt[1:]
+        elif chunk_id == b'data':
+            if fmt is None:
+                return None
+            tag, channels, sample_rate, _, block_align, bits = fmt
+            dtype = {
+                (WAVE_FORMAT_PCM, 8): np.dtype('u1'),
+                (WAVE_FORMAT_PCM, 16): np.dtype('<i2'),
+                (WAVE_FORMAT_PCM, 32): np.dtype('<i4'),
+                (WAVE_FORMAT_IEEE_FLOAT, 32): np.dtype('<f4'),
+                (WAVE_FORMAT_IEEE_FLOAT, 64): np.dtype('<f8'),
+            }.get((tag, bits))
+            if dtype is None or channels == 0 or block_align != channels * dtype.itemsize:
+                return None
+            # Streamed recordings often leave the data size unset, so clamp it
+            data_size = min(chunk_size, len(buffer) - body)
+            return dtype, channels, sample_rate, body, data_size // block_align
+        
+        # Chunks are word aligned
+        offset = body + chunk_size + (chunk_size & 1)
+    
+    return None
+
+def wav_samples(buffer, mapping=None):
+    """Expose the PCM data of a WAV buffer as a zero-copy DecodedAudio"""
+    header = parse_wav_header(buffer)
+    if header is None:
+        return None
+    dtype, channels, sample_rate, data_offset, frames = header
+    samples = np.frombuffer(buffer, dtype=dtype, count=frames * channels, offset=data_offset)
+    return DecodedAudio(samples.reshape(frames, channels), sample_rate, mapping)
+
+def pcm_samples(buffer, sample_rate, channels):
+    """View a headerless audio/L16 body (big-endian, interleaved) as a zero-copy DecodedAudio"""
+    frames = len(buffer) // (2 * channels)
+    samples = np.frombuffer(buffer, dtype='>i2', count=frames * channels)
+    return DecodedAudio(samples.reshape(frames, channels), sample_rate)
+
+def parse_pcm_format(params):
+    """(sample_rate, channels) from audio/L16 Content-Type parameters, or None if invalid"""
+    try:
+        sample_rate = int(params.get('rate', ''))
+        channels = int(params.get('channels', 1))
+    except ValueError:
+        return None
+    if not (0 < sample_rate <= PCM_MAX_RATE and 0 < channels <= PCM_MAX_CHANNELS):
+        return None
+    return sample_rate, channels
+
+def pcm_content_hash(body, pcm_format):
+    """Result-cache key of an audio/L16 body; the same bytes at another rate are another clip"""
+    digest = hashlib.blake2b(f'{PCM_MIMETYPE};rate={pcm_format[0]};channels={pcm_format[1]}:'.encode('ascii'),
+                             digest_size=16)
+    digest.update(body)
+    return digest.hexdigest()
+
+def read_wav_stream_header(stream, limit=1024 * 1024):
+    """Read the header of a WAV file from a forward-only stream.
+    
+    Returns (header, data_size, leftover): header is parse_wav_header's
+    tuple, data_size the declared sample bytes (None when a streaming
+    writer left it unset) and leftover the sample bytes read past the
+    header. Returns None if the stream is not a WAV the decoder supports.
+    """
+    prefix = b''
+    while len(prefix) < limit:
+        chunk = stream.read(4096)
+        if not chunk:
+            break
+        prefix += chunk
+        if not maybe_wav(prefix):
+            return None
+        parsed = parse_wav_prefix(prefix)
+        if parsed is not None:
+            return parsed
+    return None
+
+def maybe_wav(prefix):
+    """False once the first bytes of a stream rule out a RIFF/WAVE file"""
+    return len(prefix) < 12 or (prefix[:4] == b'RIFF' and prefix[8:12] == b'WAVE')
+
+def parse_wav_prefix(prefix):
+    """read_wav_stream_header's (header, data_size, leftover) for the bytes of a stream so far, or None"""
+    header = parse_wav_header(prefix)
+    if header is None:
+        return None
+    data_offset = header[3]
+    data_size = struct.unpack('<I', prefix[data_offset - 4:data_offset])[0]
+    return header, (data_size if data_size not in (0, 0xFFFFFFFF) else None), prefix[data_offset:]
+
+class PCMBlockDecoder:
+    """Turn interleaved PCM bytes pushed in pieces of any size into mono float32 blocks.
+    
+    A partial frame is carried to the next piece; bytes past data_size
+    (the declared length of a WAV data chunk) are ignored.
+    """
+    
+    def __init__(self, dtype, channels, sample_rate, data_size=None):
+        self.dtype = dtype
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.frame_bytes = dtype.itemsize * channels
+        self.remaining = data_size
+        self.carry = b''
+    
+    def update(self, chunk):
+        """Mono float32 samples of the whole frames completed by chunk, or None"""
+        if self.remaining is not None:
+            chunk = chunk[:self.remaining]
+            self.remaining -= len(chunk)
+        data = self.carry + bytes(chunk) if self.carry else chunk
+        usable = len(data) - len(data) % self.frame_bytes
+        self.carry = bytes(data[usable:])
+        if not usable:
+            return None
+        samples = np.frombuffer(data, dtype=self.dtype, count=usable // self.dtype.itemsize)
+        return DecodedAudio(samples.reshape(-1, self.channels), self.sample_rate).mono()
+
+def pcm_stream_blocks(stream, dtype, channels, sample_rate, leftover=b'', data_size=None,
+                      block_frames=LONG_BLOCK_FRAMES):
+    """Yield (sample_rate, mono float32 samples) blocks of interleaved PCM read from a stream"""
+    decoder = PCMBlockDecoder(dtype, channels, sample_rate, data_size)
+    chunks = itertools.chain([leftover], iter(lambda: stream.read(block_frames * decoder.frame_bytes), b''))
+    for chunk in chunks:
+        samples = decoder.update(chunk)
+        if samples is not None:
+            yield sample_rate, samples
+        if decoder.remaining == 0:
+            break
+
+def audio_stream_blocks(stream, pcm_format=None):
+    """Yield (sample_rate, mono float32 samples) blocks from a stream without reading it whole.
+    
+    Handles audio/L16 bodies (pcm_format is (sample_rate, channels)), WAV
+    files and, when the stream is seekable, any container PyAV decodes.
+    Yields nothing for audio it cannot decode.
+    """
+    if pcm_format is not None:
+        yield from pcm_stream_blocks(stream, np.dtype('>i2'), pcm_format[1], pcm_format[0])
+        return
+    
+    parsed = read_wav_stream_header(stream)
+    if parsed is not None:
+        (dtype, channels, sample_rate, _, _), data_size, leftover = parsed
+        yield from pcm_stream_blocks(stream, dtype, channels, sample_rate, leftover, data_size)
+        return
+    
+    if getattr(stream, 'seekable', lambda: False)():
+        for sample_rate, block in stream_decoded_frames(stream):
+            yield sample_rate, block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+
+def synthetic_wav(duration=0.25, sample_rate=16000, freq=220.0):
+    """Encode a short 16-bit mono tone as WAV bytes"""
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    samples = (0.5 * np.sin(2 * np.pi * freq * t) * 32767).astype('<i2')
+    buffer = BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+def stream_decoded_frames(source):
+    """Yield float32 (frames, channels) blocks from a compressed container.
+    
+    Used for webm/ogg uploads. source may be a path, a seekable file-like
+    object or a bytes-like buffer. Requires the optional PyAV package;
+    yields nothing when it is not installed.
+    """
+    try:
+        import av
+    except ImportError:
+        return
+    
+    if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+        source = BytesIO(source)
+    elif hasattr(source, 'seek'):
+        source.seek(0)
+    
+    with av.open(source) as container:
+        if not container.streams.audio:
+            return
+        for frame in container.decode(audio=0):
+            block = frame.to_ndarray()
+            if block.ndim == 1:
+                block = block[np.newaxis, :]
+            if frame.format.is_packed:
+                # Packed layouts interleave channels in a single plane
+                block = block.reshape(-1, len(frame.layout.channels)).T
+            if block.dtype.kind == 'i':
+                block = block.astype(np.float32) / float(np.iinfo(block.dtype).max)
+            yield frame.sample_rate, block.T.astype(np.float32, copy=False)
+
+@contextmanager
+def open_audio_buffer(source):
+    """Yield a zero-copy bytes-like view of an upload.
+    
+    Bytes-like sources are used as-is, files with a descriptor are
+    memory-mapped and in-memory streams expose their internal buffer.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield source
+        return
+    
+    if hasattr(source, 'getbuffer'):
+        view = source.getbuffer()
+        try:
+            yield view
+        finally:
+            try:
+                view.release()
+            except BufferError:
+                pass
+        return
+    
+    try:
+        fileno = source.fileno()
+    except (AttributeError, OSError):
+        # No descriptor to map, so fall back to reading the stream
+        source.seek(0)
+        yield source.read()
+        return
+    
+    if hasattr(source, 'flush'):
+        source.flush()
+    if os.fstat(fileno).st_size == 0:
+        yield b''
+        return
+    mapping = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    try:
+        yield mapping
+    finally:
+        try:
+            mapping.close()
+        except BufferError:
+            # A view is still referenced; the mapping is freed with it
+            pass
+
+def synthetic_intensity(freq1, n_freqs, n_times):
+    """Feature-based spectrogram pattern as an outer product of two Gaussians"""
+    frequencies = np.linspace(0, 5000, n_freqs)
+    freq_profile = np.exp(-(frequencies - freq1)**2 / 100000)
+    time_profile = np.exp(-(np.arange(n_times) / n_times - 0.5)**2 / 0.1)
+    return freq_profile[:, np.newaxis] * time_profile[np.newaxis, :]
+
+def stft_spectrogram(samples, sample_rate, n_fft=512, hop=256, max_freq=5000):
+    """Magnitude spectrogram in dB using a strided window view and batched rFFT.
+    
+    Returns (intensity, extent) ready for imshow with origin='lower'.
+    """
+    if samples.shape[0] < n_fft:
+        samples = np.pad(samples, (0, n_fft - samples.shape[0]))
+    
+    # Every hop-th window of the signal, without copying it
+    frames = np.lib.stride_tricks.sliding_window_view(samples, n_fft)[::hop]
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(n_fft), axis=1))
+    
+    n_bins = min(int(max_freq * n_fft / sample_rate) + 1, spectrum.shape[1])
+    intensity = 20 * np.log10(spectrum[:, :n_bins].T + 1e-10)
+    
+    duration = samples.shape[0] / sample_rate
+    top = (n_bins - 1) * sample_rate / n_fft
+    return intensity, [0, duration, 0, top]
+
+# Per-frame descriptors produced by extract_acoustic_features
+N_MFCC = 13
+ACOUSTIC_DTYPE = np.dtype([
+    ('time', 'f4'),
+    ('rms', 'f4'),
+    ('zcr', 'f4'),
+    ('centroid', 'f4'),
+    ('pitch', 'f4'),
+    ('mfcc', 'f4', (N_MFCC,))
+])
+
+# Frames transformed per batched FFT, bounding the spectra held at once
+ACOUSTIC_BLOCK_FRAMES = 512
+
+# Pitch candidate penalty per octave of lag, as in Praat's autocorrelation method
+OCTAVE_COST = 0.02
+
+@functools.lru_cache(maxsize=16)
+def mel_filterbank(sample_rate, n_fft, n_mels=40):
+    """Triangular mel filters as an (n_mels, n_fft // 2 + 1) matrix"""
+    def to_mel(hz):
+        return 2595 * np.log10(1 + hz / 700)
+    
+    edges = 700 * (10 ** (np.linspace(0, to_mel(sample_rate / 2), n_mels + 2) / 2595) - 1)
+    freqs = np.fft.rfftfreq(n_fft, 1 / sample_rate)
+    lower, center, upper = edges[:-2, np.newaxis], edges[1:-1, np.newaxis], edges[2:, np.newaxis]
+    rising = (freqs - lower) / np.maximum(center - lower, 1e-9)
+    falling = (upper - freqs) / np.maximum(upper - center, 1e-9)
+    return np.maximum(0, np.minimum(rising, falling)).astype(np.float32)
+
+@functools.lru_cache(maxsize=4)
+def dct_matrix(n_out, n_in):
+    """Orthonormal DCT-II as an (n_out, n_in) matrix"""
+    basis = np.cos(np.pi / n_in * (np.arange(n_in) + 0.5)[np.newaxis, :] * np.arange(n_out)[:, np.newaxis])
+    basis *= np.sqrt(2 / n_in)
+    basis[0] /= np.sqrt(2)
+    return basis.astype(np.float32)
+
+def extract_acoustic_features(samples, sample_rate, frame_ms=25, hop_ms=10,
+                              min_pitch=80, max_pitch=400, voicing=0.3):
+    """Framewise RMS energy, zero-crossing rate, spectral centroid, pitch and MFCCs.
+    
+    Frames are a strided view of the mono float signal and every descriptor
+    is computed for a whole block of frames at once; the autocorrelation used
+    for pitch comes from the same zero-padded FFT as the spectrum. Returns a
+    structured array of ACOUSTIC_DTYPE with one record per frame; unvoiced
+    frames have pitch 0.
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    frame = max(int(sample_rate * frame_ms / 1000), 2)
+    hop = max(int(sample_rate * hop_ms / 1000), 1)
+    if samples.shape[0] < frame:
+        samples = np.pad(samples, (0, frame - samples.shape[0]))
+    
+    # Every hop-th window of the signal, without copying it
+    frames = np.lib.stride_tricks.sliding_window_view(samples, frame)[::hop]
+    result = np.zeros(frames.shape[0], dtype=ACOUSTIC_DTYPE)
+    result['time'] = np.arange(frames.shape[0]) * hop / sample_rate
+    
+    min_lag = max(int(sample_rate / max_pitch), 1)
+    # Lags beyond half a frame overlap too little to be reliable
+    max_lag = min(int(sample_rate / min_pitch), frame // 2)
+    # Padding to frame + max_lag keeps the circular autocorrelation free of wrap-around
+    n_fft = 1 << (frame + max_lag + 1).bit_length()
+    window = np.hanning(frame).astype(np.float32)
+    freqs = np.fft.rfftfreq(n_fft, 1 / sample_rate).astype(np.float32)
+    mel = mel_filterbank(sample_rate, n_fft)
+    dct = dct_matrix(N_MFCC, mel.shape[0])
+    # Autocorrelation of the window itself, dividing out its taper from the lags
+    window_spectrum = np.fft.rfft(window, n=n_fft)
+    window_autocorr = np.fft.irfft(np.abs(window_spectrum) ** 2, n=n_fft)[:max_lag + 2]
+    window_autocorr = (window_autocorr / window_autocorr[0]).astype(np.float32)
+    # Small penalty per octave of lag so a period wins over its multiples
+    octave_cost = (OCTAVE_COST * np.log2(np.arange(min_lag, max_lag + 1) / min_lag)).astype(np.float32)
+    
+    for begin in range(0, frames.shape[0], ACOUSTIC_BLOCK_FRAMES):
+        block = frames[begin:begin + ACOUSTIC_BLOCK_FRAMES]
+        out = result[begin:begin + ACOUSTIC_BLOCK_FRAMES]
+        
+        rms = np.sqrt(np.einsum('ij,ij->i', block, block) / frame)
+        out['rms'] = rms
+        signs = np.signbit(block)
+        out['zcr'] = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame - 1)
+        
+        spectrum = np.fft.rfft(block * window, n=n_fft, axis=1)
+        power = (spectrum.real ** 2 + spectrum.imag ** 2).astype(np.float32)
+        out['centroid'] = power @ freqs / np.maximum(power.sum(axis=1), 1e-12)
+        out['mfcc'] = np.log(power @ mel.T + 1e-10) @ dct.T
+        
+        if max_lag > min_lag:
+            # Autocorrelation is the inverse transform of the power spectrum
+            autocorr = np.fft.irfft(power, n=n_fft, axis=1)[:, :max_lag + 2] / window_autocorr
+            candidates = autocorr[:, min_lag:max_lag + 1] / np.maximum(autocorr[:, :1], 1e-12)
+            best = (candidates - octave_cost).argmax(axis=1) + min_lag
+            rows = np.arange(block.shape[0])
+            peak = autocorr[rows, best]
+            voiced = (peak > voicing * autocorr[:, 0]) & (rms > 1e-3)
+            # Parabolic interpolation around the peak for sub-sample lags
+            left, right = autocorr[rows, best - 1], autocorr[rows, best + 1]
+            curvature = left - 2 * peak + right
+            offset = np.where(curvature < 0, 0.5 * (left - right) / np.where(curvature < 0, curvature, -1), 0)
+            out['pitch'] = np.where(voiced, sample_rate / (best + offset), 0)
+    
+    return result
+
+class AcousticSummary:
+    """Running clip-level statistics of ACOUSTIC_DTYPE records.
+    
+    Keeps sums and sums of squares only, so frames can be added in any
+    number of pieces in constant memory; summary() equals the statistics
+    of all the frames added so far taken at once.
+    """
+    
+    def __init__(self):
+        self.count = 0
+        self.rms = 0.0
+        self.rms_db = 0.0
+        self.rms_db_squares = 0.0
+        self.zcr = 0.0
+        self.centroid = 0.0
+        self.voiced = 0
+        self.pitch = 0.0
+        # Semitones relative to 1 Hz; their spread equals the spread around the mean pitch
+        self.semitones = 0.0
+        self.semitones_squares = 0.0
+        self.mfcc = np.zeros(N_MFCC)
+        self.mfcc_squares = np.zeros(N_MFCC)
+    
+    def update(self, acoustic):
+        """Add the frames of an ACOUSTIC_DTYPE array"""
+        if not acoustic.size:
+            return
+        rms = acoustic['rms'].astype(np.float64)
+        rms_db = 20 * np.log10(rms + 1e-9)
+        pitch = acoustic['pitch'][acoustic['pitch'] > 0].astype(np.float64)
+        semitones = 12 * np.log2(pitch)
+        mfcc = acoustic['mfcc'].astype(np.float64)
+        self.count += acoustic.size
+        self.rms += rms.sum()
+        self.rms_db += rms_db.sum()
+        self.rms_db_squares += rms_db @ rms_db
+        self.zcr += float(acoustic['zcr'].sum(dtype=np.float64))
+        self.centroid += float(acoustic['centroid'].sum(dtype=np.float64))
+        self.voiced += pitch.size
+        self.pitch += pitch.sum()
+        self.semitones += semitones.sum()
+        self.semitones_squares += semitones @ semitones
+        self.mfcc += mfcc.sum(axis=0)
+        self.mfcc_squares += np.einsum('ij,ij->j', mfcc, mfcc)
+    
+    def summary(self):
+        """Statistics of every frame added so far, as summarize_acoustic_features returns them"""
+        def std(total, squares, count):
+            mean = total / count
+            return np.sqrt(np.maximum(squares / count - mean * mean, 0))
+        
+        count = max(self.count, 1)
+        summary = {
+            'energy_db': float(20 * np.log10(self.rms / count + 1e-9)),
+            'energy_std_db': float(std(self.rms_db, self.rms_db_squares, count)),
+            'zcr': self.zcr / count,
+            'centroid': self.centroid / count,
+            'voiced_ratio': self.voiced / count,
+            'pitch_mean': 0.0,
+            'pitch_std_semitones': 0.0,
+            'mfcc_mean': (self.mfcc / count).astype(np.float32),
+            'mfcc_std': std(self.mfcc, self.mfcc_squares, count).astype(np.float32)
+        }
+        if self.voiced:
+            summary['pitch_mean'] = self.pitch / self.voiced
+            summary['pitch_std_semitones'] = float(std(self.semitones, self.semitones_squares, self.voiced))
+        return summary
+
+def summarize_acoustic_features(acoustic):
+    """Clip-level statistics of a per-frame ACOUSTIC_DTYPE array"""
+    summary = AcousticSummary()
+    summary.update(acoustic)
+    return summary.summary()
+
+class AcousticFramer:
+    """Frame a signal that arrives in blocks exactly as extract_acoustic_features frames it whole.
+    
+    Only the samples of frames not yet complete are carried between blocks,
+    so per-frame features of a stream of any length are produced in
+    constant memory and match those of the concatenated signal.
+    """
+    
+    def __init__(self, sample_rate, frame_ms=25, hop_ms=10):
+        self.sample_rate = sample_rate
+        self.frame = max(int(sample_rate * frame_ms / 1000), 2)
+        self.hop = max(int(sample_rate * hop_ms / 1000), 1)
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.frames = 0
+        self.samples = 0
+    
+    def update(self, block):
+        """ACOUSTIC_DTYPE records of the frames completed by the next mono block"""
+        block = np.asarray(block, dtype=np.float32)
+        self.samples += block.size
+        pending = np.concatenate((self.pending, block)) if self.pending.size else block
+        count = (pending.size - self.frame) // self.hop + 1 if pending.size >= self.frame else 0
+        if count == 0:
+            self.pending = pending
+            return np.zeros(0, dtype=ACOUSTIC_DTYPE)
+        acoustic = extract_acoustic_features(pending[:(count - 1) * self.hop + self.frame], self.sample_rate)
+        acoustic['time'] = (self.frames + np.arange(count)) * self.hop / self.sample_rate
+        self.frames += count
+        # Copy the tail so the caller's block is not kept alive
+        self.pending = pending[count * self.hop:].copy()
+        return acoustic
+    
+    def finish(self):
+        """Records of a signal too short for one frame, which extract_acoustic_features pads"""
+        if self.frames or not self.samples:
+            return np.zeros(0, dtype=ACOUSTIC_DTYPE)
+        self.frames = 1
+        return extract_acoustic_features(self.pending, self.sample_rate)
+
+# Scalar statistics at the start of every model feature vector
+SUMMARY_SCALARS = ('energy_db', 'energy_std_db', 'zcr', 'centroid',
+                   'voiced_ratio', 'pitch_mean', 'pitch_std_semitones')
+FEATURE_NAMES = (SUMMARY_SCALARS + tuple(f'mfcc_mean_{i}' for i in range(N_MFCC))
+                 + tuple(f'mfcc_std_{i}' for i in range(N_MFCC)))
+
+def summary_feature_vector(summary):
+    """Fixed-length float32 vector (ordered as FEATURE_NAMES) of a clip-level summary"""
+    return np.concatenate([
+        np.array([summary[name] for name in SUMMARY_SCALARS], dtype=np.float32),
+        summary['mfcc_mean'],
+        summary['mfcc_std']
+    ]).astype(np.float32)
+
+def acoustic_feature_vector(acoustic):
+    """Fixed-length float32 vector (ordered as FEATURE_NAMES) summarizing one clip"""
+    return summary_feature_vector(summarize_acoustic_features(acoustic))
+
+# Dataset emotion names (RAVDESS, TESS, EMO-DB) mapped to the labels shown in the UI
+EMOTION_LABELS = {
+    'happy': '😊 Happy', 'happiness': '😊 Happy', 'joy': '😊 Happy',
+    'angry': '😠 Angry', 'anger': '😠 Angry',
+    'sad': '😢 Sad', 'sadness': '😢 Sad',
+    'neutral': '😐 Neutral', 'calm': '😐 Neutral',
+    'surprised': '😲 Surprised', 'surprise': '😲 Surprised', 'ps': '😲 Surprised',
+    'fearful': '😨 Fearful', 'fear': '😨 Fearful', 'anxiety': '😨 Fearful'
+}
+
+class EmotionModel:
+    """Softmax classifier over acoustic feature vectors, stored as a directory.
+    
+    meta.json holds the labels and feature names; the parameters are .npy
+    files opened with mmap_mode='r', so loading is cheap and worker processes
+    share the pages.
+    """
+    
+    PARAMETERS = ('mean', 'scale', 'weights', 'bias')
+    
+    def __init__(self, path):
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if tuple(self.meta['feature_names']) != FEATURE_NAMES:
+            raise ValueError(f'{path} was trained on different features')
+        self.path = path
+        self.labels = self.meta['labels']
+        for name in self.PARAMETERS:
+            setattr(self, name, np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r'))
+    
+    def predict_proba(self, X):
+        """Class probabilities for an (n_samples, n_features) matrix"""
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        logits = ((X - self.mean) / self.scale) @ self.weights + self.bias
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+    
+    def predict(self, X):
+        """(labels, confidences) for every row of X"""
+        probabilities = self.predict_proba(X)
+        best = probabilities.argmax(axis=1)
+        return [self.labels[i] for i in best], probabilities[np.arange(len(best)), best]
+    
+    @classmethod
+    def save(cls, path, labels, mean, scale, weights, bias, info=None):
+        """Write a model directory that __init__ can load"""
+        os.makedirs(path, exist_ok=True)
+        parameters = {'mean': mean, 'scale': scale, 'weights': weights, 'bias': bias}
+        for name in cls.PARAMETERS:
+            np.save(os.path.join(path, f'{name}.npy'), np.asarray(parameters[name], dtype=np.float32))
+        with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'labels': list(labels), 'feature_names': list(FEATURE_NAMES),
+                       'info': info or {}}, f, indent=2, ensure_ascii=False)
+        return cls(path)
+
+def load_emotion_model(path):
+    """Load the model at path, or return None (rule-based fallback) if unset or unusable"""
+    if not path:
+        return None
+    try:
+        model = EmotionModel(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️  Could not load emotion model from {path}: {e}; using rule-based emotions")
+        return None
+    print(f"✅ Emotion model loaded from {path} ({len(model.labels)} classes)")
+    return model
+
+def render_fingerprint(features, file_size, signal=None):
+    """Deterministic key for everything a visualization depends on"""
+    key = f"{file_size}:{float(features.get('data_variance', 0))!r}"
+    digest = hashlib.sha256(key.encode('utf-8'))
+    if signal is not None:
+        samples, sample_rate = signal
+        digest.update(f":{sample_rate}:".encode('utf-8'))
+        digest.update(np.ascontiguousarray(samples).data)
+    return digest.hexdigest()
+
+def render_spec_size(spec):
+    """Approximate memory held by a pending render spec"""
+    _, _, signal = spec
+    return 256 + (signal[0].nbytes if signal is not None else 0)
+
+class RenderCache:
+    """Thread-safe LRU bounded by the total size in bytes of its values"""
+    
+    def __init__(self, max_bytes, sizeof=len):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key, value):
+        value_size = self.sizeof(value)
+        if value_size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.sizeof(self.entries.pop(key))
+            self.entries[key] = value
+            self.size += value_size
+            # Evict least recently used entries until within budget
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= self.sizeof(evicted)
+                self.evictions += 1
+    
+    def __contains__(self, key):
+        """Membership test that leaves the LRU order and hit statistics alone"""
+        with self.lock:
+            return key in self.entries
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+class MemoryResultCache:
+    """Per-process LRU of analysis results with a TTL and an entry limit"""
+    
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, key, value):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (time.time() + self.ttl, value)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+    
+    def count(self):
+        with self.lock:
+            return len(self.entries)
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+        return {
+            'backend': 'memory',
+            'entries': self.count(),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': hits,
+            'misses': misses,
+            'evictions': evictions,
+            'hit_rate': hits / lookups if lookups else 0.0
+        }
+
+class SQLiteResultCache(MemoryResultCache):
+    """Result cache in a SQLite file shared by every process that opens it.
+    
+    Each thread keeps its own connection; WAL mode lets readers in other
+    processes proceed while one writes. Least recently used rows are
+    evicted once the table exceeds max_entries.
+    """
+    
+    def __init__(self, path, max_entries, ttl):
+        super().__init__(max_entries, ttl)
+        self.path = path
+        self.local = threading.local()
+        db = self.connect()
+        db.execute('CREATE TABLE IF NOT EXISTS results '
+                   '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, used REAL NOT NULL)')
+        db.execute('CREATE INDEX IF NOT EXISTS results_used ON results (used)')
+    
+    def connect(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self.local.db = db
+        return db
+    
+    def get(self, key):
+        db = self.connect()
+        now = time.time()
+        row = db.execute('SELECT value FROM results WHERE key = ? AND expires > ?', (key, now)).fetchone()
+        with self.lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        db.execute('UPDATE results SET used = ? WHERE key = ?', (now, key))
+        return json.loads(row[0])
+    
+    def put(self, key, value):
+        db = self.connect()
+        now = time.time()
+        db.execute('INSERT OR REPLACE INTO results (key, value, expires, used) VALUES (?, ?, ?, ?)',
+                   (key, json.dumps(value), now + self.ttl, now))
+        excess = self.count() - self.max_entries
+        if excess > 0:
+            db.execute('DELETE FROM results WHERE expires <= ?', (now,))
+            excess = self.count() - self.max_entries
+        if excess > 0:
+            db.execute('DELETE FROM results WHERE key IN '
+                       '(SELECT key FROM results ORDER BY used LIMIT ?)', (excess,))
+            with self.lock:
+                self.evictions += excess
+    
+    def clear(self):
+        self.connect().execute('DELETE FROM results')
+    
+    def count(self):
+        return self.connect().execute('SELECT COUNT(*) FROM results').fetchone()[0]
+    
+    def stats(self):
+        stats = super().stats()
+        stats['backend'] = 'sqlite'
+        stats['path'] = self.path
+        return stats
+
+class JobStore:
+    """Job records in a SQLite file shared by every process that opens it.
+    
+    Workers claim the highest-priority queued job inside an IMMEDIATE
+    transaction, so a job runs once even when several server processes
+    poll the same file. A claim is a lease: its owner (one server instance)
+    renews the heartbeat of its running jobs, and jobs whose heartbeat is
+    older than the lease are orphans. Results are stored as JSON; inputs
+    live on disk (see JobQueue).
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        db = self.connect()
+        db.execute('CREATE TABLE IF NOT EXISTS jobs ('
+                   'id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, priority INTEGER NOT NULL, '
+                   'params TEXT NOT NULL, result TEXT, error TEXT, owner TEXT, '
+                   'cancel_requested INTEGER NOT NULL DEFAULT 0, '
+                   'created REAL NOT NULL, started REAL, finished REAL, heartbeat REAL)')
+        if 'heartbeat' not in {row[1] for row in db.execute('PRAGMA table_info(jobs)')}:
+            db.execute('ALTER TABLE jobs ADD COLUMN heartbeat REAL')
+        db.execute('CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created)')
+    
+    def connect(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self.local.db = db
+        return db
+    
+    def submit(self, job_id, kind, priority, params):
+        self.connect().execute("INSERT INTO jobs (id, kind, status, priority, params, created) "
+                               "VALUES (?, ?, 'queued', ?, ?, ?)",
+                               (job_id, kind, priority, json.dumps(params), time.time()))
+    
+    def claim(self, owner):
+        """Mark the next queued job as running for owner; returns (id, kind, params) or None"""
+        db = self.connect()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute("SELECT id, kind, params FROM jobs WHERE status = 'queued' "
+                             "ORDER BY priority DESC, created LIMIT 1").fetchone()
+            if row is not None:
+                now = time.time()
+                db.execute("UPDATE jobs SET status = 'running', started = ?, heartbeat = ?, owner = ? WHERE id = ?",
+                           (now, now, owner, row[0]))
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return None if row is None else (row[0], row[1], json.loads(row[2]))
+    
+    def release(self, job_id, owner):
+        """Put a claimed job back in the queue"""
+        self.connect().execute("UPDATE jobs SET status = 'queued', started = NULL, heartbeat = NULL, owner = NULL "
+                               "WHERE id = ? AND status = 'running' AND owner = ?", (job_id, owner))
+    
+    def finish(self, job_id, owner, result=None, error=None):
+        """Record a job's outcome; jobs asked to cancel meanwhile end up cancelled.
+        
+        Returns False when owner lost the job (its lease expired and it was
+        queued again), in which case nothing is recorded.
+        """
+        return bool(self.connect().execute(
+            "UPDATE jobs SET status = CASE WHEN cancel_requested THEN 'cancelled' "
+            "WHEN ? IS NOT NULL THEN 'failed' ELSE 'done' END, "
+            "result = CASE WHEN cancel_requested THEN NULL ELSE ? END, "
+            "error = ?, finished = ?, owner = NULL WHERE id = ? AND status = 'running' AND owner = ?",
+            (error, None if result is None else json.dumps(result), error, time.time(), job_id, owner)).rowcount)
+    
+    def renew(self, owner):
+        """Extend the lease on every job owner is running"""
+        self.connect().execute("UPDATE jobs SET heartbeat = ? WHERE status = 'running' AND owner = ?",
+                               (time.time(), owner))
+    
+    def cancel(self, job_id):
+        """Cancel a queued job or flag a running one; returns the job's status (None if unknown)"""
+        db = self.connect()
+        if db.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                      (time.time(), job_id)).rowcount:
+            return 'cancelled'
+        db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+        row = db.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return None if row is None else row[0]
+    
+    def cancel_requested(self, job_id):
+        row = self.connect().execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row[0])
+    
+    def get(self, job_id):
+        """A job as a dict, with its queue position while queued; None if unknown"""
+        db = self.connect()
+        row = db.execute('SELECT id, kind, status, priority, result, error, cancel_requested, '
+                         'created, started, finished FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {
+            'job_id': row[0],
+            'kind': row[1],
+            'status': row[2],
+            'priority': row[3],
+            'result': None if row[4] is None else json.loads(row[4]),
+            'error': row[5],
+            'cancel_requested': bool(row[6]),
+            'created': row[7],
+            'started': row[8],
+            'finished': row[9]
+        }
+        if job['status'] == 'queued':
+            job['position'] = db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND "
+                "(priority > ? OR (priority = ? AND created < ?))", (row[3], row[3], row[7])).fetchone()[0]
+        return job
+    
+    def counts(self):
+        rows = self.connect().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status')
+        return dict(rows.fetchall())
+    
+    def requeue_orphans(self, lease):
+        """Queue again running jobs whose lease has not been renewed for `lease` seconds.
+        
+        Their owner stopped (a restart reuses PIDs, so this does not ask
+        whether a process is alive) or hung; another worker takes them over.
+        """
+        return self.connect().execute(
+            "UPDATE jobs SET status = 'queued', started = NULL, heartbeat = NULL, owner = NULL "
+            "WHERE status = 'running' AND COALESCE(heartbeat, started, 0) < ?", (time.time() - lease,)).rowcount
+    
+    def purge(self, before):
+        """Forget jobs that finished before a timestamp; returns their IDs"""
+        db = self.connect()
+        ids = [row[0] for row in db.execute('SELECT id FROM jobs WHERE finished < ?', (before,))]
+        db.execute('DELETE FROM jobs WHERE finished < ?', (before,))
+        return ids
+
+def open_result_cache(kind, path, max_entries, ttl):
+    """Create the configured result cache, or None when caching is off"""
+    if kind == 'off':
+        return None
+    if kind == 'memory':
+        return MemoryResultCache(max_entries, ttl)
+    if kind == 'sqlite':
+        return SQLiteResultCache(path, max_entries, ttl)
+    raise ValueError(f"Unknown result cache {kind!r}, expected 'memory', 'sqlite' or 'off'")
+
+# Visualization output profiles: figure size in inches, resolution and file format
+RENDER_PROFILES = {
+    'thumbnail': {'figsize': (4, 2), 'dpi': 50, 'format': 'png', 'decorations': False},
+    'standard': {'figsize': (12, 6), 'dpi': 100, 'format': 'png', 'decorations': True},
+    'high-res': {'figsize': (12, 6), 'dpi': 200, 'format': 'png', 'decorations': True},
+    'svg': {'figsize': (12, 6), 'dpi': 100, 'format': 'svg', 'decorations': True}
+}
+RENDER_MIMETYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+def minmax_decimate(values, columns):
+    """Per-column minima and maxima of values split into at most `columns` equal runs"""
+    columns = max(1, min(columns, values.shape[0]))
+    per_column = values.shape[0] // columns
+    runs = values[:columns * per_column].reshape(columns, per_column)
+    return runs.min(axis=1), runs.max(axis=1)
+
+class FigureTemplate:
+    """Pre-built figure scaffold for one render profile, cloned for each render.
+    
+    The scaffold (axes, titles, labels, colorbar) is laid out once and
+    pickled; unpickling gives every request an independent Figure without
+    pyplot's global figure manager. The tight layout and the tight bounding
+    box are computed here, so renders neither re-run the layout engine nor
+    draw twice for bbox_inches='tight'.
+    """
+    
+    DURATION = 3.0
+    
+    def __init__(self, profile='standard', spectrogram_mode='synthetic'):
+        settings = RENDER_PROFILES[profile]
+        self.profile = profile
+        self.dpi = settings['dpi']
+        self.format = settings['format']
+        fig = mpl_figure.Figure(figsize=settings['figsize'])
+        backend_agg.FigureCanvasAgg(fig)
+        
+        wave_ax = fig.add_subplot(2, 1, 1)
+        wave_ax.set_xlim([0, self.DURATION])
+        wave_ax.set_ylim([-1.1, 1.1])
+        wave_ax.grid(True, alpha=0.3)
+        
+        spec_ax = fig.add_subplot(2, 1, 2)
+        # Placeholder image whose data, extent and limits are replaced per render
+        limits = (-120, 40) if spectrogram_mode == 'stft' else (0, 1)
+        image = spec_ax.imshow(np.zeros((2, 2)), aspect='auto', origin='lower',
+                               extent=[0, self.DURATION, 0, 5000], cmap='viridis', alpha=0.8,
+                               vmin=limits[0], vmax=limits[1])
+        
+        if settings['decorations']:
+            wave_ax.set_title('Audio Waveform Simulation', fontsize=16, fontweight='bold')
+            wave_ax.set_xlabel('Time (seconds)')
+            wave_ax.set_ylabel('Amplitude')
+            spec_ax.set_title('Frequency Spectrum', fontsize=16, fontweight='bold')
+            spec_ax.set_xlabel('Time (seconds)')
+            spec_ax.set_ylabel('Frequency (Hz)')
+            fig.colorbar(image, ax=spec_ax, label='Intensity')
+        else:
+            for ax in (wave_ax, spec_ax):
+                ax.tick_params(labelbottom=False, labelleft=False, length=0)
+        
+        fig.tight_layout()
+        # Layout is frozen from here on; a layout engine would make savefig draw twice
+        fig.set_layout_engine('none')
+        renderer = fig.canvas.get_renderer()
+        self.bbox = fig.get_tightbbox(renderer).padded(0.1)
+        # Waveform points beyond one min/max pair per pixel column are invisible
+        self.columns = max(1, int(wave_ax.get_position().width * settings['figsize'][0] * self.dpi))
+        
+        self.payload = pickle.dumps(fig)
+    
+    def new_figure(self):
+        """Return a fresh Figure attached to its own Agg canvas"""
+        fig = pickle.loads(self.payload)
+        backend_agg.FigureCanvasAgg(fig)
+        return fig
+    
+    def save(self, fig):
+        """Encode a rendered figure in this profile's format.
+        
+        Returns a memoryview over the encoder's buffer rather than a copy of it.
+        """
+        buf = BytesIO()
+        fig.savefig(buf, format=self.format, dpi=self.dpi, bbox_inches=self.bbox)
+        return buf.getbuffer()
+
+# Histogram buckets (seconds) for request and stage latencies
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Metrics:
+    """Minimal thread-safe registry rendered in the Prometheus text format"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.help = {}
+    
+    def describe(self, name, kind, text):
+        self.help[name] = (kind, text)
+    
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def add(self, name, delta, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = self.gauges.get(key, 0) + delta
+    
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+    
+    def render(self, extra_gauges=()):
+        """Return the exposition text; extra_gauges are (name, labels, value) read at scrape time"""
+        with self.lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            histograms = {key: ([*value[0]], value[1], value[2]) for key, value in self.histograms.items()}
+        for name, labels, value in extra_gauges:
+            gauges[(name, tuple(sorted(labels.items())))] = value
+        
+        def label_text(labels, **extra):
+            pairs = list(labels) + list(extra.items())
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+        
+        lines = []
+        described = set()
+        
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in self.help:
+                    lines.append(f'# HELP {name} {self.help[name][1]}')
+                lines.append(f'# TYPE {name} {kind}')
+        
+        for (name, labels), value in sorted(counters.items()):
+            header(name, 'counter')
+            lines.append(f'{name}{label_text(labels)} {value}')
+        for (name, labels), value in sorted(gauges.items()):
+            header(name, 'gauge')
+            lines.append(f'{name}{label_text(labels)} {value}')
+        for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS, buckets):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{label_text(labels, le=bound)} {cumulative}')
+            lines.append(f'{name}_bucket{label_text(labels, le="+Inf")} {count}')
+            lines.append(f'{name}_sum{label_text(labels)} {total}')
+            lines.append(f'{name}_count{label_text(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+metrics.describe('emotion_requests_total', 'counter', 'HTTP requests by endpoint and status code')
+metrics.describe('emotion_request_duration_seconds', 'histogram', 'HTTP request latency by endpoint')
+metrics.describe('emotion_stage_duration_seconds', 'histogram', 'Analysis latency by pipeline stage')
+metrics.describe('emotion_bytes_processed_total', 'counter', 'Audio bytes analyzed')
+metrics.describe('emotion_requests_in_flight', 'gauge', 'Requests currently being served')
+metrics.describe('emotion_errors_total', 'counter', 'Failed analyses by endpoint and reason')
+metrics.describe('emotion_stream_sessions_total', 'counter', 'Streaming analysis sessions by transport')
+metrics.describe('emotion_jobs_submitted_total', 'counter', 'Jobs submitted to /jobs by kind')
+
+class AnalysisBusy(Exception):
+    """Raised when the analysis queue is full and the request should be retried"""
+    
+    def __init__(self, retry_after):
+        super().__init__(f'Analysis queue full, retry after {retry_after}s')
+        self.retry_after = retry_after
+
+class AnalysisExecutor:
+    """Runs analysis and render jobs inline, on a thread pool or on worker processes.
+    
+    At most workers + queue_limit jobs may be admitted at once; further
+    submissions raise AnalysisBusy instead of queueing without bound.
+    """
+    
+    KINDS = ('inline', 'thread', 'process')
+    
+    def __init__(self, kind, workers, queue_limit, retry_after=1):
+        if kind not in self.KINDS:
+            raise ValueError(f'Unknown analysis executor {kind!r}, expected one of {self.KINDS}')
+        self.kind = kind
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.in_flight_lock = threading.Lock()
+        self.pool = None
+        self.pool_lock = threading.Lock()
+    
+    def start(self):
+        """Create the pool; process workers are forked and warmed up front"""
+        with self.pool_lock:
+            if self.pool is not None or self.kind == 'inline':
+                return self.pool
+            if self.kind == 'thread':
+                self.pool = ThreadPoolExecutor(max_workers=self.workers,
+                                               thread_name_prefix='analysis')
+            else:
+                # forkserver avoids forking a process that already runs threads
+                self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context('forkserver'),
+                                                initializer=warm_worker)
+                # Submitting one job per worker while none are idle spawns them all
+                for future in [self.pool.submit(os.getpid) for _ in range(self.workers)]:
+                    future.result()
+            return self.pool
+    
+    def run(self, func, *args):
+        """Run func(*args) on the executor and wait for its result"""
+        with self.in_flight_lock:
+            if self.in_flight >= self.workers + self.queue_limit:
+                raise AnalysisBusy(self.retry_after)
+            self.in_flight += 1
+        try:
+            if self.kind == 'inline':
+                return func(*args)
+            return self.start().submit(func, *args).result()
+        finally:
+            with self.in_flight_lock:
+                self.in_flight -= 1
+    
+    def map(self, func, *iterables):
+        """Run func over the iterables on the executor and return the results in order.
+        
+        Each item takes an admission slot, so a batch cannot crowd out more
+        work than the queue limit leaves room for.
+        """
+        jobs = list(zip(*iterables))
+        with self.in_flight_lock:
+            if self.in_flight + len(jobs) > self.workers + self.queue_limit:
+                raise AnalysisBusy(self.retry_after)
+            self.in_flight += len(jobs)
+        try:
+            if self.kind == 'inline':
+                return [func(*job) for job in jobs]
+            pool = self.start()
+            return [future.result() for future in [pool.submit(func, *job) for job in jobs]]
+        finally:
+            with self.in_flight_lock:
+                self.in_flight -= len(jobs)
+    
+    def stats(self):
+        return {
+            'kind': self.kind,
+            'workers': self.workers,
+            'queue_limit': self.queue_limit,
+            'in_flight': self.in_flight
+        }
+
+class SharedUpload:
+    """Copy of one or more uploads in a shared memory segment for worker processes"""
+    
+    def __init__(self, buffers):
+        sizes = [len(buffer) for buffer in buffers]
+        self.layout = []
+        offset = 0
+        for size in sizes:
+            self.layout.append((offset, size))
+            offset += size
+        # Zero-length segments are not allowed
+        self.segment = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for buffer, (offset, size) in zip(buffers, self.layout):
+            self.segment.buf[offset:offset + size] = buffer
+        self.name = self.segment.name
+    
+    def close(self):
+        self.segment.close()
+        self.segment.unlink()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+# Attached segments whose views were still exported when their job ended, as (segment, views)
+PENDING_SEGMENTS = []
+
+def detach_segment(segment, views):
+    """Release the views and unmap the segment; False while something still exports a view"""
+    try:
+        for view in views:
+            view.release()
+        segment.close()
+    except BufferError:
+        return False
+    return True
+
+@contextmanager
+def attach_shared_upload(name, layout):
+    """Attach to a SharedUpload from a worker and yield a view of each upload"""
+    # Segments left over from earlier jobs are unmapped once nothing uses them
+    PENDING_SEGMENTS[:] = [pending for pending in PENDING_SEGMENTS if not detach_segment(*pending)]
+    # Pool workers share the parent's resource tracker; the creator unlinks the segment
+    segment = shared_memory.SharedMemory(name=name)
+    views = [segment.buf[offset:offset + size] for offset, size in layout]
+    try:
+        yield views
+    finally:
+        # A view still exported (e.g. by a NumPy array that outlived the job) cannot be
+        # released yet; keep the segment for later rather than mask the job's own error
+        if not detach_segment(segment, views):
+            PENDING_SEGMENTS.append((segment, views))
+
+def memory_usage():
+    """Current and peak resident set size of this process in MB"""
+    usage = {'rss_mb': None, 'peak_rss_mb': None}
+    try:
+        with open('/proc/self/statm') as f:
+            usage['rss_mb'] = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return usage
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    usage['peak_rss_mb'] = peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+    return usage
+
+def package_version(name):
+    """Installed version of a distribution, read without importing it"""
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+def read_build_commit():
+    """Commit the service was built from: BUILD_COMMIT, else the checkout's HEAD"""
+    commit = os.environ.get('BUILD_COMMIT')
+    if commit:
+        return commit
+    git_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.git')
+    try:
+        with open(os.path.join(git_dir, 'HEAD')) as f:
+            head = f.read().strip()
+        if head.startswith('ref: '):
+            head = read_git_ref(git_dir, head[5:])
+        return head[:12] if head else None
+    except OSError:
+        return None
+
+def read_git_ref(git_dir, ref):
+    """Commit a ref points to: its loose file, else its line in packed-refs (after git gc or a fresh clone)"""
+    try:
+        with open(os.path.join(git_dir, ref)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    with open(os.path.join(git_dir, 'packed-refs')) as f:
+        for line in f:
+            # "<commit> <ref>" lines; '#' starts the header, '^' the commit of the preceding annotated tag
+            commit, _, name = line.strip().partition(' ')
+            if name == ref and not line.startswith(('#', '^')):
+                return commit
+    return None
+
+class HealthMonitor:
+    """Liveness and readiness reports for load balancers.
+    
+    Readiness combines executor saturation, memory usage and the latency of
+    a tiny synthetic analysis run through the same executor as uploads. The
+    self-test result is reused for probe_interval seconds.
+    """
+    
+    def __init__(self, executor, probe, probe_interval=READY_PROBE_INTERVAL,
+                 max_saturation=READY_MAX_SATURATION, max_probe_ms=READY_MAX_PROBE_MS,
+                 max_rss_mb=READY_MAX_RSS_MB):
+        self.executor = executor
+        self.probe = probe
+        self.probe_interval = probe_interval
+        self.max_saturation = max_saturation
+        self.max_probe_ms = max_probe_ms
+        self.max_rss_mb = max_rss_mb
+        self.started = time.time()
+        self.build = {
+            'version': '2.0.0',
+            'commit': read_build_commit(),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'matplotlib': package_version('matplotlib'),
+            'executor': executor.kind,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.started))
+        }
+        self.last_probe = None
+        self.probe_lock = threading.Lock()
+        self.warming = False
+    
+    def uptime(self):
+        return time.time() - self.started
+    
+    def liveness(self):
+        return {
+            'status': 'alive',
+            'service': 'Speech Emotion Recognition',
+            'uptime_seconds': round(self.uptime(), 3),
+            'lazy_imports_ms': {name: round(seconds * 1000, 1) for name, seconds in IMPORT_TIMES.items()},
+            'build': self.build
+        }
+    
+    def self_test(self):
+        """Latency of the synthetic analysis, re-measured at most every probe_interval"""
+        with self.probe_lock:
+            now = time.time()
+            if self.last_probe is None or now - self.last_probe['checked_at'] >= self.probe_interval:
+                start = time.perf_counter()
+                try:
+                    self.probe()
+                    error = None
+                except AnalysisBusy:
+                    error = 'executor saturated'
+                except Exception as e:
+                    error = str(e)
+                self.last_probe = {
+                    'latency_ms': round((time.perf_counter() - start) * 1000, 3),
+                    'error': error,
+                    'checked_at': now
+                }
+            return dict(self.last_probe, age_seconds=round(now - self.last_probe['checked_at'], 3))
+    
+    def readiness(self):
+        """Return (ready, report)"""
+        executor = self.executor.stats()
+        capacity = executor['workers'] + executor['queue_limit']
+        in_flight = executor['in_flight']
+        load = {
+            'in_flight': in_flight,
+            'busy_workers': min(in_flight, executor['workers']),
+            'queue_depth': max(0, in_flight - executor['workers']),
+            'saturation': round(in_flight / capacity, 3) if capacity else 1.0
+        }
+        memory = memory_usage()
+        probe = self.self_test()
+        
+        failures = []
+        if self.warming:
+            failures.append('warming_up')
+        if load['saturation'] >= self.max_saturation:
+            failures.append('saturated')
+        if self.max_rss_mb and memory['rss_mb'] is not None and memory['rss_mb'] > self.max_rss_mb:
+            failures.append('memory')
+        if probe['error'] is not None:
+            failures.append('self_test_failed')
+        elif probe['latency_ms'] > self.max_probe_ms:
+            failures.append('self_test_slow')
+        
+        ready = not failures
+        report = {
+            'status': 'ready' if ready else 'unavailable',
+            'failures': failures,
+            'uptime_seconds': round(self.uptime(), 3),
+            'load': load,
+            'memory': memory,
+            'self_test': probe,
+            'executor': executor,
+            'build': self.build
+        }
+        return ready, report
+
 class AudioAnalyzer:
     def __init__(self):
         self.emotions = ['😊 Happy', '😠 Angry', '😢 Sad', '😐 Neutral', '😲 Surprised', '😨 Fearful']
@@ -32,83 +1707,434 @@ class AudioAnalyzer:
             '😲 Surprised': '#E91E63',
             '😨 Fearful': '#FF9800'
         }
+        # 'synthetic' draws the feature-based pattern, 'stft' the real spectrum
+        self.spectrogram_mode = os.environ.get('SPECTROGRAM_MODE', 'synthetic')
+        # Built per profile on first render, which is also when matplotlib gets imported
+        self.figure_templates = {}
+        self.figure_template_lock = threading.Lock()
+        # Bounded pool so concurrent requests cannot render unlimited figures
+        self.render_pool = ThreadPoolExecutor(max_workers=RENDER_WORKERS,
+                                              thread_name_prefix='render')
+        self.render_cache = RenderCache(RENDER_CACHE_BYTES)
+        # Inputs of visualizations that have been announced but maybe not rendered
+        self.render_specs = RenderCache(RENDER_SPEC_BYTES, sizeof=render_spec_size)
+        self.executor = AnalysisExecutor(ANALYSIS_EXECUTOR, ANALYSIS_WORKERS,
+                                         ANALYSIS_QUEUE_LIMIT, ANALYSIS_RETRY_AFTER)
+        # Trained backend for decoded audio; None falls back to the rules
+        self.model = load_emotion_model(EMOTION_MODEL)
+        # Results of earlier uploads keyed by content hash, scoped to the model and render mode
+        self.result_cache = open_result_cache(RESULT_CACHE, RESULT_CACHE_PATH,
+                                              RESULT_CACHE_ENTRIES, RESULT_CACHE_TTL)
+        model_id = 'rules' if self.model is None else f"{self.model.path}@{self.model.meta.get('info', {}).get('trained_at')}"
+        self.result_namespace = hashlib.blake2b(f'{model_id}:{self.spectrogram_mode}'.encode('utf-8'),
+                                                digest_size=8).hexdigest()
         print("✅ Audio Analyzer Initialized")
     
     def analyze_audio_file(self, filepath):
         """Analyze audio file and extract features"""
+        emotion, confidence, visualization_id = self.classify_audio_file(filepath)
+        if emotion is None:
+            return None, None, None
+        
+        return emotion, confidence, self.get_visualization(visualization_id)
+    
+    def analyze_long_audio_file(self, filepath, window_seconds=LONG_WINDOW_SECONDS,
+                                overlap_seconds=LONG_OVERLAP_SECONDS):
+        """Emotion timeline of an audio file of any length, read block by block.
+        
+        Returns (segments, summary); see TimelineAnalysis.
+        """
+        timeline = TimelineAnalysis(self, window_seconds, overlap_seconds)
+        with open(filepath, 'rb') as f:
+            segments = list(timeline.segments(audio_stream_blocks(f)))
+        return segments, timeline.summary()
+    
+    def classify_audio_file(self, filepath):
+        """Classify an audio file, deferring its visualization.
+        
+        Returns (emotion, confidence, visualization_id); the image is rendered
+        later by get_visualization_png.
+        """
         try:
-            # Read the audio file
             with open(filepath, 'rb') as f:
-                audio_data = f.read()
-            
-            # Get file size
-            file_size = len(audio_data)
+                content_hash = hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+                return self.classify_audio(f, content_hash=content_hash)
+        except Exception as e:
+            print(f"❌ Analysis error: {e}")
+            return None, None, None
+    
+    def classify_audio(self, source, timings=None, content_hash=None, pcm_format=None):
+        """Classify audio held in memory or in an open file.
+        
+        source may be bytes, a bytearray, a memoryview, or a file-like object
+        such as request.files['audio'].stream. Files backed by a real
+        descriptor are memory-mapped; in-memory streams are viewed through
+        their buffer, so the upload is never copied or written again.
+        Stage durations are added to the timings dict when one is given.
+        Uploads whose content hash is known up front (given, or computed by
+        the upload stream) are answered from the result cache when possible.
+        pcm_format is (sample_rate, channels) for headerless audio/L16 data,
+        which is then viewed directly instead of sniffed for a container.
+        """
+        try:
+            if content_hash is None and hasattr(source, 'hexdigest'):
+                content_hash = source.hexdigest()
+            if content_hash is not None:
+                start = time.perf_counter()
+                cached = self.cached_result(content_hash)
+                elapsed = time.perf_counter() - start
+                metrics.observe('emotion_stage_duration_seconds', elapsed, stage='result_cache')
+                if timings is not None:
+                    timings['cache'] = elapsed
+                if cached is not None:
+                    return cached
             
-            # Extract basic features from file
-            features = self.extract_file_features(audio_data, file_size)
+            with open_audio_buffer(source) as audio_data:
+                if content_hash is None and pcm_format is not None:
+                    # The byte digest alone would collide with a container upload of the same bytes
+                    content_hash = pcm_content_hash(audio_data, pcm_format)
+                if self.executor.kind == 'process':
+                    # Workers read the upload from shared memory instead of a pickle
+                    with SharedUpload([audio_data]) as shared:
+                        result = self.executor.run(analyze_shared_upload, shared.name, shared.layout, pcm_format)
+                else:
+                    result = self.executor.run(self.analyze_buffer, audio_data, len(audio_data), source, pcm_format)
             
-            # Determine emotion based on features
-            emotion, confidence = self.determine_emotion(features)
+            features, signal, emotion, confidence, stage_timings = result
             
-            # Create visualization
-            visualization = self.create_visualization(features, file_size)
+            # Register the visualization inputs for on-demand rendering
+            visualization_id = self.register_visualization(features, features['file_size'], signal)
+            self.store_result(content_hash or features['content_hash'], features, emotion, confidence,
+                              visualization_id, signal)
             
-            return emotion, confidence, visualization
+            metrics.inc('emotion_bytes_processed_total', features['file_size'])
+            for stage, seconds in stage_timings.items():
+                metrics.observe('emotion_stage_duration_seconds', seconds, stage=stage)
+            if timings is not None:
+                timings.update(stage_timings)
             
+            return emotion, confidence, visualization_id
+        except AnalysisBusy:
+            raise
         except Exception as e:
             print(f"❌ Analysis error: {e}")
+            metrics.inc('emotion_errors_total', stage='analysis', reason=type(e).__name__)
             return None, None, None
     
-    def extract_file_features(self, audio_data, file_size):
-        """Extract features from audio file bytes"""
-        features = {
-            'file_size': file_size,
-            'file_size_kb': file_size / 1024,
-            'has_wave_header': audio_data[:4] == b'RIFF' if len(audio_data) >= 4 else False,
-            'data_variance': 0,
-            'byte_pattern': 0
+    def cached_result(self, content_hash):
+        """(emotion, confidence, visualization_id) of an earlier identical upload, or None"""
+        if self.result_cache is None:
+            return None
+        entry = self.result_cache.get(f'{content_hash}:{self.result_namespace}')
+        if entry is None:
+            return None
+        visualization_id = entry['visualization_id']
+        if not self.restore_visualization(visualization_id, entry['render_spec']):
+            # The decoded signal behind an evicted STFT visualization is not cached
+            return None
+        return entry['emotion'], entry['confidence'], visualization_id
+    
+    def store_result(self, content_hash, features, emotion, confidence, visualization_id, signal=None):
+        """Cache a result under the key cached_result looks it up by"""
+        if self.result_cache is None:
+            return
+        render_spec = None
+        if signal is None or self.spectrogram_mode != 'stft':
+            render_spec = [float(features.get('data_variance', 0)), features['file_size']]
+        self.result_cache.put(f'{content_hash}:{self.result_namespace}', {
+            'emotion': emotion,
+            'confidence': float(confidence),
+            'visualization_id': visualization_id,
+            'render_spec': render_spec
+        })
+    
+    def analyze_buffer(self, audio_data, file_size, source, pcm_format=None):
+        """Compute (features, signal, emotion, confidence, timings) for a bytes-like upload.
+        
+        source is used for fallback decoding of compressed containers.
+        """
+        start = time.perf_counter()
+        
+        # Extract basic features from file
+        features = self.extract_file_features(audio_data, file_size)
+        
+        # Add signal properties and acoustic features when the samples can be decoded
+        signal_features, signal = self.extract_signal_features(audio_data, source, pcm_format)
+        features.update(signal_features)
+        if self.spectrogram_mode != 'stft':
+            signal = None
+        features_done = time.perf_counter()
+        
+        # Determine emotion based on features
+        emotion, confidence = self.determine_emotion(features)
+        
+        timings = {
+            'features': features_done - start,
+            'classify': time.perf_counter() - features_done
         }
+        return features, signal, emotion, confidence, timings
+    
+    def extract_signal_features(self, audio_data, source, pcm_format=None):
+        """Decode once and return (features, signal).
         
-        # Calculate byte variance (for "energy" estimation)
-        if len(audio_data) > 100:
-            sample_bytes = audio_data[:100]
-            byte_values = [b for b in sample_bytes]
-            if byte_values:
-                features['data_variance'] = np.var(byte_values)
+        features holds sample_rate, channels, duration and the per-frame
+        'acoustic' array; signal is the (mono_samples, sample_rate) pair.
+        Both are empty/None when the samples cannot be decoded.
+        """
+        if pcm_format is not None:
+            decoded = pcm_samples(audio_data, *pcm_format)
+        else:
+            decoded = wav_samples(audio_data)
+        if decoded is None and pcm_format is None:
+            return self.extract_container_features(source)
+        if decoded is None or decoded.samples.shape[0] == 0:
+            return {}, None
         
-        # Analyze byte patterns
-        if len(audio_data) > 50:
-            # Check for patterns in first 50 bytes
-            patterns = sum(1 for i in range(len(audio_data)-1) if audio_data[i] == audio_data[i+1])
-            features['byte_pattern'] = patterns / len(audio_data) if len(audio_data) > 0 else 0
+        with decoded:
+            mono = decoded.mono()
+            features = {
+                'sample_rate': decoded.sample_rate,
+                'channels': decoded.channels,
+                'duration': decoded.duration,
+                'acoustic': extract_acoustic_features(mono, decoded.sample_rate)
+            }
+        return features, (mono, decoded.sample_rate)
+    
+    def extract_container_features(self, source):
+        """extract_signal_features for compressed containers, framed block by block as they decode.
+        
+        The decoded audio is never held whole: only the per-frame features
+        are kept, plus the mono signal when STFT spectrograms need it
+        (signal is None otherwise).
+        """
+        framer = None
+        channels = 0
+        acoustic = []
+        mono_blocks = []
+        for sample_rate, block in stream_decoded_frames(source):
+            if framer is None:
+                framer = AcousticFramer(sample_rate)
+                channels = block.shape[1]
+            mono = block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+            acoustic.append(framer.update(mono))
+            if self.spectrogram_mode == 'stft':
+                mono_blocks.append(mono)
+        if framer is None or not framer.samples:
+            return {}, None
+        acoustic.append(framer.finish())
         
+        features = {
+            'sample_rate': framer.sample_rate,
+            'channels': channels,
+            'duration': framer.samples / framer.sample_rate,
+            'acoustic': np.concatenate(acoustic)
+        }
+        signal = (np.concatenate(mono_blocks), framer.sample_rate) if mono_blocks else None
+        return features, signal
+    
+    def extract_file_features(self, audio_data, file_size):
+        """Extract features from audio file bytes"""
+        accumulator = ByteFeatureAccumulator()
+        accumulator.update(audio_data)
+        features = accumulator.features()
+        features['file_size'] = file_size
+        features['file_size_kb'] = file_size / 1024
         return features
     
+    def extract_stream_features(self, stream, chunk_size=None):
+        """Extract the same features incrementally from a file-like object"""
+        accumulator = ByteFeatureAccumulator()
+        chunk_size = chunk_size or FEATURE_CHUNK_SIZE
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            accumulator.update(chunk)
+        return accumulator.features()
+    
+    def extract_batch_features(self, buffers):
+        """Extract byte features for many uploads with one pass over a concatenated array"""
+        sizes = np.array([len(buffer) for buffer in buffers], dtype=np.int64)
+        if sizes.size == 0:
+            return []
+        data = np.concatenate([np.frombuffer(buffer, dtype=np.uint8) for buffer in buffers])
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        
+        # Repeated adjacent bytes, excluding pairs that straddle two uploads
+        repeats = np.zeros(data.size, dtype=np.int64)
+        repeats[1:] = data[1:] == data[:-1]
+        nonempty = sizes > 0
+        repeats[starts[nonempty]] = 0
+        counts = np.zeros(sizes.size, dtype=np.int64)
+        counts[nonempty] = np.add.reduceat(repeats, starts[nonempty])
+        
+        # Variance of the first 100 bytes of every upload that is long enough
+        head_size = ByteFeatureAccumulator.HEAD_SIZE
+        long_enough = np.flatnonzero(sizes > head_size)
+        heads = data[starts[long_enough, np.newaxis] + np.arange(head_size)]
+        variances = np.zeros(sizes.size)
+        variances[long_enough] = np.var(heads, axis=1)
+        
+        batch_features = []
+        for i, buffer in enumerate(buffers):
+            size = int(sizes[i])
+            batch_features.append({
+                'file_size': size,
+                'file_size_kb': size / 1024,
+                'has_wave_header': bytes(buffer[:4]) == b'RIFF',
+                'data_variance': variances[i] if size > head_size else 0,
+                'byte_pattern': counts[i] / size if size > 50 else 0,
+                'content_hash': hashlib.blake2b(buffer, digest_size=16).hexdigest()
+            })
+        return batch_features
+    
+    def classify_batch(self, clips):
+        """Classify a list of (name, bytes-like) clips in one vectorized pass.
+        
+        Returns (rows, timings) where rows holds (name, emotion, confidence,
+        features) and timings the seconds spent per stage.
+        """
+        timings = {}
+        
+        start = time.perf_counter()
+        buffers = [buffer for _, buffer in clips]
+        batch_features = self.extract_batch_features(buffers)
+        timings['features'] = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        for features, buffer in zip(batch_features, buffers):
+            features.update(self.extract_signal_features(buffer, buffer)[0])
+        timings['decode'] = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        rows = []
+        for (name, _), features, (emotion, confidence) in zip(clips, batch_features,
+                                                              self.determine_emotions(batch_features)):
+            rows.append((name, emotion, float(confidence), features))
+        timings['classify'] = time.perf_counter() - start
+        
+        return rows, timings
+    
+    def analyze_batch(self, clips, visualize=True, workers=1):
+        """Classify many clips, optionally spread over the analysis worker processes.
+        
+        Slices only go to other processes when the analysis executor runs
+        them (ANALYSIS_EXECUTOR=process), and never more than it has workers.
+        Visualizations are registered for lazy rendering (synthetic mode only)
+        unless visualize is False. Returns (rows, timings) where rows are
+        (name, emotion, confidence, visualization_id) tuples.
+        """
+        process_workers = self.executor.workers if self.executor.kind == 'process' else 1
+        workers = max(1, min(workers, BATCH_MAX_WORKERS, process_workers, len(clips)))
+        if workers == 1:
+            rows, timings = self.classify_batch(clips)
+        else:
+            # Contiguous slices keep the results in upload order
+            step = -(-len(clips) // workers)
+            chunks = [clips[i:i + step] for i in range(0, len(clips), step)]
+            rows, timings = [], {}
+            # Each worker attaches to one shared copy of its slice instead of unpickling bytes
+            with SharedUpload([buffer for _, buffer in clips]) as shared:
+                jobs = [([name for name, _ in chunk], shared.name, shared.layout[i:i + step])
+                        for chunk, i in zip(chunks, range(0, len(clips), step))]
+                for chunk_rows, chunk_timings in self.executor.map(classify_batch_chunk, *zip(*jobs)):
+                    rows.extend(chunk_rows)
+                    for stage, seconds in chunk_timings.items():
+                        # Stages run in parallel, so report the slowest worker
+                        timings[stage] = max(timings.get(stage, 0.0), seconds)
+        
+        start = time.perf_counter()
+        results = []
+        for name, emotion, confidence, features in rows:
+            visualization_id = None
+            if visualize:
+                visualization_id = self.register_visualization(features, features['file_size'])
+            results.append((name, emotion, confidence, visualization_id))
+        timings['visualize'] = time.perf_counter() - start
+        
+        return results, timings
+    
+    # Typical (energy, pitch level, pitch variability, brightness) per emotion, each in [0, 1]
+    ACOUSTIC_PROTOTYPES = {
+        '😠 Angry': (0.9, 0.6, 0.5, 0.9),
+        '😊 Happy': (0.7, 0.7, 0.7, 0.6),
+        '😲 Surprised': (0.6, 0.9, 0.9, 0.6),
+        '😨 Fearful': (0.4, 0.8, 0.4, 0.7),
+        '😢 Sad': (0.2, 0.3, 0.2, 0.3),
+        '😐 Neutral': (0.5, 0.4, 0.2, 0.4)
+    }
+    
+    def acoustic_emotion(self, acoustic):
+        """Nearest emotion prototype in prosody space, with softmax confidence"""
+        return self.summary_emotion(summarize_acoustic_features(acoustic))
+    
+    def summary_emotion(self, summary):
+        """acoustic_emotion of a clip-level summary (see AcousticSummary)"""
+        point = np.clip([
+            (summary['energy_db'] + 50) / 45,
+            (summary['pitch_mean'] - 80) / 270 if summary['voiced_ratio'] else 0.4,
+            summary['pitch_std_semitones'] / 6,
+            summary['centroid'] / 4000
+        ], 0, 1)
+        names = list(self.ACOUSTIC_PROTOTYPES)
+        distances = np.linalg.norm(np.array([self.ACOUSTIC_PROTOTYPES[name] for name in names]) - point, axis=1)
+        weights = np.exp(-8 * (distances - distances.min()))
+        best = int(np.argmin(distances))
+        return names[best], float(weights[best] / weights.sum())
+    
+    def determine_emotions(self, features_list):
+        """determine_emotion for many clips, with one predict_proba call for all decoded ones"""
+        results = [None] * len(features_list)
+        if self.model is not None:
+            decoded = [i for i, features in enumerate(features_list)
+                       if features.get('acoustic') is not None and features['acoustic'].size]
+            if decoded:
+                X = np.stack([acoustic_feature_vector(features_list[i]['acoustic']) for i in decoded])
+                labels, confidences = self.model.predict(X)
+                for i, label, confidence in zip(decoded, labels, confidences):
+                    results[i] = (label, float(confidence))
+        return [result or self.determine_emotion(features)
+                for result, features in zip(results, features_list)]
+    
+    def classify_summary(self, summary):
+        """(emotion, confidence) of decoded audio from its clip-level acoustic summary"""
+        if self.model is not None:
+            labels, confidences = self.model.predict(summary_feature_vector(summary))
+            return labels[0], float(confidences[0])
+        emotion, confidence = self.summary_emotion(summary)
+        return emotion, min(max(confidence, 0.6), 0.95)
+    
     def determine_emotion(self, features):
         """Determine emotion based on audio file features"""
         
-        # Seed random with file size for consistency
-        random.seed(features['file_size'])
+        # Decoded audio is classified from its acoustic features
+        acoustic = features.get('acoustic')
+        if acoustic is not None and acoustic.size:
+            return self.classify_summary(summarize_acoustic_features(acoustic))
+        
+        # Private generator seeded from the upload's content, so concurrent
+        # requests neither share nor re-seed the global random module
+        rng = random.Random(features.get('content_hash') or features['file_size'])
         
         # Rule-based emotion detection
         if features['file_size_kb'] > 200:  # Large file
             if features['data_variance'] > 100:
                 emotion = '😠 Angry'
-                confidence = 0.85 + random.random() * 0.10
+                confidence = 0.85 + rng.random() * 0.10
             elif features['data_variance'] > 50:
                 emotion = '😊 Happy'
-                confidence = 0.80 + random.random() * 0.15
+                confidence = 0.80 + rng.random() * 0.15
             else:
                 emotion = '😐 Neutral'
-                confidence = 0.70 + random.random() * 0.15
+                confidence = 0.70 + rng.random() * 0.15
                 
         elif features['file_size_kb'] < 50:  # Small file
             if features['byte_pattern'] > 0.3:
                 emotion = '😨 Fearful'
-                confidence = 0.75 + random.random() * 0.15
+                confidence = 0.75 + rng.random() * 0.15
             else:
                 emotion = '😢 Sad'
-                confidence = 0.65 + random.random() * 0.20
+                confidence = 0.65 + rng.random() * 0.20
                 
         else:  # Medium file
             emotions_weights = {
@@ -121,26 +2147,110 @@ class AudioAnalyzer:
             }
             
             # Weighted random selection
-            emotion = random.choices(
+            emotion = rng.choices(
                 list(emotions_weights.keys()),
                 weights=list(emotions_weights.values()),
                 k=1
             )[0]
             
-            confidence = 0.70 + random.random() * 0.20
+            confidence = 0.70 + rng.random() * 0.20
         
         # Ensure confidence is reasonable
         confidence = min(max(confidence, 0.6), 0.95)
         
         return emotion, confidence
     
-    def create_visualization(self, features, file_size):
-        """Create audio waveform visualization"""
+    def register_visualization(self, features, file_size, signal=None):
+        """Remember the inputs of a visualization and return its ID"""
+        if self.spectrogram_mode != 'stft':
+            signal = None
+        visualization_id = render_fingerprint(features, file_size, signal)
+        spec = ({'data_variance': features.get('data_variance', 0)}, file_size, signal)
+        self.render_specs.put(visualization_id, spec)
+        return visualization_id
+    
+    def render_spec(self, visualization_id):
+        """JSON-safe inputs of a registered visualization for restore_visualization, or None.
+        
+        STFT visualizations need the decoded signal, which is not kept.
+        """
+        spec = self.render_specs.get(visualization_id)
+        if spec is None or spec[2] is not None:
+            return None
+        return [float(spec[0]['data_variance']), spec[1]]
+    
+    def restore_visualization(self, visualization_id, render_spec):
+        """Re-register a visualization from its render_spec; False if it can no longer be rendered"""
+        if visualization_id in self.render_specs or visualization_id in self.render_cache:
+            return True
+        if render_spec is None:
+            return False
+        data_variance, file_size = render_spec
+        self.render_specs.put(visualization_id, ({'data_variance': data_variance}, file_size, None))
+        return True
+    
+    def get_visualization_png(self, visualization_id, timings=None, profile='standard'):
+        """Return image bytes for a registered visualization, rendering on demand.
+        
+        The bytes are PNG except for the 'svg' profile.
+        """
+        cache_key = visualization_id if profile == 'standard' else f'{visualization_id}:{profile}'
+        cached = self.render_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        spec = self.render_specs.get(visualization_id)
+        if spec is None:
+            return None
+        
+        start = time.perf_counter()
+        if self.executor.kind == 'process':
+            png = self.executor.run(render_visualization_job, *spec, profile)
+        else:
+            png = self.render_pool.submit(self.render_visualization, *spec, profile).result()
+        elapsed = time.perf_counter() - start
+        metrics.observe('emotion_stage_duration_seconds', elapsed, stage='render')
+        if timings is not None:
+            timings['render'] = elapsed
+        if png is not None:
+            self.render_cache.put(cache_key, png)
+        return png
+    
+    def get_visualization(self, visualization_id, timings=None, profile='standard'):
+        """Return a registered visualization as a base64 string"""
+        png = self.get_visualization_png(visualization_id, timings, profile)
+        return base64.b64encode(png).decode('utf-8') if png is not None else None
+    
+    def create_visualization(self, features, file_size, signal=None, profile='standard'):
+        """Render (or fetch from cache) a visualization as a base64 string"""
+        return self.get_visualization(self.register_visualization(features, file_size, signal),
+                                      profile=profile)
+    
+    def get_figure_template(self, profile='standard'):
+        """Return a profile's figure scaffold, building it (and importing matplotlib) on first use"""
+        template = self.figure_templates.get(profile)
+        if template is None:
+            with self.figure_template_lock:
+                template = self.figure_templates.get(profile)
+                if template is None:
+                    template = FigureTemplate(profile, self.spectrogram_mode)
+                    self.figure_templates[profile] = template
+        return template
+    
+    def render_visualization(self, features, file_size, signal=None, profile='standard'):
+        """Create audio waveform visualization as PNG (or SVG) bytes
+        
+        signal is an optional (mono_samples, sample_rate) pair used when
+        spectrogram_mode is 'stft'. Each call draws on its own Figure and
+        Agg canvas, so concurrent calls never share pyplot state.
+        """
         try:
-            plt.figure(figsize=(12, 6))
+            template = self.get_figure_template(profile)
+            fig = template.new_figure()
+            wave_ax, spec_ax = fig.axes[:2]
             
             # Generate synthetic waveform based on file characteristics
-            duration = 3.0
+            duration = FigureTemplate.DURATION
             sample_rate = 22050
             samples = int(duration * sample_rate)
             
@@ -155,9 +2265,10 @@ class AudioAnalyzer:
             wave1 = 0.5 * np.sin(2 * np.pi * freq1 * t)
             wave2 = 0.3 * np.sin(2 * np.pi * freq2 * t + np.pi/4)
             
-            # Add some noise based on file variance
+            # Add some noise based on file variance, seeded so renders are reproducible
             noise_level = min(features.get('data_variance', 0) / 100, 0.2)
-            noise = noise_level * np.random.randn(samples)
+            rng = np.random.default_rng(int(render_fingerprint(features, file_size)[:16], 16))
+            noise = noise_level * rng.standard_normal(samples)
             
             # Combine waves
             waveform = wave1 + wave2 + noise
@@ -166,66 +2277,563 @@ class AudioAnalyzer:
             if np.max(np.abs(waveform)) > 0:
                 waveform = waveform / np.max(np.abs(waveform))
             
-            # Plot waveform
-            plt.subplot(2, 1, 1)
-            plt.plot(t, waveform, 'b-', alpha=0.8, linewidth=0.5)
-            plt.fill_between(t, waveform, alpha=0.3, color='blue')
-            plt.title('Audio Waveform Simulation', fontsize=16, fontweight='bold')
-            plt.xlabel('Time (seconds)')
-            plt.ylabel('Amplitude')
-            plt.grid(True, alpha=0.3)
-            plt.xlim([0, duration])
+            # Plot the min/max envelope per pixel column instead of every sample
+            lows, highs = minmax_decimate(waveform, template.columns)
+            x = np.linspace(0, duration, lows.shape[0])
+            wave_ax.plot(np.repeat(x, 2), np.column_stack([lows, highs]).ravel(), 'b-', alpha=0.8, linewidth=0.5)
+            wave_ax.fill_between(x, np.minimum(lows, 0), np.maximum(highs, 0), alpha=0.3, color='blue')
             
             # Plot spectrogram simulation
-            plt.subplot(2, 1, 2)
-            
-            # Create spectrogram-like data
-            frequencies = np.linspace(0, 5000, 100)
-            times = np.linspace(0, duration, 100)
-            
-            # Create intensity matrix based on file features
-            intensity = np.zeros((len(frequencies), len(times)))
-            for i, f in enumerate(frequencies):
-                for j, _ in enumerate(times):
-                    intensity[i, j] = np.exp(-(f - freq1)**2 / 100000) * \
-                                     np.exp(-(j/len(times) - 0.5)**2 / 0.1)
-            
-            plt.imshow(intensity, aspect='auto', origin='lower', 
-                      extent=[0, duration, 0, 5000], 
-                      cmap='viridis', alpha=0.8)
-            plt.title('Frequency Spectrum', fontsize=16, fontweight='bold')
-            plt.xlabel('Time (seconds)')
-            plt.ylabel('Frequency (Hz)')
-            plt.colorbar(label='Intensity')
-            
-            plt.tight_layout()
+            if self.spectrogram_mode == 'stft' and signal is not None:
+                # Real spectrogram from the decoded samples
+                intensity, extent = stft_spectrogram(*signal)
+            else:
+                # Create intensity matrix based on file features
+                intensity = synthetic_intensity(freq1, 100, 100)
+                extent = [0, duration, 0, 5000]
             
-            # Save to buffer
-            buf = BytesIO()
-            plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
-            plt.close()
-            buf.seek(0)
+            image = spec_ax.images[0]
+            image.set_data(intensity)
+            image.set_extent(extent)
+            image.set_clim(intensity.min(), intensity.max())
+            spec_ax.set_xlim(extent[0], extent[1])
+            spec_ax.set_ylim(extent[2], extent[3])
+            if image.colorbar is not None:
+                image.colorbar.update_normal(image)
             
-            # Convert to base64
-            img_str = base64.b64encode(buf.read()).decode('utf-8')
-            return img_str
+            return template.save(fig)
             
         except Exception as e:
             print(f"❌ Visualization error: {e}")
             return None
 
+class StreamSession:
+    """Rolling emotion analysis over audio that arrives in pieces.
+    
+    audio/L16 streams (pcm_format is (sample_rate, channels)) and WAV
+    streams, recognized from their header, are decoded as they arrive and
+    framed exactly as /analyze frames the whole signal; running acoustic
+    statistics are kept for the current window and for the whole stream.
+    Other streams only feed running byte-feature accumulators. Every
+    window_bytes a window is classified and an update is emitted. Only
+    running totals are kept, so memory stays constant however long the
+    stream runs, and the final result matches /analyze for the same bytes.
+    """
+    
+    # Bytes of a stream searched for a WAV header before it is treated as undecodable
+    HEADER_LIMIT = 1024 * 1024
+    
+    def __init__(self, analyzer, window_bytes=STREAM_WINDOW_BYTES, pcm_format=None):
+        self.analyzer = analyzer
+        self.window_bytes = window_bytes
+        self.stream = ByteFeatureAccumulator()
+        self.window = ByteFeatureAccumulator()
+        self.windows = 0
+        self.counts = {}
+        self.started = time.perf_counter()
+        # Until the decoder is known, the first bytes are kept to look for a WAV header
+        self.prefix = b''
+        self.decoder = None
+        self.framer = None
+        self.stream_acoustic = AcousticSummary()
+        self.window_acoustic = AcousticSummary()
+        if pcm_format is not None:
+            self.start_decoding(PCMBlockDecoder(np.dtype('>i2'), pcm_format[1], pcm_format[0]))
+    
+    def start_decoding(self, decoder):
+        self.decoder = decoder
+        self.framer = AcousticFramer(decoder.sample_rate)
+        self.prefix = None
+    
+    def decode(self, piece):
+        """Push raw bytes through header detection and the PCM decoder into the acoustic statistics"""
+        if self.prefix is not None:
+            self.prefix += bytes(piece)
+            piece = b''
+            parsed = parse_wav_prefix(self.prefix) if maybe_wav(self.prefix) else None
+            if parsed is not None:
+                (dtype, channels, sample_rate, _, _), data_size, piece = parsed
+                self.start_decoding(PCMBlockDecoder(dtype, channels, sample_rate, data_size))
+            elif not maybe_wav(self.prefix) or len(self.prefix) >= self.HEADER_LIMIT:
+                self.prefix = None
+        if self.decoder is None:
+            return
+        samples = self.decoder.update(piece)
+        if samples is not None:
+            self.add_frames(self.framer.update(samples))
+    
+    def add_frames(self, acoustic):
+        self.window_acoustic.update(acoustic)
+        self.stream_acoustic.update(acoustic)
+    
+    def feed(self, chunk):
+        """Consume the next piece of audio; return an update per completed window"""
+        updates = []
+        view = memoryview(chunk).cast('B')
+        while len(view):
+            piece = view[:self.window_bytes - self.window.total]
+            self.window.update(piece)
+            self.stream.update(piece)
+            self.decode(piece)
+            view = view[len(piece):]
+            if self.window.total >= self.window_bytes:
+                updates.append(self.close_window())
+        metrics.inc('emotion_bytes_processed_total', len(chunk))
+        return updates
+    
+    def classify(self, features, acoustic):
+        """Classify from acoustic statistics when the stream decodes, else from byte features"""
+        if acoustic.count:
+            return self.analyzer.classify_summary(acoustic.summary())
+        return self.analyzer.determine_emotion(features)
+    
+    def close_window(self):
+        start = time.perf_counter()
+        features = self.window.features()
+        # A window too short for a whole frame is judged by the stream so far
+        acoustic = self.window_acoustic if self.window_acoustic.count else self.stream_acoustic
+        emotion, confidence = self.classify(features, acoustic)
+        self.counts[emotion] = self.counts.get(emotion, 0) + 1
+        update = {
+            'type': 'update',
+            'window': self.windows,
+            'emotion': emotion,
+            'confidence': round(confidence, 3),
+            'window_bytes': features['file_size'],
+            'total_bytes': self.stream.total,
+            'elapsed_ms': round((time.perf_counter() - self.started) * 1000, 1)
+        }
+        self.windows += 1
+        self.window = ByteFeatureAccumulator()
+        self.window_acoustic = AcousticSummary()
+        metrics.observe('emotion_stage_duration_seconds', time.perf_counter() - start, stage='stream_window')
+        return update
+    
+    def finish(self):
+        """Classify any partial last window and return [updates..., final result]"""
+        if self.framer is not None:
+            self.add_frames(self.framer.finish())
+        updates = [self.close_window()] if self.window.total else []
+        if not self.stream.total:
+            return updates + [{'type': 'final', 'success': False, 'error': 'No audio received'}]
+        
+        features = self.stream.features()
+        emotion, confidence = self.classify(features, self.stream_acoustic)
+        visualization_id = self.analyzer.register_visualization(features, features['file_size'])
+        final = {
+            'type': 'final',
+            'success': True,
+            'emotion': emotion,
+            'confidence': confidence,
+            'windows': self.windows,
+            'window_emotions': self.counts,
+            'total_bytes': self.stream.total,
+            'visualization_id': visualization_id,
+            'features': {
+                'file_size_kb': round(features['file_size_kb'], 2),
+                'data_variance': float(features['data_variance']),
+                'byte_pattern': round(features['byte_pattern'], 4)
+            }
+        }
+        if self.framer is not None and self.framer.samples:
+            final['features']['duration'] = round(self.framer.samples / self.framer.sample_rate, 3)
+        updates.append(final)
+        return updates
+
+class TimelineAnalysis:
+    """Emotion timeline of a recording of any length, in overlapping windows.
+    
+    Decoded blocks flow through generators (blocks -> windows -> segments),
+    so only the current window and the block being read are in memory: an
+    hour-long recording needs no more than a ten-second one. Each window is
+    classified from its acoustic features and tallied, weighted by its
+    length and confidence, for the aggregate.
+    """
+    
+    def __init__(self, analyzer, window_seconds=LONG_WINDOW_SECONDS, overlap_seconds=LONG_OVERLAP_SECONDS):
+        self.analyzer = analyzer
+        self.window_seconds = window_seconds
+        self.overlap_seconds = overlap_seconds
+        self.count = 0
+        self.duration = 0.0
+        self.scores = {}
+        self.counts = {}
+        self.started = time.perf_counter()
+    
+    def windows(self, blocks):
+        """Yield (start_seconds, samples, sample_rate) for each window over a block stream"""
+        pending = None
+        offset = 0
+        for rate, block in blocks:
+            if pending is None:
+                sample_rate = rate
+                window = max(1, int(self.window_seconds * sample_rate))
+                hop = max(1, window - int(self.overlap_seconds * sample_rate))
+                pending = np.empty(0, dtype=np.float32)
+            pending = np.concatenate((pending, block))
+            while len(pending) >= window:
+                yield offset / sample_rate, pending[:window], sample_rate
+                pending = pending[hop:]
+                offset += hop
+        
+        # The tail that no full window reached (or all of a recording shorter than one window)
+        if pending is not None and len(pending) > (window - hop if offset else 0):
+            yield offset / sample_rate, pending, sample_rate
+    
+    def segments(self, blocks):
+        """Yield one {'start', 'end', 'emotion', 'confidence'} dict per window"""
+        for start, samples, sample_rate in self.windows(blocks):
+            began = time.perf_counter()
+            acoustic = extract_acoustic_features(samples, sample_rate)
+            if not acoustic.size:
+                continue
+            emotion, confidence = self.analyzer.determine_emotion({'acoustic': acoustic})
+            seconds = len(samples) / sample_rate
+            self.count += 1
+            self.duration = start + seconds
+            self.scores[emotion] = self.scores.get(emotion, 0.0) + confidence * seconds
+            self.counts[emotion] = self.counts.get(emotion, 0) + 1
+            metrics.observe('emotion_stage_duration_seconds', time.perf_counter() - began, stage='long_window')
+            yield {
+                'start': round(start, 3),
+                'end': round(start + seconds, 3),
+                'emotion': emotion,
+                'confidence': round(confidence, 3)
+            }
+    
+    def summary(self):
+        """Aggregate over all windows seen so far"""
+        if not self.count:
+            return {'success': False, 'error': 'No decodable audio received'}
+        emotion = max(self.scores, key=self.scores.get)
+        return {
+            'success': True,
+            'emotion': emotion,
+            'confidence': round(self.scores[emotion] / sum(self.scores.values()), 3),
+            'duration': round(self.duration, 3),
+            'segments': self.count,
+            'distribution': {name: round(count / self.count, 3) for name, count in self.counts.items()},
+            'window_seconds': self.window_seconds,
+            'overlap_seconds': self.overlap_seconds,
+            'elapsed_ms': round((time.perf_counter() - self.started) * 1000, 1)
+        }
+
+def timeline_windows(args):
+    """(window_seconds, overlap_seconds) requested by a client, clamped to sensible bounds"""
+    try:
+        window = min(max(float(args.get('window', LONG_WINDOW_SECONDS)), 1.0), 300.0)
+        overlap = min(max(float(args.get('overlap', LONG_OVERLAP_SECONDS)), 0.0), window * 0.9)
+    except (TypeError, ValueError):
+        return LONG_WINDOW_SECONDS, LONG_OVERLAP_SECONDS
+    return window, overlap
+
+class JobCancelled(Exception):
+    """Raised at a job's next checkpoint once its cancellation was requested"""
+
+class JobQueue:
+    """Background analyses submitted through /jobs.
+    
+    A fixed pool of worker threads takes the highest-priority queued job
+    from the store, so heavy analyses neither hold a request thread nor
+    exceed `workers` at a time. Each job's uploads are kept in its own
+    directory until it finishes. Each start claims jobs under a new
+    instance ID and a monitor thread renews their lease; jobs whose lease
+    lapses (their server stopped or hung) are queued again.
+    """
+    
+    def __init__(self, store_path, directory, workers, queue_limit, retention, lease=JOB_LEASE,
+                 purge_interval=JOB_PURGE_INTERVAL):
+        self.store_path = store_path
+        self._store = None
+        self.store_lock = threading.Lock()
+        self.directory = directory
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.retention = retention
+        self.lease = lease
+        self.purge_interval = purge_interval
+        self.purged = 0.0
+        self.instance = None
+        self.wakeup = threading.Condition()
+        self.stopping = threading.Event()
+        self.threads = []
+        self.lock = threading.Lock()
+    
+    @property
+    def store(self):
+        """The JobStore, opened (and its file created) on first use rather than at import"""
+        if self._store is None:
+            with self.store_lock:
+                if self._store is None:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.store_path)), exist_ok=True)
+                    self._store = JobStore(self.store_path)
+        return self._store
+    
+    def counts(self):
+        """Jobs per status, without opening a store nothing has used yet"""
+        return {} if self._store is None else self._store.counts()
+    
+    def start(self):
+        """Open the store, recover interrupted jobs and start the workers (once)"""
+        with self.lock:
+            if self.threads:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            # Unique per start, so a restarted server never mistakes its predecessor's jobs for its own
+            self.instance = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}'
+            requeued = self.store.requeue_orphans(self.lease)
+            if requeued:
+                print(f"⚙️  Re-queued {requeued} interrupted jobs")
+            self.purge()
+            monitor = threading.Thread(target=self.monitor, name='job-monitor', daemon=True)
+            monitor.start()
+            self.threads.append(monitor)
+            for index in range(self.workers):
+                thread = threading.Thread(target=self.work, name=f'job-{index}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+    
+    def stop(self, timeout=None):
+        """Stop the workers after their current job, and the monitor; a later start() begins anew"""
+        with self.lock:
+            self.stopping.set()
+            with self.wakeup:
+                self.wakeup.notify_all()
+            for thread in self.threads:
+                thread.join(timeout)
+            self.threads = []
+            self.stopping.clear()
+    
+    def input_dir(self, job_id):
+        return os.path.join(self.directory, job_id)
+    
+    def submit(self, kind, priority, params, save_inputs):
+        """Queue a job whose uploads save_inputs(directory) writes; returns its ID"""
+        if self.store.counts().get('queued', 0) >= self.queue_limit:
+            raise AnalysisBusy(ANALYSIS_RETRY_AFTER)
+        job_id = uuid.uuid4().hex
+        directory = self.input_dir(job_id)
+        os.makedirs(directory)
+        try:
+            save_inputs(directory)
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        self.store.submit(job_id, kind, priority, params)
+        with self.wakeup:
+            self.wakeup.notify()
+        return job_id
+    
+    def cancel(self, job_id):
+        status = self.store.cancel(job_id)
+        if status == 'cancelled':
+            shutil.rmtree(self.input_dir(job_id), ignore_errors=True)
+        return status
+    
+    def purge(self):
+        """Forget jobs that finished more than `retention` seconds ago, with any leftover inputs"""
+        self.purged = time.time()
+        for job_id in self.store.purge(self.purged - self.retention):
+            shutil.rmtree(self.input_dir(job_id), ignore_errors=True)
+    
+    def monitor(self):
+        """Renew this instance's leases, take over jobs whose owner's lease lapsed and purge old jobs"""
+        while not self.stopping.wait(min(self.lease / 3, self.purge_interval)):
+            try:
+                self.store.renew(self.instance)
+                if self.store.requeue_orphans(self.lease):
+                    with self.wakeup:
+                        self.wakeup.notify_all()
+                if time.time() - self.purged >= self.purge_interval:
+                    self.purge()
+            except sqlite3.Error as e:
+                print(f"⚠️ Job store maintenance failed: {e}")
+    
+    def work(self):
+        # A job the store failed under (locked, disk full) before it could be finished or released
+        unfinished = None
+        while not self.stopping.is_set():
+            try:
+                if unfinished is not None:
+                    self.store.release(unfinished, self.instance)
+                    unfinished = None
+                job = self.store.claim(self.instance)
+                if job is None:
+                    with self.wakeup:
+                        if not self.stopping.is_set():
+                            self.wakeup.wait(JOB_POLL_INTERVAL)
+                    continue
+                unfinished = job[0]
+                self.run(*job)
+                unfinished = None
+            except sqlite3.Error as e:
+                # Keep the worker alive and try again, as the monitor does
+                print(f"⚠️ Job store unavailable: {e}")
+                self.stopping.wait(JOB_POLL_INTERVAL)
+    
+    def run(self, job_id, kind, params):
+        start = time.perf_counter()
+        directory = self.input_dir(job_id)
+        
+        def checkpoint():
+            if self.store.cancel_requested(job_id):
+                raise JobCancelled(job_id)
+        
+        result = error = None
+        try:
+            result = JOB_RUNNERS[kind](directory, params, checkpoint)
+        except AnalysisBusy as busy:
+            # The analysis executor is saturated by interactive requests; try again shortly
+            self.store.release(job_id, self.instance)
+            time.sleep(busy.retry_after)
+            return
+        except JobCancelled:
+            pass
+        except sqlite3.Error:
+            # The store, not the job, failed (a checkpoint); work() hands the job back
+            raise
+        except Exception as e:
+            print(f"❌ Job {job_id} failed: {e}")
+            metrics.inc('emotion_errors_total', stage=f'job_{kind}', reason=type(e).__name__)
+            error = str(e) or type(e).__name__
+        if not self.store.finish(job_id, self.instance, result, error):
+            # Queued again while this worker ran it; the new owner needs the inputs
+            print(f"⚠️ Job {job_id} lost its lease; result discarded")
+            return
+        shutil.rmtree(directory, ignore_errors=True)
+        metrics.observe('emotion_stage_duration_seconds', time.perf_counter() - start, stage=f'job_{kind}')
+
+def job_render_specs(visualization_ids):
+    """Render specs stored with a job's result, so its visualizations outlive the server's memory"""
+    return {visualization_id: analyzer.render_spec(visualization_id)
+            for visualization_id in visualization_ids if visualization_id}
+
+def job_pcm_format(params):
+    return tuple(params['pcm_format']) if params.get('pcm_format') else None
+
+def run_analyze_job(directory, params, checkpoint):
+    """One clip, as /analyze"""
+    pcm_format = job_pcm_format(params)
+    with open(os.path.join(directory, '0'), 'rb') as f:
+        if pcm_format is not None:
+            content_hash = pcm_content_hash(f.read(), pcm_format)
+        else:
+            content_hash = hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+        emotion, confidence, visualization_id = analyzer.classify_audio(f, content_hash=content_hash,
+                                                                        pcm_format=pcm_format)
+    if emotion is None:
+        raise ValueError('Could not analyze audio file')
+    return {'emotion': emotion, 'confidence': float(confidence), 'visualization_id': visualization_id,
+            'render_specs': job_render_specs([visualization_id])}
+
+def run_long_job(directory, params, checkpoint):
+    """Emotion timeline of a long recording, as /analyze/long; cancellable after every window"""
+    timeline = TimelineAnalysis(analyzer, params['window'], params['overlap'])
+    segments = []
+    with open(os.path.join(directory, '0'), 'rb') as f:
+        for segment in timeline.segments(audio_stream_blocks(f, job_pcm_format(params))):
+            segments.append(segment)
+            checkpoint()
+    summary = timeline.summary()
+    if not summary['success']:
+        raise ValueError(summary['error'])
+    summary['timeline'] = segments
+    return summary
+
+def run_batch_job(directory, params, checkpoint):
+    """Many clips, as /analyze/batch; cancellable between slices"""
+    clips = []
+    for index, name in enumerate(params['names']):
+        with open(os.path.join(directory, str(index)), 'rb') as f:
+            clips.append((name, f.read()))
+    if params['archive']:
+        with open(os.path.join(directory, 'archive'), 'rb') as f:
+            clips.extend(read_archive_clips(f, max_clips=BATCH_MAX_CLIPS - len(clips)))
+    if not clips:
+        raise ValueError('No audio files provided')
+    if len(clips) > BATCH_MAX_CLIPS:
+        raise ValueError(f'At most {BATCH_MAX_CLIPS} clips per batch')
+    
+    step = 32 * max(1, params['workers'])
+    rows = []
+    for offset in range(0, len(clips), step):
+        checkpoint()
+        chunk_rows, _ = analyzer.analyze_batch(clips[offset:offset + step], visualize=params['visualize'],
+                                               workers=params['workers'])
+        rows.extend(chunk_rows)
+    return {
+        'count': len(rows),
+        'fields': ['name', 'emotion', 'confidence', 'visualization_id'],
+        'results': [list(row) for row in rows],
+        'render_specs': job_render_specs(row[3] for row in rows)
+    }
+
+JOB_RUNNERS = {'analyze': run_analyze_job, 'long': run_long_job, 'batch': run_batch_job}
+
+def stream_window_bytes(value):
+    """Window size requested by a streaming client, in KB, clamped to 1 KB - 1 MB"""
+    try:
+        return min(max(int(value) * 1024, 1024), 1024 * 1024)
+    except (TypeError, ValueError):
+        return STREAM_WINDOW_BYTES
+
 # Initialize analyzer
 analyzer = AudioAnalyzer()
 
-# HTML 
-HTML = '''
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Speech Emotion Recognition</title>
-    <style>
+def classify_batch_chunk(names, shared_name, layout):
+    """Process-pool entry point: classify one slice of a batch held in shared memory"""
+    with attach_shared_upload(shared_name, layout) as views:
+        return analyzer.classify_batch(list(zip(names, views)))
+
+def analyze_shared_upload(shared_name, layout, pcm_format=None):
+    """Process-pool entry point: analyze one upload held in shared memory"""
+    with attach_shared_upload(shared_name, layout) as (audio_data,):
+        return analyzer.analyze_buffer(audio_data, len(audio_data), audio_data, pcm_format)
+
+def render_visualization_job(features, file_size, signal, profile='standard'):
+    """Process-pool entry point: render one visualization to PNG bytes"""
+    image = analyzer.render_visualization(features, file_size, signal, profile)
+    # A memoryview cannot be pickled back, and crossing the process boundary copies the image anyway
+    return bytes(image) if image is not None else None
+
+SELF_TEST_WAV = synthetic_wav()
+
+def self_test_job():
+    """Analyze the built-in synthetic clip; used by the readiness probe"""
+    return analyzer.analyze_buffer(SELF_TEST_WAV, len(SELF_TEST_WAV), None)[2]
+
+health = HealthMonitor(analyzer.executor, lambda: analyzer.executor.run(self_test_job))
+
+job_queue = JobQueue(JOB_STORE_PATH, JOB_DIR, JOB_WORKERS, JOB_QUEUE_LIMIT, JOB_RETENTION)
+
+def warm_up():
+    """Pay first-request costs up front: matplotlib import, font cache, figure scaffold, FFT setup"""
+    start = time.perf_counter()
+    for profile in ('standard', 'thumbnail'):
+        analyzer.render_visualization({'data_variance': 0}, 0, None, profile)
+    self_test_job()
+    return time.perf_counter() - start
+
+def start_warm_up():
+    """Run warm_up on a background thread; readiness reports warming_up until it is done"""
+    health.warming = True
+    
+    def run():
+        try:
+            print(f"🔥 Warm-up finished in {warm_up():.2f}s")
+        except Exception as e:
+            print(f"⚠️  Warm-up failed: {e}")
+        finally:
+            health.warming = False
+    
+    threading.Thread(target=run, name='warm-up', daemon=True).start()
+
+def warm_worker():
+    """Process-pool initializer: warm every worker before it takes jobs"""
+    warm_up()
+
+# Front-end stylesheet, served from /assets/ under a content-hashed name
+STYLESHEET = '''
         * {
             margin: 0;
             padding: 0;
@@ -739,142 +3347,10 @@ HTML = '''
                 padding: 15px;
             }
         }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <header>
-            <div class="logo">🎤</div>
-            <h1>Speech Emotion Recognition</h1>
-            <p class="subtitle">Advanced AI-powered emotion detection from speech audio</p>
-            <p class="subtitle">Upload or record audio to analyze emotional content</p>
-        </header>
-        
-        <div class="demo-notice">
-            <strong>⚠️ IMPORTANT:</strong> This is a demo application. For production use, 
-            integrate with trained machine learning models using datasets like RAVDESS, TESS, or EMO-DB.
-            Currently using advanced heuristic analysis with audio feature simulation.
-        </div>
-        
-        <div class="upload-section" id="uploadArea">
-            <div class="upload-icon">📁</div>
-            <div class="upload-text">Drag & Drop Audio File Here</div>
-            <div class="upload-text">or Click to Browse</div>
-            <p class="upload-info">Supported formats: WAV, MP3, M4A, WEBM, OGG</p>
-            <p class="upload-info">Maximum file size: 10MB</p>
-            <p class="upload-info">For best results: Clear speech, 3-5 seconds duration</p>
-            <input type="file" id="fileInput" accept="audio/*" style="display: none;">
-        </div>
-        
-        <div class="controls">
-            <button class="btn record-btn" id="recordBtn">
-                <span class="record-icon">🎤</span>
-                <span class="record-text">Record Audio (5s)</span>
-            </button>
-            <button class="btn analyze-btn" id="analyzeBtn" disabled>
-                <span class="analyze-icon">🔍</span>
-                <span class="analyze-text">Analyze Emotion</span>
-            </button>
-        </div>
-        
-        <audio class="audio-player" id="audioPreview" controls></audio>
-        
-        <div class="file-info" id="fileName">
-            No audio file selected. Please upload or record audio.
-        </div>
-        
-        <div class="loading" id="loading">
-            <div class="spinner"></div>
-            <p class="loading-text">Processing Audio... Analyzing Features...</p>
-            <p class="loading-text">Extracting MFCC, Pitch, Energy, and Spectral Characteristics</p>
-        </div>
-        
-        <div class="result-section" id="resultSection">
-            <div class="result-card">
-                <h2 class="result-title">🎯 Emotion Analysis Result</h2>
-                <div class="emotion-display" id="emotionResult"></div>
-                <div class="confidence-meter" id="confidenceResult"></div>
-                <p style="color: #666; margin-top: 25px; font-size: 1.1rem;">
-                    Analysis based on audio waveform characteristics and spectral features
-                </p>
-            </div>
-            
-            <div class="visualization">
-                <h3 class="visualization-title">📊 Audio Analysis Visualization</h3>
-                <img id="visualizationImg" alt="Audio Waveform and Spectrogram Analysis">
-            </div>
-        </div>
-        
-        <div class="emotions-panel">
-            <h3 class="emotions-title">🎭 Detectable Emotions</h3>
-            <div class="emotions-grid">
-                <div class="emotion-item" style="border-color: #4CAF50;">
-                    <div class="emotion-emoji">😊</div>
-                    <div class="emotion-name">Happy</div>
-                    <div class="emotion-desc">High pitch, fast tempo, clear articulation</div>
-                </div>
-                <div class="emotion-item" style="border-color: #F44336;">
-                    <div class="emotion-emoji">😠</div>
-                    <div class="emotion-name">Angry</div>
-                    <div class="emotion-desc">Loud, high energy, sharp tone</div>
-                </div>
-                <div class="emotion-item" style="border-color: #2196F3;">
-                    <div class="emotion-emoji">😢</div>
-                    <div class="emotion-name">Sad</div>
-                    <div class="emotion-desc">Low pitch, slow tempo, soft tone</div>
-                </div>
-                <div class="emotion-item" style="border-color: #9E9E9E;">
-                    <div class="emotion-emoji">😐</div>
-                    <div class="emotion-name">Neutral</div>
-                    <div class="emotion-desc">Flat tone, medium pace, calm delivery</div>
-                </div>
-                <div class="emotion-item" style="border-color: #E91E63;">
-                    <div class="emotion-emoji">😲</div>
-                    <div class="emotion-name">Surprised</div>
-                    <div class="emotion-desc">Sudden pitch changes, abrupt stops</div>
-                </div>
-                <div class="emotion-item" style="border-color: #FF9800;">
-                    <div class="emotion-emoji">😨</div>
-                    <div class="emotion-name">Fearful</div>
-                    <div class="emotion-desc">Trembling voice, high pitch, fast speech</div>
-                </div>
-            </div>
-        </div>
-        
-        <div class="tech-info">
-            <h3 class="tech-title">⚙️ Technology & Features</h3>
-            <div class="features-list">
-                <div class="feature">
-                    <div class="feature-icon">🎵</div>
-                    <div class="feature-title">Audio Processing</div>
-                    <div class="feature-desc">Advanced waveform analysis with spectral feature extraction</div>
-                </div>
-                <div class="feature">
-                    <div class="feature-icon">🧠</div>
-                    <div class="feature-title">Feature Analysis</div>
-                    <div class="feature-desc">MFCC, Pitch, Energy, Zero-crossing rate, Spectral analysis</div>
-                </div>
-                <div class="feature">
-                    <div class="feature-icon">📈</div>
-                    <div class="feature-title">Real-time Visualization</div>
-                    <div class="feature-desc">Waveform and spectrogram visualization for detailed analysis</div>
-                </div>
-                <div class="feature">
-                    <div class="feature-icon">🎯</div>
-                    <div class="feature-title">Emotion Detection</div>
-                    <div class="feature-desc">Six emotional states with confidence scoring</div>
-                </div>
-            </div>
-        </div>
-        
-        <footer>
-            <p>Speech Emotion Recognition System | Demo Version 2.0</p>
-            <p>For research and educational purposes</p>
-            <p>© 2024 Emotion Recognition AI</p>
-        </footer>
-    </div>
+'''
 
-    <script>
+# Front-end script, served from /assets/ under a content-hashed name
+SCRIPT = '''
         // DOM Elements
         const uploadArea = document.getElementById('uploadArea');
         const fileInput = document.getElementById('fileInput');
@@ -893,6 +3369,13 @@ HTML = '''
         let mediaRecorder = null;
         let audioChunks = [];
         let isRecording = false;
+        let liveSocket = null;
+        let liveCapture = null;
+        let pendingChunks = [];
+        
+        // Uploads are resampled to 16 kHz mono 16-bit PCM, about 32 KB per second
+        const PCM_RATE = 16000;
+        const MAX_UPLOAD_BYTES = 10 * 1024 * 1024;
         
         // Emotion color mapping
         const emotionColors = {
@@ -983,13 +3466,14 @@ HTML = '''
                     audio: {
                         echoCancellation: true,
                         noiseSuppression: true,
-                        sampleRate: 44100
+                        channelCount: 1
                     }
                 });
                 
-                // Initialize MediaRecorder
-                mediaRecorder = new MediaRecorder(stream);
+                // Initialize MediaRecorder; speech needs far less than the default bitrate
+                mediaRecorder = new MediaRecorder(stream, { audioBitsPerSecond: 32000 });
                 audioChunks = [];
+                openLiveStream(stream);
                 
                 // Handle data available
                 mediaRecorder.ondataavailable = (event) => {
@@ -1015,9 +3499,13 @@ HTML = '''
                     
                     // Stop all tracks
                     stream.getTracks().forEach(track => track.stop());
+                    
+                    // Ask the live stream for its final result
+                    closeLiveCapture();
+                    sendLive(JSON.stringify({ type: 'end' }));
                 };
                 
-                // Start recording
+                // Start recording; the live stream gets raw samples, not the compressed recording
                 mediaRecorder.start();
                 isRecording = true;
                 
@@ -1039,6 +3527,68 @@ HTML = '''
             }
         }
         
+        // Stream the microphone as 16-bit PCM for rolling updates (needs the ASGI server)
+        function openLiveStream(stream) {
+            pendingChunks = [];
+            const AudioContextClass = window.AudioContext || window.webkitAudioContext;
+            if (!AudioContextClass) return;
+            const scheme = location.protocol === 'https:' ? 'wss' : 'ws';
+            const context = new AudioContextClass();
+            // One window per second of audio
+            const windowKb = Math.round(context.sampleRate * 2 / 1024);
+            try {
+                liveSocket = new WebSocket(`${scheme}://${location.host}/analyze/stream` +
+                    `?rate=${context.sampleRate}&channels=1&window_kb=${windowKb}`);
+            } catch (error) {
+                liveSocket = null;
+                context.close();
+                return;
+            }
+            
+            const source = context.createMediaStreamSource(stream);
+            const processor = context.createScriptProcessor(4096, 1, 1);
+            processor.onaudioprocess = (event) => sendLive(toPCM16(event.inputBuffer.getChannelData(0)));
+            source.connect(processor);
+            processor.connect(context.destination);
+            liveCapture = { context, source, processor };
+            
+            liveSocket.onopen = () => {
+                pendingChunks.forEach(data => liveSocket.send(data));
+                pendingChunks = [];
+            };
+            
+            liveSocket.onmessage = (event) => {
+                const update = JSON.parse(event.data);
+                if (update.type === 'update') {
+                    const percent = (update.confidence * 100).toFixed(0);
+                    fileName.textContent = `🎤 Live: ${update.emotion} (${percent}%) · window ${update.window + 1}`;
+                } else if (update.type === 'final' && update.success) {
+                    displayResults(update);
+                }
+            };
+            
+            // Without a live stream the recording is analyzed with the Analyze button
+            liveSocket.onerror = () => { liveSocket = null; };
+        }
+        
+        function closeLiveCapture() {
+            if (!liveCapture) return;
+            liveCapture.processor.onaudioprocess = null;
+            liveCapture.source.disconnect();
+            liveCapture.processor.disconnect();
+            liveCapture.context.close();
+            liveCapture = null;
+        }
+        
+        function sendLive(data) {
+            if (!liveSocket) return;
+            if (liveSocket.readyState === WebSocket.CONNECTING) {
+                pendingChunks.push(data);
+            } else if (liveSocket.readyState === WebSocket.OPEN) {
+                liveSocket.send(data);
+            }
+        }
+        
         // Stop recording
         function stopRecording() {
             if (mediaRecorder && mediaRecorder.state === 'recording') {
@@ -1063,15 +3613,24 @@ HTML = '''
             resultSection.style.display = 'none';
             analyzeBtn.disabled = true;
             
-            // Prepare form data
-            const formData = new FormData();
-            formData.append('audio', audioBlob, 'audio_recording.webm');
-            
             try {
+                // Send 16 kHz mono PCM when the browser can decode the clip, otherwise the file as-is
+                const pcm = await encodePCM16(audioBlob).catch(() => null);
+                const headers = {};
+                let body;
+                if (pcm && pcm.byteLength <= MAX_UPLOAD_BYTES) {
+                    body = pcm;
+                    headers['Content-Type'] = `audio/L16; rate=${PCM_RATE}; channels=1`;
+                } else {
+                    body = new FormData();
+                    body.append('audio', audioBlob, 'audio_recording.webm');
+                }
+                
                 // Send request to server
                 const response = await fetch('/analyze', {
                     method: 'POST',
-                    body: formData
+                    headers: headers,
+                    body: body
                 });
                 
                 // Parse response
@@ -1093,6 +3652,41 @@ HTML = '''
             }
         }
         
+        // Decode any format the browser can play and resample it to 16 kHz mono audio/L16
+        async function encodePCM16(blob) {
+            const AudioContextClass = window.AudioContext || window.webkitAudioContext;
+            if (!AudioContextClass || !window.OfflineAudioContext) return null;
+            
+            const context = new AudioContextClass();
+            let decoded;
+            try {
+                decoded = await context.decodeAudioData(await blob.arrayBuffer());
+            } finally {
+                context.close();
+            }
+            
+            const frames = Math.ceil(decoded.duration * PCM_RATE);
+            if (frames === 0) return null;
+            
+            // A one-channel offline graph downmixes and resamples in a single render
+            const offline = new OfflineAudioContext(1, frames, PCM_RATE);
+            const source = offline.createBufferSource();
+            source.buffer = decoded;
+            source.connect(offline.destination);
+            source.start();
+            return toPCM16((await offline.startRendering()).getChannelData(0));
+        }
+        
+        // audio/L16 samples are big-endian (RFC 2586)
+        function toPCM16(samples) {
+            const pcm = new DataView(new ArrayBuffer(samples.length * 2));
+            for (let i = 0; i < samples.length; i++) {
+                const sample = Math.max(-1, Math.min(1, samples[i]));
+                pcm.setInt16(i * 2, sample < 0 ? sample * 0x8000 : sample * 0x7FFF, false);
+            }
+            return pcm.buffer;
+        }
+        
         // Display analysis results
         function displayResults(result) {
             // Set emotion
@@ -1110,9 +3704,10 @@ HTML = '''
             confidenceResult.style.color = emotionColor;
             confidenceResult.style.border = `2px solid ${emotionColor}30`;
             
-            // Set visualization
-            if (result.visualization) {
-                visualizationImg.src = `data:image/png;base64,${result.visualization}`;
+            // Load the visualization separately so the result shows immediately
+            if (result.visualization_url) {
+                visualizationImg.onerror = () => { visualizationImg.style.display = 'none'; };
+                visualizationImg.src = result.visualization_url;
                 visualizationImg.style.display = 'block';
             } else {
                 visualizationImg.style.display = 'none';
@@ -1141,103 +3736,1113 @@ HTML = '''
             }, 3000);
         }
         
-        // Format file size
-        function formatFileSize(bytes) {
-            if (bytes === 0) return '0 Bytes';
-            
-            const k = 1024;
-            const sizes = ['Bytes', 'KB', 'MB', 'GB'];
-            const i = Math.floor(Math.log(bytes) / Math.log(k));
+        // Format file size
+        function formatFileSize(bytes) {
+            if (bytes === 0) return '0 Bytes';
+            
+            const k = 1024;
+            const sizes = ['Bytes', 'KB', 'MB', 'GB'];
+            const i = Math.floor(Math.log(bytes) / Math.log(k));
+            
+            return parseFloat((bytes / Math.pow(k, i)).toFixed(2)) + ' ' + sizes[i];
+        }
+        
+        // Initialize emotion items with click events
+        document.querySelectorAll('.emotion-item').forEach(item => {
+            item.addEventListener('click', function() {
+                const emotion = this.querySelector('.emotion-name').textContent;
+                const emoji = this.querySelector('.emotion-emoji').textContent;
+                
+                // Show info about the emotion
+                fileName.textContent = `💡 ${emotion}: ${this.querySelector('.emotion-desc').textContent}`;
+                fileName.style.color = '#6a11cb';
+                
+                // Reset after 2 seconds
+                setTimeout(() => {
+                    if (!audioBlob) {
+                        fileName.textContent = 'No audio file selected. Please upload or record audio.';
+                        fileName.style.color = '#555';
+                    }
+                }, 2000);
+            });
+        });
+        
+        // Initialize with welcome message
+        console.log('🎤 Speech Emotion Recognition App Loaded');
+'''
+
+# HTML shell; build_frontend fills in the hashed asset URLs
+HTML = '''
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Speech Emotion Recognition</title>
+    <link rel="stylesheet" href="__STYLESHEET_URL__">
+</head>
+<body>
+    <div class="container">
+        <header>
+            <div class="logo">🎤</div>
+            <h1>Speech Emotion Recognition</h1>
+            <p class="subtitle">Advanced AI-powered emotion detection from speech audio</p>
+            <p class="subtitle">Upload or record audio to analyze emotional content</p>
+        </header>
+        
+        <div class="demo-notice">
+            <strong>⚠️ IMPORTANT:</strong> This is a demo application. For production use, 
+            train a model on datasets like RAVDESS, TESS, or EMO-DB with train_model.py and
+            point EMOTION_MODEL at it.
+            Currently using advanced heuristic analysis with audio feature simulation.
+        </div>
+        
+        <div class="upload-section" id="uploadArea">
+            <div class="upload-icon">📁</div>
+            <div class="upload-text">Drag & Drop Audio File Here</div>
+            <div class="upload-text">or Click to Browse</div>
+            <p class="upload-info">Supported formats: WAV, MP3, M4A, WEBM, OGG</p>
+            <p class="upload-info">Maximum file size: 10MB</p>
+            <p class="upload-info">For best results: Clear speech, 3-5 seconds duration</p>
+            <input type="file" id="fileInput" accept="audio/*" style="display: none;">
+        </div>
+        
+        <div class="controls">
+            <button class="btn record-btn" id="recordBtn">
+                <span class="record-icon">🎤</span>
+                <span class="record-text">Record Audio (5s)</span>
+            </button>
+            <button class="btn analyze-btn" id="analyzeBtn" disabled>
+                <span class="analyze-icon">🔍</span>
+                <span class="analyze-text">Analyze Emotion</span>
+            </button>
+        </div>
+        
+        <audio class="audio-player" id="audioPreview" controls></audio>
+        
+        <div class="file-info" id="fileName">
+            No audio file selected. Please upload or record audio.
+        </div>
+        
+        <div class="loading" id="loading">
+            <div class="spinner"></div>
+            <p class="loading-text">Processing Audio... Analyzing Features...</p>
+            <p class="loading-text">Extracting MFCC, Pitch, Energy, and Spectral Characteristics</p>
+        </div>
+        
+        <div class="result-section" id="resultSection">
+            <div class="result-card">
+                <h2 class="result-title">🎯 Emotion Analysis Result</h2>
+                <div class="emotion-display" id="emotionResult"></div>
+                <div class="confidence-meter" id="confidenceResult"></div>
+                <p style="color: #666; margin-top: 25px; font-size: 1.1rem;">
+                    Analysis based on audio waveform characteristics and spectral features
+                </p>
+            </div>
             
-            return parseFloat((bytes / Math.pow(k, i)).toFixed(2)) + ' ' + sizes[i];
-        }
+            <div class="visualization">
+                <h3 class="visualization-title">📊 Audio Analysis Visualization</h3>
+                <img id="visualizationImg" alt="Audio Waveform and Spectrogram Analysis">
+            </div>
+        </div>
         
-        // Initialize emotion items with click events
-        document.querySelectorAll('.emotion-item').forEach(item => {
-            item.addEventListener('click', function() {
-                const emotion = this.querySelector('.emotion-name').textContent;
-                const emoji = this.querySelector('.emotion-emoji').textContent;
-                
-                // Show info about the emotion
-                fileName.textContent = `💡 ${emotion}: ${this.querySelector('.emotion-desc').textContent}`;
-                fileName.style.color = '#6a11cb';
-                
-                // Reset after 2 seconds
-                setTimeout(() => {
-                    if (!audioBlob) {
-                        fileName.textContent = 'No audio file selected. Please upload or record audio.';
-                        fileName.style.color = '#555';
-                    }
-                }, 2000);
-            });
-        });
+        <div class="emotions-panel">
+            <h3 class="emotions-title">🎭 Detectable Emotions</h3>
+            <div class="emotions-grid">
+                <div class="emotion-item" style="border-color: #4CAF50;">
+                    <div class="emotion-emoji">😊</div>
+                    <div class="emotion-name">Happy</div>
+                    <div class="emotion-desc">High pitch, fast tempo, clear articulation</div>
+                </div>
+                <div class="emotion-item" style="border-color: #F44336;">
+                    <div class="emotion-emoji">😠</div>
+                    <div class="emotion-name">Angry</div>
+                    <div class="emotion-desc">Loud, high energy, sharp tone</div>
+                </div>
+                <div class="emotion-item" style="border-color: #2196F3;">
+                    <div class="emotion-emoji">😢</div>
+                    <div class="emotion-name">Sad</div>
+                    <div class="emotion-desc">Low pitch, slow tempo, soft tone</div>
+                </div>
+                <div class="emotion-item" style="border-color: #9E9E9E;">
+                    <div class="emotion-emoji">😐</div>
+                    <div class="emotion-name">Neutral</div>
+                    <div class="emotion-desc">Flat tone, medium pace, calm delivery</div>
+                </div>
+                <div class="emotion-item" style="border-color: #E91E63;">
+                    <div class="emotion-emoji">😲</div>
+                    <div class="emotion-name">Surprised</div>
+                    <div class="emotion-desc">Sudden pitch changes, abrupt stops</div>
+                </div>
+                <div class="emotion-item" style="border-color: #FF9800;">
+                    <div class="emotion-emoji">😨</div>
+                    <div class="emotion-name">Fearful</div>
+                    <div class="emotion-desc">Trembling voice, high pitch, fast speech</div>
+                </div>
+            </div>
+        </div>
         
-        // Initialize with welcome message
-        console.log('🎤 Speech Emotion Recognition App Loaded');
-    </script>
+        <div class="tech-info">
+            <h3 class="tech-title">⚙️ Technology & Features</h3>
+            <div class="features-list">
+                <div class="feature">
+                    <div class="feature-icon">🎵</div>
+                    <div class="feature-title">Audio Processing</div>
+                    <div class="feature-desc">Advanced waveform analysis with spectral feature extraction</div>
+                </div>
+                <div class="feature">
+                    <div class="feature-icon">🧠</div>
+                    <div class="feature-title">Feature Analysis</div>
+                    <div class="feature-desc">MFCC, Pitch, Energy, Zero-crossing rate, Spectral analysis</div>
+                </div>
+                <div class="feature">
+                    <div class="feature-icon">📈</div>
+                    <div class="feature-title">Real-time Visualization</div>
+                    <div class="feature-desc">Waveform and spectrogram visualization for detailed analysis</div>
+                </div>
+                <div class="feature">
+                    <div class="feature-icon">🎯</div>
+                    <div class="feature-title">Emotion Detection</div>
+                    <div class="feature-desc">Six emotional states with confidence scoring</div>
+                </div>
+            </div>
+        </div>
+        
+        <footer>
+            <p>Speech Emotion Recognition System | Demo Version 2.0</p>
+            <p>For research and educational purposes</p>
+            <p>© 2024 Emotion Recognition AI</p>
+        </footer>
+    </div>
+
+    <script src="__SCRIPT_URL__"></script>
 </body>
 </html>
 '''
 
+class StaticAsset:
+    """Front-end file held in memory with its compressed variants, built once at startup.
+    
+    The ETag is a hash of the content, so a changed page or asset gets new
+    validators (and, for assets, a new file name) without manual versioning.
+    Brotli variants need the optional brotli package; gzip is always built.
+    """
+    
+    def __init__(self, body, mimetype):
+        body = body.encode('utf-8')
+        self.digest = hashlib.blake2b(body, digest_size=8).hexdigest()
+        self.mimetype = mimetype
+        self.encodings = {'identity': body}
+        
+        compressed = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        try:
+            import brotli
+            compressed['br'] = brotli.compress(body, quality=11)
+        except ImportError:
+            pass
+        for encoding, data in compressed.items():
+            if len(data) < len(body):
+                self.encodings[encoding] = data
+    
+    @staticmethod
+    def identity_accepted(accept_encodings):
+        """Uncompressed bodies are acceptable unless refused by identity;q=0, or by *;q=0 without identity"""
+        qualities = dict(accept_encodings)
+        for encoding in ('identity', '*'):
+            if encoding in qualities:
+                return qualities[encoding] > 0
+        return True
+    
+    def negotiate(self, accept_encodings):
+        """Smallest variant the client accepts, or None if it accepts none of them"""
+        accepted = [encoding for encoding in self.encodings
+                    if (self.identity_accepted(accept_encodings) if encoding == 'identity'
+                        else accept_encodings[encoding])]
+        if not accepted:
+            return None
+        return min(accepted, key=lambda encoding: len(self.encodings[encoding]))
+    
+    def response(self, immutable=False):
+        """Serve the variant for the current request, or 304 when the client's copy is current"""
+        encoding = self.negotiate(request.accept_encodings)
+        if encoding is None:
+            response = Response('None of the accepted content codings is available\n', status=406,
+                                mimetype='text/plain')
+            response.vary.add('Accept-Encoding')
+            return response
+        # Each encoding is a different representation, so each gets its own strong ETag
+        etag = self.digest if encoding == 'identity' else f'{self.digest}-{encoding}'
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = Response(self.encodings[encoding], mimetype=self.mimetype)
+            if encoding != 'identity':
+                response.content_encoding = encoding
+        
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        if immutable:
+            # Hashed names never change content; browsers need not even revalidate
+            response.cache_control.public = True
+            response.cache_control.max_age = 365 * 24 * 3600
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
+
+def build_frontend():
+    """Hash and compress the stylesheet and script, then the page that links them by hashed name"""
+    assets = {}
+    page = HTML
+    for placeholder, stem, extension, body, mimetype in (
+            ('__STYLESHEET_URL__', 'app', 'css', STYLESHEET, 'text/css'),
+            ('__SCRIPT_URL__', 'app', 'js', SCRIPT, 'text/javascript')):
+        asset = StaticAsset(body, mimetype)
+        name = f'{stem}.{asset.digest}.{extension}'
+        assets[name] = asset
+        page = page.replace(placeholder, f'/assets/{name}')
+    return StaticAsset(page, 'text/html'), assets
+
+FRONTEND_PAGE, FRONTEND_ASSETS = build_frontend()
+
+def image_response(image, mimetype):
+    """Response whose body is a rendered image (bytes or a memoryview), written out without a copy"""
+    response = Response([image], mimetype=mimetype)
+    response.content_length = len(image)
+    return response
+
+def png_result_response(result, png):
+    """PNG body with the analysis result carried in response headers"""
+    response = image_response(png, 'image/png')
+    # Header values must be latin-1, so the emoji label is percent-encoded
+    response.headers['X-Emotion'] = quote(result['emotion'])
+    response.headers['X-Confidence'] = repr(result['confidence'])
+    response.headers['X-Visualization-Id'] = result['visualization_id']
+    response.set_etag(result['visualization_id'])
+    return response
+
+def multipart_result_response(result, png):
+    """multipart/mixed body with a JSON part followed by the raw PNG part"""
+    boundary = f"emotion-{result['visualization_id'][:32]}"
+    
+    def generate():
+        yield (f'--{boundary}\r\nContent-Type: application/json\r\n\r\n').encode('ascii')
+        yield json.dumps(result).encode('utf-8')
+        yield (f'\r\n--{boundary}\r\nContent-Type: image/png\r\n'
+               f'Content-Length: {len(png)}\r\n\r\n').encode('ascii')
+        # The cached image is written out directly, never copied
+        yield png
+        yield f'\r\n--{boundary}--\r\n'.encode('ascii')
+    
+    return Response(generate(), mimetype=f'multipart/mixed; boundary={boundary}')
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.timings = {}
+    metrics.add('emotion_requests_in_flight', 1)
+
+@app.after_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.request_start
+    endpoint = request.endpoint or 'unmatched'
+    metrics.inc('emotion_requests_total', endpoint=endpoint, status=response.status_code)
+    metrics.observe('emotion_request_duration_seconds', elapsed, endpoint=endpoint)
+    
+    # Per-stage breakdown for browser devtools and tracing proxies
+    if g.timings:
+        stages = [f'{stage};dur={seconds * 1000:.3f}' for stage, seconds in g.timings.items()]
+        stages.append(f'total;dur={elapsed * 1000:.3f}')
+        response.headers['Server-Timing'] = ', '.join(stages)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    metrics.add('emotion_requests_in_flight', -1)
+
+@app.errorhandler(AnalysisBusy)
+def analysis_busy(error):
+    """Shed load with 429 when the analysis queue is full"""
+    metrics.inc('emotion_errors_total', stage=request.endpoint, reason='busy')
+    response = jsonify({'success': False, 'error': 'Server busy, please retry shortly'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
 @app.route('/')
 def home():
     """Home page - serves the HTML interface"""
-    return HTML
+    # Revalidated on every visit, so a deploy is picked up at once
+    return FRONTEND_PAGE.response()
+
+@app.route('/assets/<name>')
+def asset(name):
+    """Content-hashed stylesheet and script"""
+    static = FRONTEND_ASSETS.get(name)
+    if static is None:
+        return jsonify({'success': False, 'error': 'Unknown asset'}), 404
+    return static.response(immutable=True)
+
+def analysis_error(message, reason):
+    """JSON failure response that is also counted in the metrics"""
+    metrics.inc('emotion_errors_total', stage=request.endpoint, reason=reason)
+    return jsonify({'success': False, 'error': message})
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
     """Analyze audio file endpoint"""
     try:
-        if 'audio' not in request.files:
-            return jsonify({'success': False, 'error': 'No audio file provided'})
-        
-        audio_file = request.files['audio']
+        if request.mimetype == PCM_MIMETYPE:
+            # Raw samples in a declared format: no multipart parsing, no container sniffing
+            pcm_format = parse_pcm_format(request.mimetype_params)
+            if pcm_format is None:
+                return analysis_error('audio/L16 uploads need a rate (and optional channels) parameter', 'bad_format')
+            
+            start = time.perf_counter()
+            body = request.get_data(cache=False)
+            g.timings['upload'] = time.perf_counter() - start
+            metrics.observe('emotion_stage_duration_seconds', g.timings['upload'], stage='upload')
+            
+            if not body:
+                return analysis_error('No audio provided', 'missing_file')
+            
+            emotion, confidence, visualization_id = analyzer.classify_audio(
+                body, g.timings, pcm_content_hash(body, pcm_format), pcm_format)
+        else:
+            # Accessing request.files parses (and possibly spills) the upload
+            start = time.perf_counter()
+            has_audio = 'audio' in request.files
+            g.timings['upload'] = time.perf_counter() - start
+            metrics.observe('emotion_stage_duration_seconds', g.timings['upload'], stage='upload')
+            
+            if not has_audio:
+                return analysis_error('No audio file provided', 'missing_file')
+            
+            audio_file = request.files['audio']
+            
+            if audio_file.filename == '':
+                return analysis_error('No file selected', 'missing_file')
+            
+            # The upload is analyzed where the form parser left it (memory or spill file)
+            emotion, confidence, visualization_id = analyzer.classify_audio(audio_file.stream, g.timings)
         
-        if audio_file.filename == '':
-            return jsonify({'success': False, 'error': 'No file selected'})
+        if emotion is None:
+            return analysis_error('Could not analyze audio file', 'analysis_failed')
         
-      
-        import tempfile
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.webm')
-        temp_path = temp_file.name
-        audio_file.save(temp_path)
-        temp_file.close()
+        result = {
+            'success': True,
+            'emotion': emotion,
+            'confidence': float(confidence),
+            'visualization_id': visualization_id,
+            'visualization_url': url_for('visualization', visualization_id=visualization_id),
+            'thumbnail_url': url_for('visualization', visualization_id=visualization_id, profile='thumbnail')
+        }
         
+        # Binary clients get the PNG bytes as-is, without base64 or JSON escaping
+        best = request.accept_mimetypes.best_match(['application/json', 'image/png', 'multipart/mixed'])
+        if best in ('image/png', 'multipart/mixed'):
+            png = analyzer.get_visualization_png(visualization_id, g.timings)
+            if png is None:
+                return analysis_error('Could not render visualization', 'render_failed')
+            if best == 'image/png':
+                return png_result_response(result, png)
+            return multipart_result_response(result, png)
         
-        emotion, confidence, visualization = analyzer.analyze_audio_file(temp_path)
+        # Older clients can still ask for the image inline
+        if request.args.get('inline') == '1':
+            result['visualization'] = analyzer.get_visualization(visualization_id, g.timings)
         
+        return jsonify(result)
         
-        try:
-            os.unlink(temp_path)
-        except:
-            pass
+    except AnalysisBusy:
+        raise
+    except Exception as e:
+        print(f"Server error in /analyze: {e}")
+        metrics.inc('emotion_errors_total', stage='analyze', reason=type(e).__name__)
+        return jsonify({
+            'success': False,
+            'error': 'Server error occurred while processing audio'
+        })
+
+def read_archive_clips(stream, max_clips=None, max_bytes=None):
+    """Extract (name, bytes) clips from an uploaded zip or tar archive.
+    
+    The member count and declared sizes are checked against max_clips and
+    max_bytes before anything is decompressed: up front for a zip, whose
+    central directory lists every member, and header by header for a tar,
+    which is walked one member at a time. Members are read with a bounded
+    read in case a header understates its size. Raises ValueError when a
+    limit is exceeded.
+    """
+    max_clips = max(BATCH_MAX_CLIPS if max_clips is None else max_clips, 0)
+    max_bytes = BATCH_MAX_ARCHIVE_BYTES if max_bytes is None else max_bytes
+    
+    def check(count, declared):
+        if count > max_clips:
+            raise ValueError(f'At most {max_clips} clips per batch')
+        if declared > max_bytes:
+            raise ValueError(f'Archive expands to more than {max_bytes // (1024 * 1024)} MB')
+    
+    stream.seek(0)
+    if zipfile.is_zipfile(stream):
+        stream.seek(0)
+        archive = zipfile.ZipFile(stream)
+        members = [(info, info.filename, info.file_size) for info in archive.infolist() if not info.is_dir()]
+        open_member = archive.open
+    else:
+        stream.seek(0)
+        archive = tarfile.open(fileobj=stream, mode='r:*')
+        # Not getmembers(), which would read every header before the first check
+        members = ((member, member.name, member.size) for member in iter(archive.next, None) if member.isfile())
+        open_member = archive.extractfile
+    
+    with archive:
+        if isinstance(members, list):
+            check(len(members), sum(size for _, _, size in members))
+        clips = []
+        declared = 0
+        remaining = max_bytes
+        for member, name, size in members:
+            declared += size
+            check(len(clips) + 1, declared)
+            with open_member(member) as f:
+                data = f.read(remaining + 1)
+            if len(data) > remaining:
+                raise ValueError(f'Archive expands to more than {max_bytes // (1024 * 1024)} MB')
+            remaining -= len(data)
+            clips.append((name, data))
+    return clips
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Analyze many audio clips (multipart 'audio' files or an 'archive') in one request"""
+    try:
+        start = time.perf_counter()
+        visualize = request.args.get('visualize', '1') != '0'
+        workers = request.args.get('workers', 1, type=int)
         
-        if emotion is None:
-            return jsonify({'success': False, 'error': 'Could not analyze audio file'})
+        with ExitStack() as stack:
+            clips = []
+            for audio_file in request.files.getlist('audio'):
+                buffer = stack.enter_context(open_audio_buffer(audio_file.stream))
+                clips.append((audio_file.filename, buffer))
+            if 'archive' in request.files:
+                try:
+                    clips.extend(read_archive_clips(request.files['archive'].stream,
+                                                    max_clips=BATCH_MAX_CLIPS - len(clips)))
+                except (zipfile.BadZipFile, tarfile.TarError):
+                    return jsonify({'success': False, 'error': 'Archive must be a zip or tar file'})
+                except ValueError as e:
+                    return jsonify({'success': False, 'error': str(e)})
+            
+            if not clips:
+                return jsonify({'success': False, 'error': 'No audio files provided'})
+            if len(clips) > BATCH_MAX_CLIPS:
+                return jsonify({'success': False, 'error': f'At most {BATCH_MAX_CLIPS} clips per batch'})
+            read_time = time.perf_counter() - start
+            
+            rows, timings = analyzer.analyze_batch(clips, visualize=visualize, workers=workers)
+            metrics.inc('emotion_bytes_processed_total', sum(len(buffer) for _, buffer in clips))
         
+        timings['read'] = read_time
+        timings['total'] = time.perf_counter() - start
+        for stage, seconds in timings.items():
+            metrics.observe('emotion_stage_duration_seconds', seconds, stage=f'batch_{stage}')
         return jsonify({
             'success': True,
-            'emotion': emotion,
-            'confidence': float(confidence),
-            'visualization': visualization
+            'count': len(rows),
+            'fields': ['name', 'emotion', 'confidence', 'visualization_id'],
+            'results': [list(row) for row in rows],
+            'timings_ms': {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
         })
-        
+    
     except Exception as e:
-        print(f"Server error in /analyze: {e}")
+        print(f"Server error in /analyze/batch: {e}")
+        metrics.inc('emotion_errors_total', stage='analyze_batch', reason=type(e).__name__)
         return jsonify({
             'success': False,
-            'error': 'Server error occurred while processing audio'
+            'error': 'Server error occurred while processing audio batch'
         })
 
+@app.route('/analyze/stream', methods=['POST'])
+def analyze_stream():
+    """Rolling analysis of a (chunked) upload, answered as newline-delimited JSON updates"""
+    # The body is consumed window by window, so long calls are not capped by MAX_CONTENT_LENGTH
+    request.max_content_length = STREAM_MAX_BYTES
+    pcm_format = None
+    if request.mimetype == PCM_MIMETYPE:
+        pcm_format = parse_pcm_format(request.mimetype_params)
+        if pcm_format is None:
+            return analysis_error('audio/L16 uploads need a rate (and optional channels) parameter', 'bad_format')
+    session = StreamSession(analyzer, stream_window_bytes(request.args.get('window_kb')), pcm_format)
+    metrics.inc('emotion_stream_sessions_total', transport='http')
+    stream = request.stream
+    
+    def generate():
+        while True:
+            chunk = stream.read(session.window_bytes)
+            if not chunk:
+                break
+            for update in session.feed(chunk):
+                yield json.dumps(update) + '\n'
+        for update in session.finish():
+            if update.get('visualization_id'):
+                update['visualization_url'] = url_for('visualization', visualization_id=update['visualization_id'])
+            yield json.dumps(update) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/analyze/long', methods=['POST'])
+def analyze_long():
+    """Emotion timeline of a long recording, analyzed in overlapping windows with constant memory.
+    
+    Accepts a raw WAV or audio/L16 body, read straight off the socket, or a
+    multipart 'audio' upload. Answers JSON with the timeline and aggregate,
+    or newline-delimited JSON segments as they are classified when the
+    client accepts application/x-ndjson.
+    """
+    request.max_content_length = LONG_MAX_BYTES
+    window, overlap = timeline_windows(request.args)
+    
+    if request.mimetype == PCM_MIMETYPE:
+        pcm_format = parse_pcm_format(request.mimetype_params)
+        if pcm_format is None:
+            return analysis_error('audio/L16 uploads need a rate (and optional channels) parameter', 'bad_format')
+        blocks = audio_stream_blocks(request.stream, pcm_format)
+    elif request.mimetype.startswith('multipart/'):
+        if 'audio' not in request.files:
+            return analysis_error('No audio file provided', 'missing_file')
+        # Large uploads were spilled to disk by the form parser and are read back in blocks
+        upload = request.files['audio'].stream
+        upload.seek(0)
+        blocks = audio_stream_blocks(upload)
+    else:
+        blocks = audio_stream_blocks(request.stream)
+    
+    timeline = TimelineAnalysis(analyzer, window, overlap)
+    if request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson':
+        def generate():
+            for segment in timeline.segments(blocks):
+                yield json.dumps(dict(segment, type='segment')) + '\n'
+            yield json.dumps(dict(timeline.summary(), type='summary')) + '\n'
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    segments = list(timeline.segments(blocks))
+    summary = timeline.summary()
+    if not summary['success']:
+        return analysis_error(summary['error'], 'analysis_failed')
+    summary['timeline'] = segments
+    return jsonify(summary)
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue an analysis and answer at once with its job ID; poll GET /jobs/<id> for the result.
+    
+    ?kind=analyze (default), long or batch takes the same inputs and query
+    parameters as /analyze, /analyze/long and /analyze/batch. ?priority=0-9
+    orders the queue, higher first.
+    """
+    kind = request.args.get('kind', 'analyze')
+    if kind not in JOB_RUNNERS:
+        return analysis_error(f'Unknown job kind: {kind}', 'bad_kind'), 400
+    priority = min(max(request.args.get('priority', 5, type=int), 0), 9)
+    params = {}
+    if kind == 'long':
+        request.max_content_length = LONG_MAX_BYTES
+        params['window'], params['overlap'] = timeline_windows(request.args)
+    elif kind == 'batch':
+        params['visualize'] = request.args.get('visualize', '1') != '0'
+        params['workers'] = min(max(request.args.get('workers', 1, type=int), 1), BATCH_MAX_WORKERS)
+    
+    if kind == 'batch':
+        audio_files = request.files.getlist('audio')
+        archive = request.files.get('archive')
+        if not audio_files and archive is None:
+            return analysis_error('No audio files provided', 'missing_file'), 400
+        params['names'] = [audio_file.filename for audio_file in audio_files]
+        params['archive'] = archive is not None
+        
+        def save_inputs(directory):
+            for index, audio_file in enumerate(audio_files):
+                audio_file.save(os.path.join(directory, str(index)))
+            if archive is not None:
+                archive.save(os.path.join(directory, 'archive'))
+    elif request.mimetype.startswith('multipart/'):
+        if 'audio' not in request.files:
+            return analysis_error('No audio file provided', 'missing_file'), 400
+        audio_file = request.files['audio']
+        
+        def save_inputs(directory):
+            audio_file.save(os.path.join(directory, '0'))
+    else:
+        if request.mimetype == PCM_MIMETYPE:
+            pcm_format = parse_pcm_format(request.mimetype_params)
+            if pcm_format is None:
+                return analysis_error('audio/L16 uploads need a rate (and optional channels) parameter',
+                                      'bad_format'), 400
+            params['pcm_format'] = list(pcm_format)
+        
+        def save_inputs(directory):
+            # Raw bodies go to disk as they arrive
+            with open(os.path.join(directory, '0'), 'wb') as f:
+                shutil.copyfileobj(request.stream, f, FEATURE_CHUNK_SIZE)
+    
+    job_queue.start()
+    job_id = job_queue.submit(kind, priority, params, save_inputs)
+    metrics.inc('emotion_jobs_submitted_total', kind=kind)
+    status_url = url_for('job_status', job_id=job_id)
+    response = jsonify({'success': True, 'job_id': job_id, 'status': 'queued', 'status_url': status_url})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Status of a job, with its result once done"""
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    result = job['result']
+    if result:
+        # Visualizations are registered in memory; one finished before a restart is registered
+        # again from its stored spec, or dropped when it cannot be rendered any more
+        render_specs = result.pop('render_specs', {})
+        visualization_id = result.get('visualization_id')
+        if visualization_id:
+            if analyzer.restore_visualization(visualization_id, render_specs.get(visualization_id)):
+                result['visualization_url'] = url_for('visualization', visualization_id=visualization_id)
+            else:
+                result['visualization_id'] = None
+        for row in result.get('results', []):
+            if row[3] and not analyzer.restore_visualization(row[3], render_specs.get(row[3])):
+                row[3] = None
+    response = jsonify(dict(job, success=True))
+    response.headers['Cache-Control'] = 'no-store'
+    if job['status'] in ('queued', 'running'):
+        response.headers['Retry-After'] = str(max(1, int(JOB_POLL_INTERVAL)))
+    return response
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued job at once, or a running one at its next checkpoint"""
+    status = job_queue.cancel(job_id)
+    if status is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    if status in ('done', 'failed'):
+        return jsonify({'success': False, 'error': f'Job already {status}', 'status': status}), 409
+    running = status == 'running'
+    return jsonify({'success': True, 'job_id': job_id, 'status': status, 'cancel_requested': running}), 202 if running else 200
+
+@app.route('/visualization/<visualization_id>', methods=['GET'])
+def visualization(visualization_id):
+    """Render (or serve from cache) the visualization for an analysis"""
+    profile = request.args.get('profile', 'standard')
+    if profile not in RENDER_PROFILES:
+        return jsonify({'success': False, 'error': f'Unknown profile: {profile}',
+                        'profiles': list(RENDER_PROFILES)}), 400
+    
+    # IDs are content fingerprints, so the image behind one never changes
+    etag = visualization_id if profile == 'standard' else f'{visualization_id}-{profile}'
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        image = analyzer.get_visualization_png(visualization_id, profile=profile)
+        if image is None:
+            return jsonify({'success': False, 'error': 'Unknown or expired visualization'}), 404
+        response = image_response(image, RENDER_MIMETYPES[RENDER_PROFILES[profile]['format']])
+    
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = 3600
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    cache = analyzer.render_cache.stats()
+    executor = analyzer.executor.stats()
+    extra = [
+        ('emotion_render_cache_hits', {}, cache['hits']),
+        ('emotion_render_cache_misses', {}, cache['misses']),
+        ('emotion_render_cache_hit_ratio', {}, cache['hit_rate']),
+        ('emotion_render_cache_bytes', {}, cache['bytes']),
+        ('emotion_executor_in_flight', {'kind': executor['kind']}, executor['in_flight']),
+        ('emotion_uptime_seconds', {}, health.uptime())
+    ]
+    extra.extend(('emotion_jobs', {'status': status}, count) for status, count in job_queue.counts().items())
+    if analyzer.result_cache is not None:
+        results = analyzer.result_cache.stats()
+        labels = {'backend': results['backend']}
+        extra += [
+            ('emotion_result_cache_hits', labels, results['hits']),
+            ('emotion_result_cache_misses', labels, results['misses']),
+            ('emotion_result_cache_hit_ratio', labels, results['hit_rate']),
+            ('emotion_result_cache_entries', labels, results['entries']),
+            ('emotion_result_cache_evictions', labels, results['evictions'])
+        ]
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness: the process is up and serving requests"""
+    return jsonify(health.liveness())
+
+@app.route('/health/ready', methods=['GET'])
 @app.route('/health', methods=['GET'])
-def health_check():
-    """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'service': 'Speech Emotion Recognition',
-        'version': '2.0.0',
-        'timestamp': '2024-12-31T10:46:02Z'
-    })
+def readiness_check():
+    """Readiness: 503 while the instance is saturated, out of memory budget or slow"""
+    ready, report = health.readiness()
+    report['render_cache'] = analyzer.render_cache.stats()
+    if analyzer.result_cache is not None:
+        report['result_cache'] = analyzer.result_cache.stats()
+    response = jsonify(report)
+    response.status_code = 200 if ready else 503
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+class ASGIInputStream:
+    """wsgi.input that pulls the request body from the ASGI receive channel as the app reads it.
+    
+    read() runs on a pool thread and waits for the event loop to deliver the
+    next body message, so the app sees each chunk as soon as it arrives.
+    """
+    
+    def __init__(self, receive, loop):
+        self.receive = receive
+        self.loop = loop
+        self.buffer = b''
+        self.more_body = True
+    
+    def read(self, size=-1):
+        """Up to size bytes (everything left if size < 0), waiting only while none are buffered"""
+        while self.more_body and (not self.buffer or size < 0):
+            message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+            if message['type'] == 'http.disconnect':
+                # Nothing can be answered to a client that is gone; end the body
+                self.more_body = False
+                break
+            self.buffer += message.get('body', b'')
+            self.more_body = message.get('more_body', False)
+        if size < 0 or size >= len(self.buffer):
+            data, self.buffer = self.buffer, b''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+    
+    def close(self):
+        self.buffer = b''
+
+class EmotionASGI:
+    """ASGI entry point serving the Flask routes without a thread per connection.
+    
+    Request bodies are received on the event loop (those of STREAMED_ROUTES
+    are handed to the route as they arrive), the route itself (and with it
+    all CPU-bound analysis) runs on a bounded thread pool, and lifespan
+    shutdown stops accepting requests and drains the ones in flight.
+    Serve with e.g. ``uvicorn emotiondetection:asgi_app``.
+    """
+    
+    # Routes that read their body incrementally accept far more than MAX_CONTENT_LENGTH
+    BODY_LIMITS = {'/analyze/stream': STREAM_MAX_BYTES, '/analyze/long': LONG_MAX_BYTES}
+    # Routes whose body is handed to the app while it is still arriving instead of received first
+    STREAMED_ROUTES = {'/analyze/stream'}
+    
+    def __init__(self, wsgi_app, workers, drain_timeout):
+        self.wsgi_app = wsgi_app
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='asgi')
+        self.drain_timeout = drain_timeout
+        self.in_flight = 0
+        self.draining = False
+        self.idle = None
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        elif scope['type'] == 'websocket':
+            await self.websocket(scope, receive, send)
+    
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.idle = asyncio.Event()
+                self.idle.set()
+                # Pre-fork process workers off the event loop
+                await asyncio.get_running_loop().run_in_executor(self.pool, analyzer.executor.start)
+                job_queue.start()
+                if WARMUP:
+                    start_warm_up()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.draining = True
+                try:
+                    await asyncio.wait_for(self.idle.wait(), self.drain_timeout)
+                except asyncio.TimeoutError:
+                    print(f"⚠️  Shutdown with {self.in_flight} analyses still in flight")
+                self.pool.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    
+    def body_limit(self, scope):
+        """Largest body the route accepts; /jobs takes long recordings only for kind=long"""
+        if scope['path'] == '/jobs':
+            kind = parse_qs(scope['query_string'].decode('latin-1')).get('kind', ['analyze'])[0]
+            if kind == 'long':
+                return LONG_MAX_BYTES
+        return self.BODY_LIMITS.get(scope['path'], self.wsgi_app.config['MAX_CONTENT_LENGTH'])
+    
+    async def http(self, scope, receive, send):
+        if self.draining:
+            await self.send_simple(send, 503, b'Server is shutting down')
+            return
+        
+        headers = self.request_headers(scope)
+        limit = self.body_limit(scope)
+        declared = headers.get('content-length')
+        if limit and declared and declared.isdigit() and int(declared) > limit:
+            await self.send_simple(send, 413, b'Upload too large')
+            return
+        
+        self.enter()
+        loop = asyncio.get_running_loop()
+        body = None
+        try:
+            if scope['path'] in self.STREAMED_ROUTES:
+                # The route reads the body as it arrives, so rolling updates start before the upload ends
+                body, size = ASGIInputStream(receive, loop), None
+            else:
+                body, size = await self.receive_body(receive, send, limit, loop)
+                if body is None:
+                    return
+            environ = self.build_environ(scope, headers, body, size)
+            # Every step of the WSGI app runs in one context, though on whichever pool thread is free:
+            # streamed responses keep Flask's request context open across the steps
+            context = contextvars.copy_context()
+            status, response_headers, result, chunks, chunk = await loop.run_in_executor(
+                self.pool, context.run, self.start_wsgi, environ)
+            try:
+                await send({
+                    'type': 'http.response.start',
+                    'status': status,
+                    'headers': response_headers
+                })
+                # Each chunk goes out as it is produced, so NDJSON responses stream to the client
+                while chunk is not None:
+                    if chunk:
+                        # ASGI bodies are bytes; cached images are memoryviews (bytes pass through uncopied)
+                        await send({'type': 'http.response.body', 'body': bytes(chunk), 'more_body': True})
+                    chunk = await loop.run_in_executor(self.pool, context.run, next, chunks, None)
+                await send({'type': 'http.response.body', 'body': b''})
+            finally:
+                if hasattr(result, 'close'):
+                    await loop.run_in_executor(self.pool, context.run, result.close)
+        finally:
+            if body is not None:
+                body.close()
+            self.leave()
+    
+    async def receive_body(self, receive, send, limit, loop):
+        """Receive the whole request body as (spool file, size), or answer the request and return (None, None).
+        
+        Small bodies stay in memory, large ones spill to UPLOAD_FOLDER.
+        """
+        threshold = self.wsgi_app.config['UPLOAD_SPOOL_THRESHOLD']
+        body = tempfile.SpooledTemporaryFile(max_size=threshold, dir=self.wsgi_app.config['UPLOAD_FOLDER'])
+        # Receive the body chunk by chunk without blocking the event loop
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None, None
+            chunk = message.get('body', b'')
+            if size + len(chunk) > threshold:
+                # Past the threshold the spool rolls over to disk; its writes go to the pool
+                await loop.run_in_executor(self.pool, body.write, chunk)
+            else:
+                body.write(chunk)
+            size += len(chunk)
+            more_body = message.get('more_body', False)
+            if limit and size > limit:
+                body.close()
+                await self.send_simple(send, 413, b'Upload too large')
+                return None, None
+        body.seek(0)
+        return body, size
+    
+    def enter(self):
+        """Count a request or WebSocket session the shutdown drain waits for"""
+        self.in_flight += 1
+        if self.idle is not None:
+            self.idle.clear()
+    
+    def leave(self):
+        self.in_flight -= 1
+        if self.in_flight == 0 and self.idle is not None:
+            self.idle.set()
+    
+    async def websocket(self, scope, receive, send):
+        """Rolling analysis at /analyze/stream: binary audio frames in, JSON updates out.
+        
+        Frames are big-endian 16-bit PCM when the query names a rate (and
+        optionally channels), otherwise a WAV file or other audio bytes.
+        A text frame (e.g. {"type": "end"}) ends the stream; the final result
+        is sent before the server closes the connection.
+        """
+        await receive()  # websocket.connect
+        if scope['path'] != '/analyze/stream':
+            await send({'type': 'websocket.close', 'code': 1008})
+            return
+        if self.draining:
+            await send({'type': 'websocket.close', 'code': 1013})
+            return
+        
+        query = parse_qs(scope['query_string'].decode('latin-1'))
+        # Frames are big-endian 16-bit PCM when the client names a rate, as for audio/L16
+        pcm_format = None
+        if 'rate' in query:
+            pcm_format = parse_pcm_format({name: values[0] for name, values in query.items()})
+            if pcm_format is None:
+                await send({'type': 'websocket.close', 'code': 1003})
+                return
+        session = StreamSession(analyzer, stream_window_bytes(query.get('window_kb', [None])[0]), pcm_format)
+        metrics.inc('emotion_stream_sessions_total', transport='websocket')
+        await send({'type': 'websocket.accept'})
+        
+        self.enter()
+        try:
+            loop = asyncio.get_running_loop()
+            while True:
+                message = await receive()
+                if message['type'] == 'websocket.disconnect':
+                    return
+                if message.get('bytes') is None:
+                    break
+                if session.stream.total + len(message['bytes']) > STREAM_MAX_BYTES:
+                    await send({'type': 'websocket.close', 'code': 1009})
+                    return
+                # Hashing and feature extraction run on the pool, not the event loop
+                updates = await loop.run_in_executor(self.pool, session.feed, message['bytes'])
+                for update in updates:
+                    await send({'type': 'websocket.send', 'text': json.dumps(update)})
+            
+            for update in await loop.run_in_executor(self.pool, session.finish):
+                if update.get('visualization_id'):
+                    update['visualization_url'] = f"{scope.get('root_path', '')}/visualization/{update['visualization_id']}"
+                await send({'type': 'websocket.send', 'text': json.dumps(update)})
+            await send({'type': 'websocket.close', 'code': 1000})
+        finally:
+            self.leave()
+    
+    @staticmethod
+    def request_headers(scope):
+        """Request headers by lower-case name; repeated headers are joined as a single WSGI value"""
+        headers = {}
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').lower()
+            value = value.decode('latin-1')
+            if name in headers:
+                # Cookies are separated by semicolons, every other list header by commas
+                headers[name] += ('; ' if name == 'cookie' else ', ') + value
+            else:
+                headers[name] = value
+        return headers
+    
+    def build_environ(self, scope, headers, body, size):
+        """Translate an ASGI HTTP scope and its body (a file of size bytes) into a WSGI environ.
+        
+        size is None for a body still arriving; it is then terminated by the
+        server and its length is only known if the client declared it.
+        """
+        server_name, server_port = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'],
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server_name,
+            'SERVER_PORT': str(server_port),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'CONTENT_LENGTH': str(size),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False
+        }
+        for name, value in headers.items():
+            if name == 'content-type':
+                environ['CONTENT_TYPE'] = value
+            elif name != 'content-length':
+                environ['HTTP_' + name.upper().replace('-', '_')] = value
+        if size is None:
+            environ['wsgi.input_terminated'] = True
+            if 'content-length' in headers:
+                environ['CONTENT_LENGTH'] = headers['content-length']
+            else:
+                del environ['CONTENT_LENGTH']
+        return environ
+    
+    def start_wsgi(self, environ):
+        """Run the Flask app on a pool thread up to its first body chunk.
+        
+        Returns (status, headers, result, chunks, first_chunk); first_chunk
+        is None for an empty body. The caller pulls the remaining chunks
+        from the chunks iterator and closes result.
+        """
+        response = {}
+        
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+        
+        result = self.wsgi_app(environ, start_response)
+        try:
+            # Generators may only call start_response once they yield
+            chunks = iter(result)
+            first = next(chunks, None)
+        except BaseException:
+            if hasattr(result, 'close'):
+                result.close()
+            raise
+        return response['status'], response['headers'], result, chunks, first
+    
+    async def send_simple(self, send, status, body):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'text/plain; charset=utf-8'),
+                        (b'content-length', str(len(body)).encode('ascii'))]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+asgi_app = EmotionASGI(app, ASGI_WORKERS, ASGI_DRAIN_TIMEOUT)
+
+def run_asgi():
+    """Serve asgi_app with uvicorn (optional dependency)"""
+    try:
+        import uvicorn
+    except ImportError:
+        print("❌ SERVER_MODE=asgi requires uvicorn (pip install uvicorn)")
+        return
+    
+    uvicorn.run(
+        asgi_app,
+        host='0.0.0.0',
+        port=5000,
+        limit_concurrency=ASGI_MAX_CONNECTIONS,
+        timeout_keep_alive=ASGI_KEEP_ALIVE,
+        timeout_graceful_shutdown=ASGI_DRAIN_TIMEOUT
+    )
 
 def main():
     """Main function to run the application"""
@@ -1248,7 +4853,8 @@ def main():
     print(f"📁 Temporary directory: {os.path.abspath(app.config['UPLOAD_FOLDER'])}")
     print("🌐 Web Interface: http://localhost:5000")
     print("🔧 API Endpoint: http://localhost:5000/analyze [POST]")
-    print("❤️  Health Check: http://localhost:5000/health [GET]")
+    print("🗂️  Job API: http://localhost:5000/jobs [POST], /jobs/<id> [GET, DELETE]")
+    print("❤️  Health Check: http://localhost:5000/health/live, /health/ready [GET]")
     print("="*80)
     print("🎯 FEATURES:")
     print("   • Upload audio files (WAV, MP3, M4A, WEBM, OGG)")
@@ -1258,6 +4864,18 @@ def main():
     print("   • Real-time waveform and spectrogram visualization")
     print("   • Modern, responsive UI with animations")
     print("="*80)
+    print(f"⚙️  Analysis executor: {analyzer.executor.kind} ({analyzer.executor.workers} workers)")
+    
+    if SERVER_MODE == 'asgi':
+        print("🚀 Starting ASGI server (uvicorn)...")
+        print("="*80)
+        run_asgi()
+        return
+    
+    analyzer.executor.start()
+    job_queue.start()
+    if WARMUP:
+        start_warm_up()
     print("🚀 Starting Flask server...")
     print("="*80)
     
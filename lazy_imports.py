@@ -0,0 +1,48 @@
+"""Deferred imports for the heavy plotting and data stacks.
+
+``matplotlib``, ``plotly`` and ``pandas`` each take a large share of start-up
+time but are only needed once something is drawn. A LazyModule stands in for
+the module and imports it on first attribute access.
+"""
+import importlib
+import threading
+import time
+
+# Seconds spent importing each lazily loaded module, in load order
+IMPORT_TIMES = {}
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access.
+
+    on_load runs once, right after the import (e.g. to select a backend).
+    """
+
+    def __init__(self, name, on_load=None):
+        self._name = name
+        self._on_load = on_load
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    if self._on_load is not None:
+                        self._on_load(module)
+                    IMPORT_TIMES[self._name] = time.perf_counter() - start
+                    self._module = module
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f'<LazyModule {self._name!r} ({state})>'
@@ -0,0 +1,135 @@
+"""Load test comparing the Flask development server with the ASGI server.
+
+Starts ``emotiondetection.py`` in each SERVER_MODE in turn, then drives
+POST /analyze from 1 to 256 concurrent keep-alive clients and reports
+p50/p99 latency and requests per second.
+
+Run with:  python loadtest.py [--duration SECONDS] [--clients 1,4,16,64,256]
+ASGI mode needs uvicorn installed.
+"""
+import argparse
+import http.client
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+HOST = '127.0.0.1'
+PORT = 5000
+BOUNDARY = 'loadtest-boundary'
+
+
+def multipart_body(payload):
+    """Encode one upload as the multipart form /analyze expects"""
+    return (
+        f'--{BOUNDARY}\r\n'
+        f'Content-Disposition: form-data; name="audio"; filename="clip.webm"\r\n'
+        f'Content-Type: audio/webm\r\n\r\n'
+    ).encode('ascii') + payload + f'\r\n--{BOUNDARY}--\r\n'.encode('ascii')
+
+
+def start_server(mode):
+    """Launch the app in the given SERVER_MODE and wait until /health answers"""
+    # Every client posts the same clip, so the result cache would answer them all
+    env = dict(os.environ, SERVER_MODE=mode, RESULT_CACHE='off')
+    process = subprocess.Popen([sys.executable, 'emotiondetection.py'], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection(HOST, PORT, timeout=1)
+            connection.request('GET', '/health')
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def run_level(body, n_clients, duration):
+    """Run n_clients keep-alive clients for duration seconds"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+    headers = {'Content-Type': f'multipart/form-data; boundary={BOUNDARY}'}
+
+    def client():
+        connection = http.client.HTTPConnection(HOST, PORT, timeout=60)
+        local = []
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                connection.request('POST', '/analyze', body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(HOST, PORT, timeout=60)
+                ok = False
+            if ok:
+                local.append(time.perf_counter() - start)
+            else:
+                with lock:
+                    errors[0] += 1
+        connection.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(n_clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if not latencies:
+        return None, None, 0.0, errors[0]
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return p50, p99, len(latencies) / elapsed, errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--clients', default='1,4,16,64,256')
+    parser.add_argument('--size-kb', type=int, default=200)
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.clients.split(',')]
+    payload = np.random.default_rng(0).integers(0, 256, args.size_kb * 1024, dtype=np.uint8).tobytes()
+    body = multipart_body(payload)
+
+    print(f"{'server':<7} {'clients':>7} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9} {'errors':>7}")
+    for mode in ('flask', 'asgi'):
+        process = start_server(mode)
+        try:
+            for n_clients in levels:
+                p50, p99, rps, errors = run_level(body, n_clients, args.duration)
+                if p50 is None:
+                    print(f"{mode:<7} {n_clients:>7} {'-':>9} {'-':>9} {rps:>9.1f} {errors:>7}")
+                else:
+                    print(f"{mode:<7} {n_clients:>7} {p50 * 1000:>9.1f} {p99 * 1000:>9.1f} "
+                          f"{rps:>9.1f} {errors:>7}")
+        finally:
+            stop_server(process)
+
+
+if __name__ == '__main__':
+    main()
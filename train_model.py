@@ -0,0 +1,186 @@
+"""Train the emotion model used when EMOTION_MODEL is set.
+
+Walks a folder of labelled audio clips, extracts the acoustic feature vector
+of every clip and fits a softmax (multinomial logistic regression) classifier
+with NumPy. Runs offline on local files; nothing is downloaded.
+
+Labels come from the clip's folder or file name, so the usual layouts work
+unchanged: TESS folders (``OAF_angry/``), RAVDESS file names
+(``03-01-05-01-01-01-12.wav`` is angry) and EMO-DB file names
+(``03a01Wa.wav`` is angry). Clips of other emotions (disgust, boredom) are
+skipped.
+
+Run with:  python train_model.py DATA_DIR [--out models/emotion] [--epochs 500]
+Serve with:  EMOTION_MODEL=models/emotion python emotiondetection.py
+"""
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from emotiondetection import (EmotionModel, EMOTION_LABELS, FEATURE_NAMES,
+                              analyzer, acoustic_feature_vector)
+
+AUDIO_EXTENSIONS = ('.wav', '.webm', '.ogg', '.mp3', '.m4a', '.flac')
+
+# Emotion codes in RAVDESS file names (third field)
+RAVDESS_CODES = {'01': 'neutral', '02': 'calm', '03': 'happy', '04': 'sad',
+                 '05': 'angry', '06': 'fearful', '07': 'disgust', '08': 'surprised'}
+RAVDESS_NAME = re.compile(r'^\d\d-\d\d-(\d\d)-\d\d-\d\d-\d\d-\d\d$')
+
+# Emotion letters in EMO-DB file names (sixth character, German initials)
+EMODB_CODES = {'W': 'anger', 'L': 'boredom', 'E': 'disgust', 'A': 'fear',
+               'F': 'happiness', 'T': 'sadness', 'N': 'neutral'}
+EMODB_NAME = re.compile(r'^\d\d[a-z]\d\d([A-Z])[a-z]?$')
+
+
+def label_for_path(path):
+    """UI emotion label for a clip, or None if it cannot be inferred"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    match = RAVDESS_NAME.match(stem)
+    if match:
+        return EMOTION_LABELS.get(RAVDESS_CODES[match.group(1)])
+    match = EMODB_NAME.match(stem)
+    if match:
+        return EMOTION_LABELS.get(EMODB_CODES.get(match.group(1), ''))
+
+    # Otherwise the last recognizable word of the folder or file name
+    folder = os.path.basename(os.path.dirname(path))
+    for name in (folder, stem):
+        for token in reversed(re.split(r'[_\-\s.]+', name.lower())):
+            if token in EMOTION_LABELS:
+                return EMOTION_LABELS[token]
+    return None
+
+
+def find_clips(data_dir):
+    """(path, label) for every labelled audio file below data_dir"""
+    clips = []
+    skipped = 0
+    for root, _, files in os.walk(data_dir):
+        for name in sorted(files):
+            if not name.lower().endswith(AUDIO_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            label = label_for_path(path)
+            if label is None:
+                skipped += 1
+            else:
+                clips.append((path, label))
+    return clips, skipped
+
+
+def clip_vector(path):
+    """Feature vector of one clip, or None if it cannot be decoded"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    features, _ = analyzer.extract_signal_features(data, path)
+    acoustic = features.get('acoustic')
+    if acoustic is None or not acoustic.size:
+        return None
+    return acoustic_feature_vector(acoustic)
+
+
+def fit_softmax(X, y, n_classes, epochs=500, learning_rate=0.5, l2=1e-3):
+    """Full-batch gradient descent on class-balanced cross-entropy; returns (weights, bias)"""
+    n_samples, n_features = X.shape
+    weights = np.zeros((n_features, n_classes))
+    bias = np.zeros(n_classes)
+    targets = np.eye(n_classes)[y]
+    # Balanced weighting so frequent emotions do not dominate
+    counts = np.bincount(y, minlength=n_classes)
+    sample_weight = (n_samples / (n_classes * np.maximum(counts, 1)))[y][:, np.newaxis]
+
+    for _ in range(epochs):
+        logits = X @ weights + bias
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        error = (probabilities - targets) * sample_weight / n_samples
+        weights -= learning_rate * (X.T @ error + l2 * weights)
+        bias -= learning_rate * error.sum(axis=0)
+    return weights, bias
+
+
+def standardize(X):
+    mean = X.mean(axis=0)
+    scale = np.maximum(X.std(axis=0), 1e-6)
+    return mean, scale
+
+
+def split(y, holdout, seed):
+    """Stratified train/validation index split"""
+    rng = np.random.default_rng(seed)
+    train, validation = [], []
+    for label in np.unique(y):
+        members = rng.permutation(np.flatnonzero(y == label))
+        n_validation = int(round(len(members) * holdout))
+        validation.extend(members[:n_validation])
+        train.extend(members[n_validation:])
+    return np.array(train, dtype=int), np.array(validation, dtype=int)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('data_dir')
+    parser.add_argument('--out', default=os.path.join('models', 'emotion'))
+    parser.add_argument('--epochs', type=int, default=500)
+    parser.add_argument('--learning-rate', type=float, default=0.5)
+    parser.add_argument('--l2', type=float, default=1e-3)
+    parser.add_argument('--holdout', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    clips, skipped = find_clips(args.data_dir)
+    print(f"📁 {len(clips)} labelled clips ({skipped} without a supported emotion skipped)")
+    if not clips:
+        return
+
+    start = time.perf_counter()
+    paths = [path for path, _ in clips]
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        vectors = list(pool.map(clip_vector, paths, chunksize=16))
+    kept = [(vector, label) for vector, (_, label) in zip(vectors, clips) if vector is not None]
+    print(f"⚙️  Extracted {len(FEATURE_NAMES)} features from {len(kept)} clips "
+          f"in {time.perf_counter() - start:.1f}s ({len(clips) - len(kept)} undecodable)")
+    if not kept:
+        return
+
+    labels = sorted({label for _, label in kept})
+    X = np.stack([vector for vector, _ in kept]).astype(np.float64)
+    y = np.array([labels.index(label) for _, label in kept])
+
+    # Report held-out accuracy, then fit the shipped model on every clip
+    train, validation = split(y, args.holdout, args.seed)
+    accuracy = None
+    if len(validation) and len(train):
+        mean, scale = standardize(X[train])
+        weights, bias = fit_softmax((X[train] - mean) / scale, y[train], len(labels),
+                                    args.epochs, args.learning_rate, args.l2)
+        predicted = (((X[validation] - mean) / scale) @ weights + bias).argmax(axis=1)
+        accuracy = float(np.mean(predicted == y[validation]))
+        print(f"📊 Validation accuracy {accuracy:.3f} on {len(validation)} clips")
+        for index, label in enumerate(labels):
+            members = y[validation] == index
+            if members.any():
+                print(f"   {label:<14} {np.mean(predicted[members] == index):.3f}  ({members.sum()} clips)")
+
+    mean, scale = standardize(X)
+    weights, bias = fit_softmax((X - mean) / scale, y, len(labels),
+                                args.epochs, args.learning_rate, args.l2)
+    EmotionModel.save(args.out, labels, mean, scale, weights, bias, info={
+        'clips': len(kept),
+        'validation_accuracy': accuracy,
+        'epochs': args.epochs,
+        'data_dir': os.path.abspath(args.data_dir),
+        'trained_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    })
+    print(f"✅ Model written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()